@@ -1,186 +1,121 @@
 import os
 import logging
 import json
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, Response
+from flask import Flask, Blueprint, render_template, request, jsonify, redirect, url_for, flash, session, Response
 from werkzeug.middleware.proxy_fix import ProxyFix
-import requests
 from datetime import datetime, date
 from models import db, AmmoBox, UpcData, RangeTrip, RangeTripItem, User, Firearm, RangeTripFirearm, OAuth
 from sqlalchemy import func
 from flask_login import LoginManager, current_user, login_required
+from range_trip_stats import get_range_trip_stats
+from caliber_rollups import get_caliber_summary, rebuild_rollups_command
+from inventory_query import fetch_inventory_page, parse_fields, DEFAULT_PAGE_SIZE
+from range_trip_inventory import checkout_boxes, checkin_items
+from upc_lookup import (init_upc_cache, upc_cache, lookup_upc as cached_lookup_upc, lookup_upcs,
+                        MAX_BATCH_UPCS, catalog_changed)
+from scrape_jobs import init_scrape_jobs, submit_scrape_job, get_scrape_job, MAX_PRODUCTS_LIMIT
+from csv_export import inventory_csv_response, range_trips_csv_response, range_trip_items_csv_response
+from csv_import import import_inventory_csv, format_errors, import_message, MERGE_MODES
+from bulk_import import import_inventory_command
+from stock_alerts import list_low_stock, stock_alerts_command
+from migrate_db import migrate_db_command
+from query_plans import check_query_plans_command
+from startup import initialize_database, init_db_command, startup_benchmark_command
+from auth_routes import auth
+from firearm_routes import firearms
+from simple_auth import auth_simple
+from quick_auth import quick_auth
+from page_cache import init_page_cache, page_cache, cached_page, bumps_data_version
+from etags import conditional_get, uncacheable, stats as etag_stats, SHORT_LIVED
+from caliber_thresholds import (init_threshold_cache, get_thresholds as get_caliber_thresholds,
+                                get_all_thresholds, save_thresholds as save_caliber_thresholds,
+                                MAX_BULK_THRESHOLDS)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
-# Create the Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Routes defined in this module, registered on the app by create_app()
+main = Blueprint('main', __name__)
 
-# Configure database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the database with the app
-db.init_app(app)
-
-# Initialize Flask-Login
+# Initialize Flask-Login (bound to the app by create_app())
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
+login_manager.login_view = 'quick_auth.quick_login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
+
+def create_app():
+    """
+    Create and configure the Flask app.
     
-def initialize_database():
-    """Create tables and set up default data if needed"""
-    with app.app_context():
-        # Execute database migrations
-        from migrate_db import migrate_database
-        migrate_database()
-        
-        # Create default user account if it doesn't exist
-        try:
-            user = User.query.filter_by(username='budd').first()
-            if not user:
-                default_user = User(username='budd', email='budd@example.com')
-                default_user.set_password('dwyer')
-                db.session.add(default_user)
-                db.session.commit()
-                logging.info("Default user account created: username=budd, password=dwyer")
-        except Exception as e:
-            logging.error(f"Error setting up default user: {str(e)}")
-            db.session.rollback()
+    Nothing here touches the database, so importing the app and starting a
+    worker stay fast. Migrations and default data are applied once per
+    deployment by startup.initialize_database() (flask init-db, or the
+    gunicorn on_starting hook).
+    """
+    # Create the Flask app
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
-# Register blueprints
-from auth_routes import auth
-from firearm_routes import firearms
-from simple_auth import auth_simple
-from quick_auth import quick_auth
-app.register_blueprint(auth, url_prefix='/auth')
-app.register_blueprint(firearms, url_prefix='/firearms')
-app.register_blueprint(auth_simple)
-app.register_blueprint(quick_auth)
-
-# Update login view to use quick auth
-login_manager.login_view = 'quick_auth.quick_login'
-
-# Initialize database with default data 
-try:
-    initialize_database()
-    logging.info("Database initialized with default data")
-except Exception as e:
-    logging.error(f"Error initializing database: {str(e)}")
-
-# Create default UPC data
-DEFAULT_UPC_DATA = [
-    {
-        "upc": "604544617375",
-        "name": "Federal Premium .223 Rem 55gr FMJ",
-        "caliber": ".223 Remington",
-        "count_per_box": 20
-    },
-    {
-        "upc": "020892212602",
-        "name": "Winchester 9mm Luger 115gr FMJ",
-        "caliber": "9mm Luger",
-        "count_per_box": 50
-    },
-    {
-        "upc": "029465088414",
-        "name": "Remington UMC .45 ACP 230gr FMJ",
-        "caliber": ".45 ACP",
-        "count_per_box": 50
-    },
-    {
-        "upc": "076683051202",
-        "name": "CCI Blazer Brass 9mm 115gr FMJ",
-        "caliber": "9mm Luger",
-        "count_per_box": 50
-    },
-    {
-        "upc": "090255815511",
-        "name": "Federal American Eagle 5.56mm 55gr FMJ",
-        "caliber": "5.56 NATO",
-        "count_per_box": 20
+    # Configure database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
     }
-]
-
-# Default inventory items to add
-DEFAULT_INVENTORY = [
-    {
-        "name": "Federal Premium .223 Rem 55gr FMJ",
-        "upc": "604544617375",
-        "caliber": ".223 Remington",
-        "count_per_box": 20,
-        "quantity": 3,
-        "notes": "Range ammo"
-    },
-    {
-        "name": "Winchester 9mm Luger 115gr FMJ",
-        "upc": "020892212602",
-        "caliber": "9mm Luger",
-        "count_per_box": 50,
-        "quantity": 5,
-        "notes": "Training ammo"
-    }
-]
-
-# We'll use a simpler approach for thresholds until we implement the model properly
-
-# Initialize database with default data
-def initialize_database():
-    with app.app_context():
-        # Create all tables if they don't exist
-        db.create_all()
-        
-        # Add default UPC data if it doesn't exist
-        for upc_item in DEFAULT_UPC_DATA:
-            if not UpcData.query.filter_by(upc=upc_item["upc"]).first():
-                upc_data = UpcData(
-                    upc=upc_item["upc"],
-                    name=upc_item["name"],
-                    caliber=upc_item["caliber"],
-                    count_per_box=upc_item["count_per_box"]
-                )
-                db.session.add(upc_data)
-        
-        # Add default inventory if no items exist
-        if AmmoBox.query.count() == 0:
-            for item in DEFAULT_INVENTORY:
-                ammo_box = AmmoBox(
-                    name=item["name"],
-                    upc=item["upc"],
-                    caliber=item["caliber"],
-                    count_per_box=item["count_per_box"],
-                    quantity=item["quantity"],
-                    notes=item["notes"]
-                )
-                db.session.add(ammo_box)
-        
-        # Add a sample range trip if none exist
-        if RangeTrip.query.count() == 0:
-            # Add a sample range trip for demonstration
-            sample_trip = RangeTrip(
-                name="Sample Range Trip",
-                date=date.today(),
-                location="Local Range",
-                notes="Sample trip created automatically"
-            )
-            db.session.add(sample_trip)
-        
-        db.session.commit()
-        logging.info("Database initialized with default data")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Call initialize_database function
-initialize_database()
+    # Configure the UPC lookup cache
+    app.config["UPC_CACHE_SIZE"] = int(os.environ.get("UPC_CACHE_SIZE", 2048))
+    app.config["UPC_CACHE_TTL"] = int(os.environ.get("UPC_CACHE_TTL", 600))
+    app.config["UPC_NEGATIVE_CACHE_SIZE"] = int(os.environ.get("UPC_NEGATIVE_CACHE_SIZE", 2048))
+    app.config["UPC_NEGATIVE_CACHE_TTL"] = int(os.environ.get("UPC_NEGATIVE_CACHE_TTL", 3600))
+    app.config["UPC_API_RESPONSE_TTL"] = int(os.environ.get("UPC_API_RESPONSE_TTL", 30 * 24 * 3600))
+    app.config["UPC_API_NEGATIVE_TTL"] = int(os.environ.get("UPC_API_NEGATIVE_TTL", 24 * 3600))
+    app.config["UPC_API_TIMEOUT"] = float(os.environ.get("UPC_API_TIMEOUT", 5))
+    app.config["UPC_ADVISORY_LOCKS"] = os.environ.get("UPC_ADVISORY_LOCKS", "true").lower() == "true"
+    app.config["UPC_LOCK_TIMEOUT"] = float(os.environ.get("UPC_LOCK_TIMEOUT", 10))
+    app.config["UPC_BATCH_WORKERS"] = int(os.environ.get("UPC_BATCH_WORKERS", 4))
+    app.config["SCRAPE_WORKERS"] = int(os.environ.get("SCRAPE_WORKERS", 2))
+    app.config["SCRAPE_RESULT_TTL"] = int(os.environ.get("SCRAPE_RESULT_TTL", 900))
+    app.config["SCRAPE_JOB_TIMEOUT"] = int(os.environ.get("SCRAPE_JOB_TIMEOUT", 120))
+    app.config["THRESHOLD_CACHE_SIZE"] = int(os.environ.get("THRESHOLD_CACHE_SIZE", 1024))
+    app.config["THRESHOLD_CACHE_TTL"] = int(os.environ.get("THRESHOLD_CACHE_TTL", 3600))
+    app.config["PAGE_CACHE_BACKEND"] = os.environ.get("PAGE_CACHE_BACKEND", "memory")
+    app.config["PAGE_CACHE_SIZE"] = int(os.environ.get("PAGE_CACHE_SIZE", 512))
+    app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", 300))
+    app.config["PAGE_CACHE_DIR"] = os.environ.get("PAGE_CACHE_DIR", os.path.join(app.instance_path, "page_cache"))
+    app.config["PAGE_CACHE_REDIS_URL"] = os.environ.get("PAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    
+    # Initialize the database and caches with the app
+    db.init_app(app)
+    init_upc_cache(app)
+    init_scrape_jobs(app)
+    init_threshold_cache(app)
+    init_page_cache(app)
+    login_manager.init_app(app)
+    
+    # Register blueprints
+    app.register_blueprint(main)
+    app.register_blueprint(auth, url_prefix='/auth')
+    app.register_blueprint(firearms, url_prefix='/firearms')
+    app.register_blueprint(auth_simple)
+    app.register_blueprint(quick_auth)
+    
+    # Register CLI commands
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(import_inventory_command)
+    app.cli.add_command(stock_alerts_command)
+    app.cli.add_command(startup_benchmark_command)
+    
+    return app
 
 # Get inventory from database
 def get_inventory():
@@ -188,133 +123,39 @@ def get_inventory():
 
 # UPC lookup function from database or external API if needed
 def lookup_upc(upc):
-    # First check our database
-    upc_data = UpcData.query.filter_by(upc=upc).first()
-    
-    if upc_data:
-        return upc_data.to_dict()
-    
-    # Try UPC Item DB API for unknown UPCs
-    try:
-        logging.info(f"Looking up UPC {upc} in UPC Item DB API")
-        url = f"https://api.upcitemdb.com/prod/trial/lookup?upc={upc}"
-        headers = {
-            "Accept": "application/json"
-        }
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Check if we got a valid result
-            if data.get('items') and len(data['items']) > 0:
-                item = data['items'][0]
-                
-                # Extract ammunition-related information
-                title = item.get('title', 'Unknown Product')
-                brand = item.get('brand', '')
-                
-                # Try to determine if it's ammunition and extract caliber
-                caliber = None
-                count_per_box = None
-                
-                # Common ammunition calibers to look for in title
-                calibers = [
-                    '9mm', '.45', '.40', '.380', '.22', '.223', '5.56', 
-                    '.308', '7.62', '.300', '6.5', '12 gauge', '20 gauge'
-                ]
-                
-                # Check title for caliber information
-                for cal in calibers:
-                    if cal.lower() in title.lower():
-                        caliber = cal
-                        break
-                        
-                # Look for count information (e.g., "50 rounds", "20 count", etc.)
-                import re
-                count_match = re.search(r'(\d+)\s*(rd|round|count|ct|rnd|rnds|rounds)', title.lower())
-                if count_match:
-                    count_per_box = int(count_match.group(1))
-                
-                # Default values if we couldn't determine specifics
-                if not caliber:
-                    caliber = "Unknown"
-                if not count_per_box:
-                    count_per_box = 0
-                
-                # Create a result using available information
-                product_name = f"{brand} {title}" if brand else title
-                return {
-                    'upc': upc,
-                    'name': product_name,
-                    'caliber': caliber,
-                    'count_per_box': count_per_box,
-                    'source': 'api'  # Mark this as coming from the API
-                }
-                
-        # If we didn't get a valid result or couldn't parse it
-        logging.warning(f"UPC lookup failed for {upc}: {response.text}")
-        return None
-        
-    except Exception as e:
-        logging.error(f"Error looking up UPC {upc}: {str(e)}")
-        return None
+    return cached_lookup_upc(upc)
 
 # Routes
-@app.route('/')
+@main.route('/')
 def home():
     return render_template('index.html')
 
 # Range Trips
-@app.route('/range-trips')
+@main.route('/range-trips')
 @login_required
+@conditional_get('range_trips')
+@cached_page('range_trips')
 def range_trips():
-    # Get all range trips, most recent first
-    trips = RangeTrip.query.filter_by(user_id=current_user.id).order_by(RangeTrip.date.desc()).all()
-    
-    # Calculate statistics
-    total_trips = len(trips)
-    active_trips = sum(1 for trip in trips if trip.status == 'active')
-    
-    # Calculate total rounds used across all trips
-    total_rounds_used = 0
-    caliber_usage = {}
-    
-    # Process trip items to calculate statistics
-    for trip in trips:
-        trip_items = RangeTripItem.query.filter_by(range_trip_id=trip.id).all()
-        for item in trip_items:
-            total_rounds_used += item.rounds_used
-            
-            # Track usage by caliber
-            if item.caliber in caliber_usage:
-                caliber_usage[item.caliber] += item.rounds_used
-            else:
-                caliber_usage[item.caliber] = item.rounds_used
-    
-    # Get most used caliber
-    most_used_caliber = None
-    most_used_count = 0
-    for caliber, count in caliber_usage.items():
-        if count > most_used_count:
-            most_used_caliber = caliber
-            most_used_count = count
+    # Get the trip list and usage statistics in a fixed number of queries
+    stats = get_range_trip_stats(current_user.id)
+    caliber_usage = stats['caliber_usage']
     
     # Prepare caliber data for chart
     caliber_list = list(caliber_usage.keys())
     caliber_counts = [caliber_usage[cal] for cal in caliber_list]
     
     return render_template('range_trips.html', 
-                          trips=trips,
-                          total_trips=total_trips,
-                          active_trips=active_trips,
-                          total_rounds_used=total_rounds_used,
-                          most_used_caliber=most_used_caliber,
+                          trips=stats['trips'],
+                          total_trips=stats['total_trips'],
+                          active_trips=stats['active_trips'],
+                          total_rounds_used=stats['total_rounds_used'],
+                          most_used_caliber=stats['most_used_caliber'],
                           caliber_list=caliber_list,
                           caliber_usage=caliber_counts)
 
-@app.route('/range-trips/<int:trip_id>')
+@main.route('/range-trips/<int:trip_id>')
 @login_required
+@conditional_get('range_trip', shared=True)
 def view_range_trip(trip_id):
     # Get the range trip by ID
     trip = RangeTrip.query.get_or_404(trip_id)
@@ -342,8 +183,9 @@ def view_range_trip(trip_id):
                           total_rounds_in=total_rounds_in,
                           total_rounds_used=total_rounds_used)
 
-@app.route('/range-trips/new', methods=['GET', 'POST'])
+@main.route('/range-trips/new', methods=['GET', 'POST'])
 @login_required
+@bumps_data_version(shared=False)
 def new_range_trip():
     if request.method == 'POST':
         # Create a new range trip
@@ -370,20 +212,21 @@ def new_range_trip():
         db.session.commit()
         
         flash('Range trip created successfully!', 'success')
-        return redirect(url_for('checkout_ammo', trip_id=trip.id))
+        return redirect(url_for('main.checkout_ammo', trip_id=trip.id))
     
     # For GET requests, show the form
     today = date.today().isoformat()
     return render_template('new_range_trip.html', today=today)
 
-@app.route('/range-trips/<int:trip_id>/checkout', methods=['GET', 'POST'])
+@main.route('/range-trips/<int:trip_id>/checkout', methods=['GET', 'POST'])
+@bumps_data_version()
 def checkout_ammo(trip_id):
     # Get the range trip
     trip = RangeTrip.query.get_or_404(trip_id)
     
     if trip.status != 'active':
         flash('This range trip is already completed and cannot be modified.', 'warning')
-        return redirect(url_for('view_range_trip', trip_id=trip_id))
+        return redirect(url_for('main.view_range_trip', trip_id=trip_id))
     
     if request.method == 'POST':
         # Get the checked out ammo
@@ -393,42 +236,38 @@ def checkout_ammo(trip_id):
         # Check if we have valid data
         if len(ammo_ids) != len(quantities):
             flash('Invalid form data. Please try again.', 'danger')
-            return redirect(url_for('checkout_ammo', trip_id=trip_id))
+            return redirect(url_for('main.checkout_ammo', trip_id=trip_id))
         
-        # Process each ammo selection
-        for i in range(len(ammo_ids)):
-            ammo_id = ammo_ids[i]
-            quantity = int(quantities[i])
-            
-            if quantity <= 0:
-                continue  # Skip if quantity is zero or negative
-            
-            # Get the ammo box from inventory
-            ammo_box = AmmoBox.query.get(ammo_id)
-            
-            if ammo_box.quantity < quantity:
-                flash(f'Not enough {ammo_box.name} available in inventory.', 'danger')
-                continue
-            
-            # Create a range trip item
-            trip_item = RangeTripItem(
-                range_trip_id=trip_id,
-                ammo_box_id=ammo_box.id,
-                name=ammo_box.name,
-                caliber=ammo_box.caliber,
-                count_per_box=ammo_box.count_per_box,
-                quantity_out=quantity
-            )
-            
-            # Update the inventory
-            ammo_box.quantity -= quantity
-            ammo_box.update_total_rounds()
-            
-            db.session.add(trip_item)
+        # Combine the submitted rows into one requested quantity per box
+        requested = {}
+        try:
+            for ammo_id, quantity in zip(ammo_ids, quantities):
+                requested[int(ammo_id)] = requested.get(int(ammo_id), 0) + int(quantity)
+        except ValueError:
+            flash('Invalid form data. Please try again.', 'danger')
+            return redirect(url_for('main.checkout_ammo', trip_id=trip_id))
+        
+        try:
+            # Decrement every box with one conditional UPDATE and insert the trip items in bulk
+            checked_out, failed = checkout_boxes(trip_id, requested)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error checking out ammo: {str(e)}")
+            flash(f'Error checking out ammunition: {str(e)}', 'danger')
+            return redirect(url_for('main.checkout_ammo', trip_id=trip_id))
+        
+        # Report boxes that no longer had enough quantity
+        if failed:
+            names = dict(db.session.query(AmmoBox.id, AmmoBox.name).filter(AmmoBox.id.in_(failed)).all())
+            for ammo_id in failed:
+                flash(f'Not enough {names.get(ammo_id, "ammunition")} available in inventory.', 'danger')
+        
+        if failed and not checked_out:
+            return redirect(url_for('main.checkout_ammo', trip_id=trip_id))
         
-        db.session.commit()
         flash('Ammunition checked out successfully!', 'success')
-        return redirect(url_for('view_range_trip', trip_id=trip_id))
+        return redirect(url_for('main.view_range_trip', trip_id=trip_id))
     
     # Get all inventory items for checkout
     inventory = AmmoBox.query.filter(AmmoBox.quantity > 0).order_by(AmmoBox.caliber, AmmoBox.name).all()
@@ -444,14 +283,15 @@ def checkout_ammo(trip_id):
                           trip=trip,
                           inventory_by_caliber=inventory_by_caliber)
 
-@app.route('/range-trips/<int:trip_id>/checkin', methods=['GET', 'POST'])
+@main.route('/range-trips/<int:trip_id>/checkin', methods=['GET', 'POST'])
+@bumps_data_version()
 def checkin_ammo(trip_id):
     # Get the range trip
     trip = RangeTrip.query.get_or_404(trip_id)
     
     if trip.status != 'active':
         flash('This range trip is already completed and cannot be modified.', 'warning')
-        return redirect(url_for('view_range_trip', trip_id=trip_id))
+        return redirect(url_for('main.view_range_trip', trip_id=trip_id))
     
     if request.method == 'POST':
         # Get form data
@@ -459,95 +299,108 @@ def checkin_ammo(trip_id):
         quantities_in = request.form.getlist('quantity_in')
         complete_trip = 'complete_trip' in request.form
         
-        # Process each trip item
-        for i in range(len(item_ids)):
-            item_id = item_ids[i]
-            quantity_in = int(quantities_in[i])
-            
-            # Get the trip item
-            trip_item = RangeTripItem.query.get(item_id)
-            
-            if quantity_in > trip_item.quantity_out:
-                flash(f'Cannot check in more than was checked out for {trip_item.name}.', 'danger')
-                continue
+        try:
+            quantities = {int(item_id): int(quantity_in) for item_id, quantity_in in zip(item_ids, quantities_in)}
+        except ValueError:
+            flash('Invalid form data. Please try again.', 'danger')
+            return redirect(url_for('main.checkin_ammo', trip_id=trip_id))
+        
+        try:
+            # Update all trip items and return leftover boxes in two set-based statements
+            updated, failed = checkin_items(trip_id, quantities)
             
-            # Update the trip item
-            trip_item.quantity_in = quantity_in
-            trip_item.rounds_used = (trip_item.quantity_out - quantity_in) * trip_item.count_per_box
+            # If we're completing the trip, update its status
+            if complete_trip:
+                trip.status = 'completed'
             
-            # Return ammo to inventory if there's some left
-            if quantity_in > 0 and trip_item.ammo_box_id:
-                ammo_box = AmmoBox.query.get(trip_item.ammo_box_id)
-                if ammo_box:
-                    ammo_box.quantity += quantity_in
-                    ammo_box.update_total_rounds()
-        
-        # If we're completing the trip, update its status
-        if complete_trip:
-            trip.status = 'completed'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error checking in ammo: {str(e)}")
+            flash(f'Error checking in ammunition: {str(e)}', 'danger')
+            return redirect(url_for('main.checkin_ammo', trip_id=trip_id))
         
-        db.session.commit()
+        if failed:
+            names = dict(db.session.query(RangeTripItem.id, RangeTripItem.name).filter(RangeTripItem.id.in_(failed)).all())
+            for item_id in failed:
+                flash(f'Cannot check in more than was checked out for {names.get(item_id, "this item")}.', 'danger')
         
         if complete_trip:
             flash('Range trip completed successfully!', 'success')
-            return redirect(url_for('range_trips'))
+            return redirect(url_for('main.range_trips'))
         else:
             flash('Ammunition checked in successfully!', 'success')
-            return redirect(url_for('view_range_trip', trip_id=trip_id))
+            return redirect(url_for('main.view_range_trip', trip_id=trip_id))
     
     # Get all items for this range trip that can be checked in
     trip_items = RangeTripItem.query.filter_by(range_trip_id=trip_id).all()
     
     return render_template('checkin_ammo.html', trip=trip, trip_items=trip_items)
 
-@app.route('/inventory')
+@main.route('/api/range_trips/<int:trip_id>/checkin', methods=['POST'])
 @login_required
-def inventory():
-    # Get all inventory items from database
-    ammo_inventory = AmmoBox.query.all()
+@bumps_data_version()
+def api_checkin_ammo(trip_id):
+    """Check in a whole range trip in one request (used by mobile clients)"""
+    data = request.get_json()
     
-    # Calculate totals by caliber using SQLAlchemy 
-    caliber_totals = {}
-    caliber_results = db.session.query(
-        AmmoBox.caliber,
-        func.sum(AmmoBox.total_rounds).label('total')
-    ).group_by(AmmoBox.caliber).all()
+    if not data or 'items' not in data:
+        return jsonify({"success": False, "message": "No items provided"})
     
-    for result in caliber_results:
-        caliber_totals[result.caliber] = result.total
+    trip = RangeTrip.query.get(trip_id)
+    if not trip:
+        return jsonify({"success": False, "message": "Range trip not found"})
     
-    # Calculate total rounds
-    total_rounds = db.session.query(func.sum(AmmoBox.total_rounds)).scalar() or 0
+    if trip.status != 'active':
+        return jsonify({"success": False, "message": "This range trip is already completed and cannot be modified"})
     
-    # Define default thresholds for common calibers
-    default_thresholds = {
-        "9mm Luger": {"low": 200, "critical": 100, "target": 500},
-        ".223 Remington": {"low": 150, "critical": 60, "target": 400},
-        "5.56 NATO": {"low": 150, "critical": 60, "target": 400},
-        ".45 ACP": {"low": 100, "critical": 50, "target": 300},
-        ".22 LR": {"low": 300, "critical": 150, "target": 1000},
-        "12 Gauge": {"low": 50, "critical": 25, "target": 200}
-    }
+    try:
+        quantities = {int(item['item_id']): int(item['quantity_in']) for item in data['items']}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"success": False, "message": "Each item needs an integer item_id and quantity_in"})
+    
+    try:
+        updated, failed = checkin_items(trip_id, quantities)
+        
+        if data.get('complete_trip'):
+            trip.status = 'completed'
+        
+        db.session.commit()
+        
+        return jsonify({
+            "success": True,
+            "message": "Range trip completed successfully" if data.get('complete_trip') else "Ammunition checked in successfully",
+            "updated": updated,
+            "failed": failed,
+            "status": trip.status
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error checking in ammo: {str(e)}")
+        return jsonify({"success": False, "message": f"Error checking in ammunition: {str(e)}"})
+
+@main.route('/inventory')
+@login_required
+@conditional_get('inventory', shared=True)
+@cached_page('inventory', shared=True)
+def inventory():
+    # Read caliber totals from the incrementally maintained rollup table
+    caliber_summary = get_caliber_summary()
+    caliber_totals = {row.caliber: row.total_rounds for row in caliber_summary}
+    
+    # Calculate total rounds
+    total_rounds = sum(caliber_totals.values())
     
     # Prepare chart data
     chart_labels = list(caliber_totals.keys())
     chart_values = list(caliber_totals.values())
     
-    # Get threshold values for each caliber
-    low_thresholds = []
-    critical_thresholds = []
-    target_stocks = []
-    
-    for caliber in chart_labels:
-        if caliber in default_thresholds:
-            low_thresholds.append(default_thresholds[caliber]["low"])
-            critical_thresholds.append(default_thresholds[caliber]["critical"])
-            target_stocks.append(default_thresholds[caliber]["target"])
-        else:
-            # Default values for unknown calibers
-            low_thresholds.append(100)
-            critical_thresholds.append(50)
-            target_stocks.append(500)
+    # Get threshold values for each caliber (cached per process, see caliber_thresholds.py)
+    thresholds = get_all_thresholds(current_user, chart_labels)
+    low_thresholds = [thresholds[caliber]["low"] for caliber in chart_labels]
+    critical_thresholds = [thresholds[caliber]["critical"] for caliber in chart_labels]
+    target_stocks = [thresholds[caliber]["target"] for caliber in chart_labels]
     
     chart_data = {
         'labels': chart_labels,
@@ -559,50 +412,41 @@ def inventory():
         }
     }
     
-    # Convert database objects to dictionaries for the template
-    inventory_items = [item.to_dict() for item in ammo_inventory]
-    
-    # Group inventory by caliber for the dashboard
+    # Group inventory by caliber for the dashboard; the item table is paged in by
+    # static/js/inventory.js from /api/inventory
     caliber_inventory = {}
-    for item in ammo_inventory:
-        caliber = item.caliber
-        if caliber not in caliber_inventory:
-            threshold = default_thresholds.get(caliber, {"low": 100, "critical": 50, "target": 500})
-            caliber_inventory[caliber] = {
-                'items': [],
-                'total_rounds': 0,
-                'box_count': 0,
-                'threshold': threshold
-            }
-        caliber_inventory[caliber]['items'].append(item.to_dict())
-        caliber_inventory[caliber]['total_rounds'] += item.total_rounds
-        caliber_inventory[caliber]['box_count'] += item.quantity
+    for row in caliber_summary:
+        caliber_inventory[row.caliber] = {
+            'total_rounds': row.total_rounds,
+            'box_count': row.box_count,
+            'threshold': thresholds[row.caliber]
+        }
     
     return render_template('inventory.html', 
-                          inventory=inventory_items, 
                           caliber_totals=caliber_totals,
                           total_rounds=total_rounds,
                           chart_data=json.dumps(chart_data),
                           caliber_inventory=caliber_inventory)
 
-@app.route('/scan')
+@main.route('/scan')
 @login_required
 def scan():
     return render_template('scan.html')
 
-@app.route('/upcs')
+@main.route('/upcs')
 @login_required
+@conditional_get('upcs', catalog=True)
 def upcs():
     # Get all UPC data from database
     upc_data = UpcData.query.order_by(UpcData.name).all()
     return render_template('upcs.html', upcs=upc_data)
 
-@app.route('/about')
+@main.route('/about')
 def about():
     # About page - accessible without login
     return render_template('about.html')
 
-@app.route('/api/scrape_ammo', methods=['POST'])
+@main.route('/api/scrape_ammo', methods=['POST'])
 @login_required
 def scrape_ammo():
     # Since web scraping can be unstable, we'll use a combination of:
@@ -614,7 +458,10 @@ def scrape_ammo():
         return jsonify({"success": False, "message": "No search query provided"})
     
     query = data['query'].lower()
-    max_products = data.get('max_products', 5)
+    try:
+        max_products = max(1, min(int(data.get('max_products', 5)), MAX_PRODUCTS_LIMIT))
+    except (TypeError, ValueError):
+        max_products = 5
     results = []
     
     # Common ammunition database for instant results
@@ -778,63 +625,26 @@ def scrape_ammo():
                 # Return results directly if found
                 return jsonify({"success": True, "results": results})
     
-    # If we don't have matching results, try the web scraper
+    # If we don't have matching results, scrape in the background and let the client poll
     try:
-        from scraper import PalmettoScraper
-        
-        # Create scraper and search for products
-        scraper = PalmettoScraper()
-        scraped_results = scraper.search_and_get_details(query, max_products=max_products)
-        
-        # Filter results to only include those with UPC, caliber, and count_per_box
-        for product in scraped_results:
-            if 'upc' in product and 'caliber' in product and 'count_per_box' in product:
-                results.append(product)
-        
-        if results:
-            return jsonify({"success": True, "results": results})
-        else:
-            # If no results from scraping, use simulated data based on query
-            generic_results = []
-            
-            # Check if query contains a caliber
-            caliber_patterns = {
-                "9mm": "9mm Luger",
-                "5.56": "5.56 NATO",
-                ".223": ".223 Remington",
-                ".45": ".45 ACP",
-                ".22": ".22 LR",
-                "12 gauge": "12 Gauge"
-            }
-            
-            detected_caliber = None
-            for cal_pattern, cal_name in caliber_patterns.items():
-                if cal_pattern in query:
-                    detected_caliber = cal_name
-                    break
-            
-            if detected_caliber:
-                # Create a generic ammunition entry
-                generic_results.append({
-                    "name": f"Generic {detected_caliber} Ammunition",
-                    "upc": "000000000000",  # Generic UPC
-                    "caliber": detected_caliber,
-                    "count_per_box": 50 if detected_caliber in ["9mm Luger", ".45 ACP"] else 20,
-                    "price": "$19.99",
-                    "url": "https://palmettostatearmory.com/ammunition.html",
-                    "description": f"Generic {detected_caliber} ammunition. Please update with actual details."
-                })
-                
-                return jsonify({"success": True, "results": generic_results})
-            
-            return jsonify({"success": False, "message": "No ammunition products found. Try a different search term."})
+        job = submit_scrape_job(query, max_products)
+        return jsonify({"success": True, "job_id": job.id, "job": job.to_dict()})
     
     except Exception as e:
-        logging.error(f"Error processing ammunition search: {str(e)}")
+        logging.error(f"Error starting ammunition search: {str(e)}")
         return jsonify({"success": False, "message": f"Error processing ammunition search: {str(e)}"})
 
-@app.route('/api/lookup_upc/<upc>', methods=['GET'])
+@main.route('/api/scrape_jobs/<job_id>', methods=['GET'])
 @login_required
+def scrape_job_status(job_id):
+    job = get_scrape_job(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Scrape job not found"})
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@main.route('/api/lookup_upc/<upc>', methods=['GET'])
+@login_required
+@conditional_get('lookup_upc', catalog=True, cache_control=SHORT_LIVED)
 def api_lookup_upc(upc):
     ammo_data = lookup_upc(upc)
     if ammo_data:
@@ -844,12 +654,58 @@ def api_lookup_upc(upc):
             source = "api"
             # Remove the source field before sending to client
             del ammo_data['source']
+            # API answers can change without a catalog write, so they are not revalidated
+            return uncacheable(jsonify({"success": True, "data": ammo_data, "source": source}))
         
         return jsonify({"success": True, "data": ammo_data, "source": source})
     else:
-        return jsonify({"success": False, "message": "UPC not found in database or external API"})
+        return uncacheable(jsonify({"success": False, "message": "UPC not found in database or external API"}))
+
+@main.route('/api/lookup_upcs', methods=['POST'])
+@login_required
+def api_lookup_upcs():
+    """
+    Look up a batch of UPCs in one request.
 
-@app.route('/api/add_upc', methods=['POST'])
+    Expects JSON {"upcs": ["...", ...]} and returns {"results": {upc: entry}}
+    where each entry has the same shape as /api/lookup_upc/<upc>.
+    """
+    data = request.get_json(silent=True) or {}
+    upcs = data.get('upcs')
+    if not isinstance(upcs, list) or not upcs:
+        return jsonify({"success": False, "message": "Expected a non-empty list of UPCs"})
+
+    upcs = [str(upc).strip() for upc in upcs if str(upc).strip()]
+    if len(set(upcs)) > MAX_BATCH_UPCS:
+        return jsonify({"success": False, "message": f"At most {MAX_BATCH_UPCS} UPCs per request"})
+
+    try:
+        found = lookup_upcs(upcs)
+    except Exception as e:
+        logging.error(f"Error looking up UPC batch: {str(e)}")
+        return jsonify({"success": False, "message": f"Error looking up UPCs: {str(e)}"})
+
+    results = {}
+    for upc, ammo_data in found.items():
+        if ammo_data:
+            source = "api" if ammo_data.pop('source', None) == 'api' else "database"
+            results[upc] = {"success": True, "data": ammo_data, "source": source}
+        else:
+            results[upc] = {"success": False, "message": "UPC not found in database or external API"}
+
+    return jsonify({"success": True, "results": results})
+
+@main.route('/api/upc_cache_stats', methods=['GET'])
+@login_required
+def api_upc_cache_stats():
+    return jsonify({"success": True, "stats": upc_cache.stats()})
+
+@main.route('/api/page_cache_stats', methods=['GET'])
+@login_required
+def api_page_cache_stats():
+    return jsonify({"success": True, "stats": page_cache.stats(), "conditional_get": etag_stats()})
+
+@main.route('/api/add_upc', methods=['POST'])
 def add_upc():
     data = request.get_json()
     
@@ -878,6 +734,7 @@ def add_upc():
         # Add to database
         db.session.add(new_upc)
         db.session.commit()
+        catalog_changed()
         
         return jsonify({"success": True, "message": "UPC added successfully", "upc": new_upc.to_dict()})
     
@@ -886,7 +743,8 @@ def add_upc():
         logging.error(f"Error adding UPC: {str(e)}")
         return jsonify({"success": False, "message": f"Error adding UPC: {str(e)}"})
 
-@app.route('/api/update_upc/<int:upc_id>', methods=['POST'])
+@main.route('/api/update_upc/<int:upc_id>', methods=['POST'])
+@bumps_data_version()
 def update_upc(upc_id):
     data = request.get_json()
     
@@ -914,6 +772,7 @@ def update_upc(upc_id):
             upc_data.count_per_box = int(data['count_per_box'])
         
         db.session.commit()
+        catalog_changed()
         
         # Update any inventory items using this UPC
         if any(key in data for key in ['name', 'caliber', 'count_per_box']):
@@ -936,7 +795,7 @@ def update_upc(upc_id):
         logging.error(f"Error updating UPC: {str(e)}")
         return jsonify({"success": False, "message": f"Error updating UPC: {str(e)}"})
 
-@app.route('/api/delete_upc/<int:upc_id>', methods=['POST'])
+@main.route('/api/delete_upc/<int:upc_id>', methods=['POST'])
 def delete_upc(upc_id):
     try:
         # Find UPC by ID
@@ -956,6 +815,7 @@ def delete_upc(upc_id):
         # Delete from database
         db.session.delete(upc_data)
         db.session.commit()
+        catalog_changed()
         
         return jsonify({"success": True, "message": "UPC deleted successfully"})
     
@@ -964,7 +824,8 @@ def delete_upc(upc_id):
         logging.error(f"Error deleting UPC: {str(e)}")
         return jsonify({"success": False, "message": f"Error deleting UPC: {str(e)}"})
 
-@app.route('/api/add_inventory', methods=['POST'])
+@main.route('/api/add_inventory', methods=['POST'])
+@bumps_data_version()
 def add_inventory():
     data = request.get_json()
     
@@ -1005,6 +866,7 @@ def add_inventory():
             )
             db.session.add(upc_data)
             db.session.commit()
+            catalog_changed()
         
         # Return success with item data
         return jsonify({
@@ -1018,7 +880,8 @@ def add_inventory():
         logging.error(f"Error adding inventory: {str(e)}")
         return jsonify({"success": False, "message": f"Error adding inventory: {str(e)}"})
 
-@app.route('/api/delete_inventory/<int:item_id>', methods=['POST'])
+@main.route('/api/delete_inventory/<int:item_id>', methods=['POST'])
+@bumps_data_version()
 def delete_inventory(item_id):
     try:
         # Find the item by ID
@@ -1037,7 +900,8 @@ def delete_inventory(item_id):
         logging.error(f"Error deleting inventory: {str(e)}")
         return jsonify({"success": False, "message": f"Error deleting inventory: {str(e)}"})
 
-@app.route('/api/update_inventory/<int:item_id>', methods=['POST'])
+@main.route('/api/update_inventory/<int:item_id>', methods=['POST'])
+@bumps_data_version()
 def update_inventory(item_id):
     data = request.get_json()
     
@@ -1072,6 +936,7 @@ def update_inventory(item_id):
                     upc_item.caliber = data['caliber']
                     upc_item.count_per_box = int(data['count_per_box'])
                     db.session.commit()
+                    catalog_changed()
             
             return jsonify({
                 "success": True, 
@@ -1086,26 +951,47 @@ def update_inventory(item_id):
         logging.error(f"Error updating inventory: {str(e)}")
         return jsonify({"success": False, "message": f"Error updating inventory: {str(e)}"})
 
+@main.route('/api/inventory', methods=['GET'])
+@login_required
+@conditional_get('api_inventory', shared=True)
+def api_inventory():
+    """Keyset-paginated inventory listing with server-side filters"""
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        
+        items, next_cursor = fetch_inventory_page(
+            fields=fields,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            caliber=request.args.getlist('caliber') or None,
+            upc=request.args.get('upc') or None,
+            name_prefix=request.args.get('name_prefix') or None
+        )
+        
+        return jsonify({"success": True, "items": items, "next_cursor": next_cursor})
+    
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
+    except Exception as e:
+        logging.error(f"Error listing inventory: {str(e)}")
+        return uncacheable(jsonify({"success": False, "message": f"Error listing inventory: {str(e)}"}))
+
 # API endpoint to save threshold settings
-@app.route('/api/save_thresholds', methods=['POST'])
+@main.route('/api/save_thresholds', methods=['POST'])
+@login_required
+@bumps_data_version(shared=False)
 def save_thresholds():
-    data = request.json
+    data = request.json or {}
     
     try:
-        caliber = data['caliber']
-        critical = int(data['critical'])
-        low = int(data['low'])
-        target = int(data['target'])
-        
-        # Update the default thresholds in session
-        if 'thresholds' not in session:
-            session['thresholds'] = {}
+        caliber = data.get('caliber')
+        save_caliber_thresholds(current_user, {caliber: data})
+        db.session.commit()
         
-        session['thresholds'][caliber] = {
-            'critical': critical,
-            'low': low,
-            'target': target
-        }
+        # Thresholds used to live in the session cookie
+        session.pop('thresholds', None)
         
         return jsonify({
             'success': True,
@@ -1113,62 +999,103 @@ def save_thresholds():
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': str(e)
         })
 
 # API endpoint to get thresholds for a caliber
-@app.route('/api/get_thresholds/<caliber>', methods=['GET'])
+@main.route('/api/get_thresholds/<caliber>', methods=['GET'])
+@login_required
+@conditional_get('thresholds')
 def get_thresholds(caliber):
-    # Get thresholds from session if they exist
-    thresholds = {}
-    if 'thresholds' in session and caliber in session['thresholds']:
-        thresholds = session['thresholds'][caliber]
-    
-    if not thresholds:
-        # Return default thresholds if none are set
-        default_thresholds = {
-            "9mm Luger": {"critical": 100, "low": 200, "target": 500},
-            ".223 Remington": {"critical": 60, "low": 150, "target": 400},
-            "5.56 NATO": {"critical": 60, "low": 150, "target": 400},
-            ".45 ACP": {"critical": 50, "low": 100, "target": 300},
-            ".22 LR": {"critical": 150, "low": 300, "target": 1000},
-            "12 Gauge": {"critical": 25, "low": 50, "target": 200}
-        }
-        
-        thresholds = default_thresholds.get(caliber, {"critical": 50, "low": 100, "target": 500})
+    return jsonify({
+        'success': True,
+        'thresholds': get_caliber_thresholds(current_user, caliber)
+    })
+
+# API endpoints to read or save the thresholds of many calibers in one call
+@main.route('/api/thresholds', methods=['GET'])
+@login_required
+@conditional_get('thresholds')
+def list_thresholds():
+    calibers = request.args.get('calibers')
+    calibers = [caliber.strip() for caliber in calibers.split(',') if caliber.strip()] if calibers else None
     
     return jsonify({
         'success': True,
-        'thresholds': thresholds
+        'thresholds': get_all_thresholds(current_user, calibers)
     })
 
-# API endpoint to export inventory as CSV
-@app.route('/api/export_csv', methods=['GET'])
-def export_csv():
+@main.route('/api/thresholds', methods=['POST'])
+@login_required
+@bumps_data_version(shared=False)
+def save_all_thresholds():
+    data = request.json or {}
+    updates = data.get('thresholds')
+    
+    if not isinstance(updates, dict) or not updates:
+        return jsonify({"success": False, "message": "Send {\"thresholds\": {caliber: {critical, low, target}}}"})
+    if len(updates) > MAX_BULK_THRESHOLDS:
+        return jsonify({"success": False, "message": f"At most {MAX_BULK_THRESHOLDS} calibers per request"})
+    
     try:
-        # Get all inventory items
-        items = AmmoBox.query.all()
+        save_caliber_thresholds(current_user, updates)
+        db.session.commit()
+        session.pop('thresholds', None)
         
-        # Create CSV content
-        csv_content = "name,upc,caliber,count_per_box,quantity,notes\n"
+        return jsonify({
+            'success': True,
+            'message': f'Thresholds for {len(updates)} calibers updated successfully',
+            'thresholds': get_all_thresholds(current_user, [caliber.strip() for caliber in updates])
+        })
         
-        for item in items:
-            # Format notes to handle commas and quotes
-            notes = item.notes.replace('"', '""') if item.notes else ""
-            
-            row = f'"{item.name}","{item.upc}","{item.caliber}",{item.count_per_box},{item.quantity},"{notes}"\n'
-            csv_content += row
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        })
+
+# API endpoint listing the current user's low and critical calibers (from stock_status)
+@main.route('/api/low_stock', methods=['GET'])
+@login_required
+def low_stock():
+    return jsonify({
+        'success': True,
+        'calibers': [row.to_dict() for row in list_low_stock(current_user.id)]
+    })
+
+# API endpoint to export inventory as CSV (add ?gzip=1 for a compressed download)
+@main.route('/api/export_csv', methods=['GET'])
+def export_csv():
+    try:
+        return inventory_csv_response(compress=request.args.get('gzip', '0').lower() in ('1', 'true'))
         
-        # Create response with CSV file
-        response = Response(
-            csv_content,
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment;filename=ammo_inventory.csv"}
-        )
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        })
+
+# API endpoint to export range trips as CSV
+@main.route('/api/export_range_trips_csv', methods=['GET'])
+def export_range_trips_csv():
+    try:
+        return range_trips_csv_response(compress=request.args.get('gzip', '0').lower() in ('1', 'true'))
         
-        return response
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        })
+
+# API endpoint to export the ammunition taken on range trips as CSV
+@main.route('/api/export_range_trip_items_csv', methods=['GET'])
+def export_range_trip_items_csv():
+    try:
+        return range_trip_items_csv_response(compress=request.args.get('gzip', '0').lower() in ('1', 'true'))
         
     except Exception as e:
         return jsonify({
@@ -1177,7 +1104,7 @@ def export_csv():
         })
 
 # API endpoint to get CSV template
-@app.route('/api/csv_template', methods=['GET'])
+@main.route('/api/csv_template', methods=['GET'])
 def csv_template():
     try:
         # Create template CSV content with example data
@@ -1201,7 +1128,8 @@ def csv_template():
         })
 
 # API endpoint to import inventory from CSV
-@app.route('/api/import_csv', methods=['POST'])
+@main.route('/api/import_csv', methods=['POST'])
+@bumps_data_version()
 def import_csv():
     if 'file' not in request.files:
         return jsonify({
@@ -1224,85 +1152,22 @@ def import_csv():
         })
     
     try:
-        # Read the CSV file as text
-        csv_content = file.read().decode('utf-8')
-        lines = csv_content.strip().split('\n')
-        
-        # Check header
-        header = lines[0].lower()
-        expected_header = "name,upc,caliber,count_per_box,quantity,notes"
-        
-        if header != expected_header:
-            return jsonify({
-                'success': False,
-                'message': f'Invalid CSV format. Expected header: {expected_header}'
-            })
-        
-        # Process data rows
-        items_added = 0
-        errors = []
-        
-        for i, line in enumerate(lines[1:], 2):  # Start at line 2 (1-indexed)
-            try:
-                # Simple CSV parsing (doesn't handle all edge cases)
-                fields = []
-                in_quotes = False
-                current_field = ""
-                
-                for char in line:
-                    if char == '"':
-                        in_quotes = not in_quotes
-                    elif char == ',' and not in_quotes:
-                        fields.append(current_field)
-                        current_field = ""
-                    else:
-                        current_field += char
-                
-                # Don't forget the last field
-                fields.append(current_field)
-                
-                # Check if we have the expected number of fields
-                if len(fields) != 6:
-                    errors.append(f"Line {i}: Expected 6 fields, got {len(fields)}")
-                    continue
-                
-                # Extract fields
-                name = fields[0].strip('"')
-                upc = fields[1].strip('"')
-                caliber = fields[2].strip('"')
-                
-                try:
-                    count_per_box = int(fields[3])
-                    quantity = int(fields[4])
-                except ValueError:
-                    errors.append(f"Line {i}: count_per_box and quantity must be integers")
-                    continue
-                
-                notes = fields[5].strip('"')
-                
-                # Create new AmmoBox
-                ammo_box = AmmoBox(
-                    name=name,
-                    upc=upc,
-                    caliber=caliber,
-                    count_per_box=count_per_box,
-                    quantity=quantity,
-                    notes=notes
-                )
-                
-                # Add to database
-                db.session.add(ammo_box)
-                items_added += 1
-                
-            except Exception as e:
-                errors.append(f"Line {i}: {str(e)}")
-        
-        # Commit changes
+        # Parse, validate and load the file in chunks
+        mode = request.form.get('mode', 'append')
+        result = import_inventory_csv(file.stream, mode=mode)
         db.session.commit()
+        if mode in MERGE_MODES:
+            # add and replace also refresh the upc_data catalog
+            catalog_changed()
         
+        errors = format_errors(result['errors'])
         return jsonify({
             'success': True,
-            'message': f'Successfully imported {items_added} items',
+            'message': import_message(result),
+            'inserted': result['inserted'],
+            'updated': result['updated'],
+            'unchanged': result['unchanged'],
+            'error_count': len(result['errors']),
             'errors': errors if errors else None
         })
         
@@ -1314,4 +1179,6 @@ def import_csv():
         })
 
 if __name__ == "__main__":
+    app = create_app()
+    initialize_database(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -2,14 +2,16 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from models import User, db
+from page_cache import cached_page, bumps_data_version
 
 auth = Blueprint('auth', __name__)
 
 @auth.route('/login', methods=['GET', 'POST'])
+@bumps_data_version(shared=False)
 def login():
     """Handle user login requests"""
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
         
     if request.method == 'POST':
         username = request.form.get('username')
@@ -34,7 +36,7 @@ def login():
         next_page = request.args.get('next')
         if next_page:
             return redirect(next_page)
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     return render_template('login.html')
 
@@ -42,7 +44,7 @@ def login():
 def register():
     """Handle user registration requests"""
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
         
     if request.method == 'POST':
         username = request.form.get('username')
@@ -88,10 +90,11 @@ def logout():
     """Log out the current user"""
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
 @auth.route('/profile')
 @login_required
+@cached_page('profile', shared=True)
 def profile():
     """Display user profile information"""
     # Get user's inventory items directly from the database
@@ -0,0 +1,309 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask.cli import with_appcontext
+from models import db, ImportCheckpoint
+from page_cache import bump_data_version
+from upc_lookup import catalog_changed
+from csv_import import (IMPORT_MODES, MERGE_MODES, check_header, numbered_rows, validate_chunk,
+                        create_scratch_tables, load_staging_rows, merge_scratch_tables)
+
+# Offline import of very large inventory files (flask import-inventory).
+#
+# The file is cut into byte ranges that end on CSV record boundaries, each
+# range is parsed and validated in a worker process, and the validated rows
+# are loaded by the parent in file order through the same staging table and
+# set-based merge as the web import. Every chunk is committed together with
+# an ImportCheckpoint row, so an interrupted import resumes after the last
+# committed chunk without importing anything twice.
+
+DEFAULT_CHUNK_MB = 4
+
+# Chunks parsed ahead of the loader per worker (bounds memory use)
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Lone surrogates left by decoding invalid UTF-8 with surrogateescape
+INVALID_UTF8 = re.compile('[\udc80-\udcff]')
+
+Chunk = namedtuple('Chunk', ['start', 'end', 'first_line', 'next_line'])
+
+
+def read_header(path):
+    """
+    Check the header of a CSV file.
+
+    Returns:
+        Tuple of (byte offset, line number) where the data rows start
+
+    Raises:
+        ValueError: If the header is missing or wrong
+    """
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig')]), None)
+        check_header(header)
+        return f.tell(), 2
+
+
+def split_records(path, chunk_bytes, offset, line):
+    """
+    Cut a CSV file into byte ranges that end on record boundaries.
+
+    A newline ends a record unless it is inside quotes. Doubled quotes inside
+    a quoted field come in pairs, so the quote count parity says whether a
+    line ends inside a field.
+
+    Args:
+        path: CSV file path
+        chunk_bytes: Approximate size of each range
+        offset: Byte offset to start from (just after the header, or a checkpoint)
+        line: File line number at that offset
+
+    Returns:
+        Iterator of Chunk(start, end, first_line, next_line)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        start, first_line = offset, line
+        position = offset
+        in_quotes = False
+        for raw in f:
+            position += len(raw)
+            line += 1
+            if raw.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes and position - start >= chunk_bytes:
+                yield Chunk(start, position, first_line, line)
+                start, first_line = position, line
+        if position > start:
+            yield Chunk(start, position, first_line, line)
+
+
+def parse_chunk(path, start, end, first_line, require_upc):
+    """
+    Parse and validate one byte range of a CSV file (runs in a worker process).
+
+    Returns:
+        Tuple of (list of staging row tuples, list of (line number, message) errors, rows read)
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        # Bytes that are not UTF-8 decode to lone surrogates, so the rows holding
+        # them can be rejected by line instead of failing the whole chunk
+        text = f.read(end - start).decode('utf-8', errors='surrogateescape')
+
+    rows = list(numbered_rows(csv.reader(io.StringIO(text, newline='')), first_line))
+    decoded = []
+    encoding_errors = []
+    for line, fields in rows:
+        if any(INVALID_UTF8.search(field) for field in fields):
+            encoding_errors.append((line, "Row is not valid UTF-8"))
+        else:
+            decoded.append((line, fields))
+
+    valid, errors = validate_chunk(decoded, require_upc)
+    if encoding_errors:
+        errors = sorted(encoding_errors + errors)
+    return valid, errors, len(rows)
+
+
+def parse_in_parallel(path, chunks, workers, require_upc):
+    """
+    Parse chunks in a process pool, yielding results in file order.
+
+    Only a few chunks per worker are parsed ahead of the consumer, so memory
+    stays bounded however large the file is.
+
+    Returns:
+        Iterator of (Chunk, valid rows, errors, rows read)
+    """
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(parse_chunk, path, chunk.start, chunk.end,
+                                               chunk.first_line, require_upc)))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                done_chunk, future = pending.popleft()
+                yield (done_chunk,) + future.result()
+
+        while pending:
+            done_chunk, future = pending.popleft()
+            yield (done_chunk,) + future.result()
+
+
+def checkpoint_id(path, mode, user_id, chunk_bytes):
+    """Identify an import by the file's identity and the options that shape its chunks"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}|{mode}|{user_id}|{chunk_bytes}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def import_inventory_file(path, mode='append', user_id=None, workers=None, chunk_bytes=None,
+                          errors_path=None, restart=False, progress=None):
+    """
+    Import a large inventory CSV file with parallel parsing and resumable checkpoints.
+
+    Args:
+        path: CSV file in the import format
+        mode: One of IMPORT_MODES
+        user_id: Owner recorded on the imported boxes
+        workers: Parser processes (defaults to the number of CPUs)
+        chunk_bytes: Approximate bytes per chunk
+        errors_path: File that invalid rows are appended to as line,message CSV
+        restart: Ignore any checkpoint and start from the top of the file
+        progress: Callable receiving the ImportCheckpoint after each committed chunk
+
+    Returns:
+        The finished ImportCheckpoint with the import totals
+
+    Raises:
+        ValueError: If the mode is unknown or the header is wrong
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    workers = workers or os.cpu_count() or 1
+    chunk_bytes = chunk_bytes or DEFAULT_CHUNK_MB * 1024 * 1024
+
+    data_offset, data_line = read_header(path)
+    key = checkpoint_id(path, mode, user_id, chunk_bytes)
+
+    checkpoint = db.session.get(ImportCheckpoint, key)
+    if checkpoint and restart:
+        db.session.delete(checkpoint)
+        db.session.commit()
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(id=key, file_path=os.path.abspath(path)[:500],
+                                      next_offset=data_offset, next_line=data_line)
+        db.session.add(checkpoint)
+        db.session.commit()
+    if checkpoint.finished:
+        return checkpoint
+
+    chunks = split_records(path, chunk_bytes, checkpoint.next_offset, checkpoint.next_line)
+    for chunk, valid, errors, row_count in parse_in_parallel(path, chunks, workers, mode in MERGE_MODES):
+        try:
+            connection = db.session.connection()
+            create_scratch_tables(connection, mode)
+            load_staging_rows(connection, valid)
+            counts = merge_scratch_tables(connection, user_id, mode)
+
+            # Commit the checkpoint with the rows so a chunk is never imported twice
+            checkpoint.next_offset = chunk.end
+            checkpoint.next_line = chunk.next_line
+            checkpoint.chunks += 1
+            checkpoint.rows += row_count
+            checkpoint.inserted += counts['inserted']
+            checkpoint.updated += counts['updated']
+            checkpoint.unchanged += counts['unchanged']
+            checkpoint.error_count += len(errors)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Cached pages showing inventory are stale once the chunk is committed
+        bump_data_version(user_id)
+        if mode in MERGE_MODES:
+            catalog_changed()
+
+        if errors and errors_path:
+            with open(errors_path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(errors)
+
+        if progress:
+            progress(checkpoint)
+
+    checkpoint.finished = True
+    db.session.commit()
+    return checkpoint
+
+
+def benchmark(path, worker_counts=None, chunk_bytes=None):
+    """
+    Measure parse-and-validate throughput by number of worker processes.
+
+    Nothing is written to the database.
+
+    Returns:
+        List of dictionaries with workers, rows, seconds, rows_per_sec and speedup
+    """
+    chunk_bytes = chunk_bytes or DEFAULT_CHUNK_MB * 1024 * 1024
+    if not worker_counts:
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({1, cpus} | {2 ** n for n in range(1, cpus.bit_length()) if 2 ** n < cpus})
+
+    offset, line = read_header(path)
+    results = []
+    for workers in worker_counts:
+        started = time.perf_counter()
+        rows = 0
+        chunks = split_records(path, chunk_bytes, offset, line)
+        for _, _, _, row_count in parse_in_parallel(path, chunks, workers, False):
+            rows += row_count
+        elapsed = time.perf_counter() - started
+
+        results.append({
+            'workers': workers,
+            'rows': rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(rows / elapsed) if elapsed else 0,
+            'speedup': round(results[0]['seconds'] / elapsed, 2) if results and elapsed else 1.0
+        })
+    return results
+
+
+@click.command('import-inventory')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--mode', type=click.Choice(IMPORT_MODES), default='append', show_default=True,
+              help='append creates new boxes; add and replace merge on UPC.')
+@click.option('--user-id', type=int, default=None, help='Owner of the imported boxes.')
+@click.option('--workers', type=int, default=None, help='Parser processes (default: number of CPUs).')
+@click.option('--chunk-mb', type=float, default=DEFAULT_CHUNK_MB, show_default=True,
+              help='Approximate size of each parsed and committed chunk.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), default=None,
+              help='Append invalid rows to this file as line,message.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and import the whole file again.')
+@click.option('--benchmark', 'run_benchmark', is_flag=True,
+              help='Only measure parsing throughput for 1..N workers; nothing is imported.')
+@with_appcontext
+def import_inventory_command(path, mode, user_id, workers, chunk_mb, errors_path, restart, run_benchmark):
+    """Import a large inventory CSV file, resuming from the last checkpoint."""
+    chunk_bytes = int(chunk_mb * 1024 * 1024)
+
+    try:
+        if run_benchmark:
+            counts = [workers] if workers else None
+            click.echo(f"{'workers':>7} {'rows':>10} {'seconds':>8} {'rows/sec':>10} {'speedup':>8}")
+            for row in benchmark(path, counts, chunk_bytes):
+                click.echo(f"{row['workers']:>7} {row['rows']:>10} {row['seconds']:>8} "
+                           f"{row['rows_per_sec']:>10} {row['speedup']:>8}")
+            return
+
+        total_bytes = os.path.getsize(path)
+        started = time.perf_counter()
+
+        def report(checkpoint):
+            elapsed = time.perf_counter() - started
+            click.echo(
+                f"{checkpoint.next_offset / total_bytes:6.1%}  chunk {checkpoint.chunks}: "
+                f"{checkpoint.rows} rows, {checkpoint.inserted} inserted, {checkpoint.updated} updated, "
+                f"{checkpoint.error_count} errors ({elapsed:.1f}s)"
+            )
+
+        checkpoint = import_inventory_file(path, mode=mode, user_id=user_id, workers=workers,
+                                           chunk_bytes=chunk_bytes, errors_path=errors_path,
+                                           restart=restart, progress=report)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(
+        f"Import complete: {checkpoint.rows} rows, {checkpoint.inserted} inserted, "
+        f"{checkpoint.updated} updated, {checkpoint.unchanged} unchanged, {checkpoint.error_count} errors"
+    )
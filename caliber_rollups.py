@@ -0,0 +1,252 @@
+import logging
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, inspect, insert, update, delete, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, AmmoBox, CaliberRollup
+from stock_alerts import refresh_stock_status, rebuild_stock_status
+from page_cache import bump_data_version
+
+# Incrementally maintained per-user caliber totals for the inventory dashboard.
+#
+# Every ORM flush that inserts, updates or deletes an AmmoBox is translated into
+# deltas against caliber_rollups on the same connection, so the rollup commits
+# or rolls back together with the inventory change. Bulk SQL write paths that
+# bypass the ORM must call apply_rollup_delta() themselves. It also re-evaluates
+# the pair's low-stock status (see stock_alerts).
+#
+# Deltas are applied with a single INSERT ... ON CONFLICT DO UPDATE against the
+# (COALESCE(user_id, 0), caliber) unique index, so concurrent transactions that
+# touch a new pair add up instead of colliding or inserting duplicate rows.
+
+rollup_table = CaliberRollup.__table__
+
+# Columns whose previous value is needed to compute a delta
+TRACKED_COLUMNS = ('user_id', 'caliber', 'total_rounds', 'quantity')
+
+
+def _track_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history makes SQLAlchemy load the old value even when the attribute
+# was expired before being assigned, so the after_flush hook can always see it
+for _column in TRACKED_COLUMNS:
+    event.listen(getattr(AmmoBox, _column), 'set', _track_previous_value, active_history=True)
+
+
+def _user_filter(user_id):
+    if user_id is None:
+        return rollup_table.c.user_id.is_(None)
+    return rollup_table.c.user_id == user_id
+
+
+def apply_rollup_delta(connection, user_id, caliber, rounds=0, boxes=0, items=0):
+    """
+    Add a delta to the rollup row for a user/caliber pair.
+
+    Args:
+        connection: Connection to execute on (keeps the caller's transaction)
+        user_id: Owner of the inventory (may be None for legacy rows)
+        caliber: Caliber name
+        rounds: Change in total rounds
+        boxes: Change in box quantity
+        items: Change in number of AmmoBox rows
+    """
+    if not (rounds or boxes or items):
+        return
+
+    key_filter = (_user_filter(user_id), rollup_table.c.caliber == caliber)
+    values = {'user_id': user_id, 'caliber': caliber, 'total_rounds': rounds, 'box_count': boxes, 'item_count': items}
+    increments = {
+        'total_rounds': rollup_table.c.total_rounds + rounds,
+        'box_count': rollup_table.c.box_count + boxes,
+        'item_count': rollup_table.c.item_count + items
+    }
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (pg_insert if dialect == 'postgresql' else sqlite_insert)(rollup_table).values(**values)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[func.coalesce(rollup_table.c.user_id, literal_column('0')), rollup_table.c.caliber],
+            set_=dict(increments, updated_at=datetime.utcnow())
+        ))
+    else:
+        result = connection.execute(update(rollup_table).where(*key_filter).values(**increments))
+        if result.rowcount == 0:
+            connection.execute(insert(rollup_table).values(**values))
+
+    if items < 0:
+        # Drop calibers that no longer have any boxes
+        connection.execute(
+            delete(rollup_table).where(*key_filter, rollup_table.c.item_count <= 0)
+        )
+
+    if rounds or items:
+        refresh_stock_status(connection, user_id, caliber)
+
+
+def _box_values(box, previous):
+    """Get (user_id, caliber, total_rounds, quantity) before or after the flush"""
+    state = inspect(box)
+    values = []
+    for column in TRACKED_COLUMNS:
+        history = state.attrs[column].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(box, column))
+    return tuple(values)
+
+
+def collect_box_deltas(session):
+    """
+    Compute rollup deltas for the AmmoBox changes pending in a flush.
+
+    Returns:
+        Dictionary mapping (user_id, caliber) to [rounds, boxes, items] deltas
+    """
+    deltas = {}
+
+    def add(values, sign):
+        user_id, caliber, total_rounds, quantity = values
+        delta = deltas.setdefault((user_id, caliber), [0, 0, 0])
+        delta[0] += sign * (total_rounds or 0)
+        delta[1] += sign * (quantity or 0)
+        delta[2] += sign
+
+    for obj in session.new:
+        if isinstance(obj, AmmoBox):
+            add(_box_values(obj, previous=False), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, AmmoBox):
+            add(_box_values(obj, previous=True), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, AmmoBox) and session.is_modified(obj, include_collections=False):
+            old_values = _box_values(obj, previous=True)
+            new_values = _box_values(obj, previous=False)
+            if old_values != new_values:
+                add(old_values, -1)
+                add(new_values, 1)
+
+    return deltas
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_rollups_after_flush(session, flush_context):
+    """Apply AmmoBox changes from this flush to caliber_rollups"""
+    deltas = collect_box_deltas(session)
+    if not deltas:
+        return
+
+    connection = session.connection()
+    for (user_id, caliber), (rounds, boxes, items) in deltas.items():
+        apply_rollup_delta(connection, user_id, caliber, rounds=rounds, boxes=boxes, items=items)
+
+
+def get_caliber_summary():
+    """
+    Get inventory totals by caliber from the rollup table.
+
+    Returns:
+        List of rows with caliber, total_rounds, box_count and item_count
+    """
+    return db.session.query(
+        CaliberRollup.caliber,
+        func.sum(CaliberRollup.total_rounds).label('total_rounds'),
+        func.sum(CaliberRollup.box_count).label('box_count'),
+        func.sum(CaliberRollup.item_count).label('item_count')
+    ).group_by(CaliberRollup.caliber).order_by(CaliberRollup.caliber).all()
+
+
+def compute_live_rollups():
+    """Aggregate ammo_boxes from scratch into {(user_id, caliber): (rounds, boxes, items)}"""
+    rows = db.session.query(
+        AmmoBox.user_id,
+        AmmoBox.caliber,
+        func.coalesce(func.sum(AmmoBox.total_rounds), 0),
+        func.coalesce(func.sum(AmmoBox.quantity), 0),
+        func.count(AmmoBox.id)
+    ).group_by(AmmoBox.user_id, AmmoBox.caliber).all()
+
+    return {(row[0], row[1]): (int(row[2]), int(row[3]), int(row[4])) for row in rows}
+
+
+def rebuild_caliber_rollups(check_only=False):
+    """
+    Recompute caliber_rollups from ammo_boxes and compare with the stored rows.
+
+    Args:
+        check_only: Only report differences without rewriting the table
+
+    Returns:
+        List of mismatch dictionaries (empty when the rollup matched the live data)
+    """
+    live = compute_live_rollups()
+    stored = {
+        (row.user_id, row.caliber): (row.total_rounds, row.box_count, row.item_count)
+        for row in CaliberRollup.query.all()
+    }
+
+    mismatches = []
+    for key in sorted(set(live) | set(stored), key=lambda k: (k[0] or 0, k[1])):
+        expected = live.get(key)
+        actual = stored.get(key)
+        if expected != actual:
+            mismatches.append({
+                'user_id': key[0],
+                'caliber': key[1],
+                'expected': expected,
+                'actual': actual
+            })
+
+    if check_only:
+        return mismatches
+
+    try:
+        db.session.execute(delete(rollup_table))
+        if live:
+            db.session.execute(insert(rollup_table), [
+                {
+                    'user_id': user_id,
+                    'caliber': caliber,
+                    'total_rounds': rounds,
+                    'box_count': boxes,
+                    'item_count': items
+                }
+                for (user_id, caliber), (rounds, boxes, items) in live.items()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    rebuild_stock_status()
+    bump_data_version()
+    logging.info(f"Rebuilt caliber rollups: {len(live)} rows, {len(mismatches)} mismatches fixed")
+    return mismatches
+
+
+@click.command('rebuild-rollups')
+@click.option('--check-only', is_flag=True, help='Report differences without rewriting the rollup table.')
+@with_appcontext
+def rebuild_rollups_command(check_only):
+    """Recompute caliber_rollups from ammo_boxes and verify it against the live data."""
+    mismatches = rebuild_caliber_rollups(check_only=check_only)
+
+    for mismatch in mismatches:
+        click.echo(
+            f"user={mismatch['user_id']} caliber={mismatch['caliber']} "
+            f"expected={mismatch['expected']} stored={mismatch['actual']}"
+        )
+
+    if check_only:
+        click.echo(f"{len(mismatches)} mismatched rollup rows")
+        if mismatches:
+            raise SystemExit(1)
+    else:
+        click.echo(f"Rollup rebuilt ({len(mismatches)} rows corrected)")
@@ -0,0 +1,192 @@
+import logging
+import threading
+from models import db, User, CaliberThreshold
+from upc_lookup import TTLCache
+
+# Per-user stock thresholds (critical / low / target rounds) by caliber.
+#
+# Thresholds a user has saved live in caliber_thresholds; every other caliber
+# uses DEFAULT_THRESHOLDS. Each process caches a user's saved thresholds keyed
+# by (user id, users.thresholds_version). Saving bumps the version in the same
+# transaction, and since the user row is loaded on every request anyway, all
+# workers see the new version on their next request and miss the cache
+# without any extra query to check it.
+
+# Defaults for common calibers; anything else gets FALLBACK_THRESHOLDS
+DEFAULT_THRESHOLDS = {
+    "9mm Luger": {"critical": 100, "low": 200, "target": 500},
+    ".223 Remington": {"critical": 60, "low": 150, "target": 400},
+    "5.56 NATO": {"critical": 60, "low": 150, "target": 400},
+    ".45 ACP": {"critical": 50, "low": 100, "target": 300},
+    ".22 LR": {"critical": 150, "low": 300, "target": 1000},
+    "12 Gauge": {"critical": 25, "low": 50, "target": 200}
+}
+
+FALLBACK_THRESHOLDS = {"critical": 50, "low": 100, "target": 500}
+
+THRESHOLD_LEVELS = ('critical', 'low', 'target')
+
+# Largest number of calibers accepted by one bulk save
+MAX_BULK_THRESHOLDS = 200
+
+# Configuration keys read by init_threshold_cache() and their defaults
+DEFAULT_CONFIG = {
+    'THRESHOLD_CACHE_SIZE': 1024,   # Users whose thresholds are held in-process
+    'THRESHOLD_CACHE_TTL': 3600,    # Seconds before a cached copy is reloaded regardless of version
+}
+
+threshold_cache = TTLCache(DEFAULT_CONFIG['THRESHOLD_CACHE_SIZE'], DEFAULT_CONFIG['THRESHOLD_CACHE_TTL'])
+
+stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(counter):
+    with _stats_lock:
+        stats[counter] += 1
+
+
+def init_threshold_cache(app):
+    """Configure the process-wide threshold cache from the Flask app config"""
+    threshold_cache.max_size = int(app.config.get('THRESHOLD_CACHE_SIZE', DEFAULT_CONFIG['THRESHOLD_CACHE_SIZE']))
+    threshold_cache.ttl = float(app.config.get('THRESHOLD_CACHE_TTL', DEFAULT_CONFIG['THRESHOLD_CACHE_TTL']))
+    threshold_cache.clear()
+
+
+def default_thresholds(caliber):
+    """Built-in thresholds for a caliber"""
+    return dict(DEFAULT_THRESHOLDS.get(caliber, FALLBACK_THRESHOLDS))
+
+
+def load_saved_thresholds(user_id):
+    """Read every threshold a user has saved with one query"""
+    rows = db.session.query(
+        CaliberThreshold.caliber,
+        CaliberThreshold.critical_threshold,
+        CaliberThreshold.low_threshold,
+        CaliberThreshold.target_stock
+    ).filter(CaliberThreshold.user_id == user_id).all()
+
+    return {
+        row.caliber: {"critical": row.critical_threshold, "low": row.low_threshold, "target": row.target_stock}
+        for row in rows
+    }
+
+
+def get_saved_thresholds(user):
+    """
+    Get the thresholds a user has saved, from the cache when it is current.
+
+    Args:
+        user: User whose thresholds_version has been loaded (e.g. current_user)
+
+    Returns:
+        Dictionary mapping caliber to {critical, low, target}; treat as read-only
+    """
+    key = (user.id, user.thresholds_version)
+    found, saved = threshold_cache.get(key)
+    if found:
+        _count('hits')
+        return saved
+
+    _count('misses')
+    saved = load_saved_thresholds(user.id)
+    threshold_cache.set(key, saved)
+    return saved
+
+
+def get_thresholds(user, caliber):
+    """Thresholds in effect for one caliber (saved, else default)"""
+    saved = get_saved_thresholds(user).get(caliber)
+    return dict(saved) if saved else default_thresholds(caliber)
+
+
+def get_all_thresholds(user, calibers=None):
+    """
+    Thresholds in effect for many calibers at once.
+
+    Args:
+        user: User to read thresholds for
+        calibers: Calibers to include; defaults to every caliber with a saved
+            or built-in threshold
+
+    Returns:
+        Dictionary mapping caliber to {critical, low, target}
+    """
+    saved = get_saved_thresholds(user)
+    if calibers is None:
+        calibers = sorted(set(DEFAULT_THRESHOLDS) | set(saved))
+    return {caliber: dict(saved[caliber]) if caliber in saved else default_thresholds(caliber)
+            for caliber in calibers}
+
+
+def parse_thresholds(values):
+    """
+    Validate one caliber's threshold values.
+
+    Returns:
+        Dictionary with integer critical, low and target
+
+    Raises:
+        ValueError: If a value is missing, not a whole number, negative or out of order
+    """
+    try:
+        thresholds = {level: int(values[level]) for level in THRESHOLD_LEVELS}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("critical, low and target must all be whole numbers")
+
+    if thresholds['critical'] < 0:
+        raise ValueError("Thresholds cannot be negative")
+    if not thresholds['critical'] <= thresholds['low'] <= thresholds['target']:
+        raise ValueError("Thresholds must satisfy critical <= low <= target")
+    return thresholds
+
+
+def save_thresholds(user, updates):
+    """
+    Store thresholds for one or more calibers and invalidate cached copies.
+
+    The caller is responsible for committing.
+
+    Args:
+        user: User the thresholds belong to
+        updates: Dictionary mapping caliber to {critical, low, target}
+
+    Raises:
+        ValueError: If a caliber name or any value is invalid
+    """
+    parsed = {}
+    for caliber, values in updates.items():
+        caliber = (caliber or '').strip()
+        if not caliber or len(caliber) > 50:
+            raise ValueError("Caliber names must be 1 to 50 characters")
+        try:
+            parsed[caliber] = parse_thresholds(values)
+        except ValueError as e:
+            raise ValueError(f"{caliber}: {str(e)}")
+
+    if not parsed:
+        return
+
+    existing = {
+        row.caliber: row
+        for row in CaliberThreshold.query.filter(
+            CaliberThreshold.user_id == user.id,
+            CaliberThreshold.caliber.in_(list(parsed))
+        )
+    }
+
+    for caliber, thresholds in parsed.items():
+        row = existing.get(caliber)
+        if row is None:
+            row = CaliberThreshold(caliber=caliber, user_id=user.id)
+            db.session.add(row)
+        row.critical_threshold = thresholds['critical']
+        row.low_threshold = thresholds['low']
+        row.target_stock = thresholds['target']
+
+    # Incremented in SQL at flush so concurrent saves never reuse a version;
+    # stock_alerts re-evaluates the saved calibers' status in the same flush
+    user.thresholds_version = User.thresholds_version + 1
+
+    logging.info(f"Saved thresholds for {len(parsed)} calibers for user {user.id}")
@@ -1,32 +1,17 @@
 from flask import request, jsonify, Response, session
 from models import db, AmmoBox, UpcData
+from flask_login import current_user
+from csv_export import inventory_csv_response
+from caliber_thresholds import get_thresholds as get_thresholds_for_user, save_thresholds as save_thresholds_for_user
+from csv_import import import_inventory_csv as bulk_import_inventory_csv, format_errors, import_message
 
 # Functions for CSV export/import and threshold settings
 
 def export_inventory_csv():
     """Export inventory data as CSV file"""
     try:
-        # Get all inventory items
-        items = AmmoBox.query.all()
-        
-        # Create CSV content
-        csv_content = "name,upc,caliber,count_per_box,quantity,notes\n"
-        
-        for item in items:
-            # Format notes to handle commas and quotes
-            notes = item.notes.replace('"', '""') if item.notes else ""
-            
-            row = f'"{item.name}","{item.upc}","{item.caliber}",{item.count_per_box},{item.quantity},"{notes}"\n'
-            csv_content += row
-        
-        # Create response with CSV file
-        response = Response(
-            csv_content,
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment;filename=ammo_inventory.csv"}
-        )
-        
-        return response
+        # Stream the file instead of building it in memory
+        return inventory_csv_response()
         
     except Exception as e:
         return jsonify({
@@ -80,85 +65,18 @@ def import_inventory_csv(request_obj):
         })
     
     try:
-        # Read the CSV file as text
-        csv_content = file.read().decode('utf-8')
-        lines = csv_content.strip().split('\n')
-        
-        # Check header
-        header = lines[0].lower()
-        expected_header = "name,upc,caliber,count_per_box,quantity,notes"
-        
-        if header != expected_header:
-            return jsonify({
-                'success': False,
-                'message': f'Invalid CSV format. Expected header: {expected_header}'
-            })
-        
-        # Process data rows
-        items_added = 0
-        errors = []
-        
-        for i, line in enumerate(lines[1:], 2):  # Start at line 2 (1-indexed)
-            try:
-                # Simple CSV parsing (doesn't handle all edge cases)
-                fields = []
-                in_quotes = False
-                current_field = ""
-                
-                for char in line:
-                    if char == '"':
-                        in_quotes = not in_quotes
-                    elif char == ',' and not in_quotes:
-                        fields.append(current_field)
-                        current_field = ""
-                    else:
-                        current_field += char
-                
-                # Don't forget the last field
-                fields.append(current_field)
-                
-                # Check if we have the expected number of fields
-                if len(fields) != 6:
-                    errors.append(f"Line {i}: Expected 6 fields, got {len(fields)}")
-                    continue
-                
-                # Extract fields
-                name = fields[0].strip('"')
-                upc = fields[1].strip('"')
-                caliber = fields[2].strip('"')
-                
-                try:
-                    count_per_box = int(fields[3])
-                    quantity = int(fields[4])
-                except ValueError:
-                    errors.append(f"Line {i}: count_per_box and quantity must be integers")
-                    continue
-                
-                notes = fields[5].strip('"')
-                
-                # Create new AmmoBox
-                ammo_box = AmmoBox(
-                    name=name,
-                    upc=upc,
-                    caliber=caliber,
-                    count_per_box=count_per_box,
-                    quantity=quantity,
-                    notes=notes
-                )
-                
-                # Add to database
-                db.session.add(ammo_box)
-                items_added += 1
-                
-            except Exception as e:
-                errors.append(f"Line {i}: {str(e)}")
-        
-        # Commit changes
+        # Parse, validate and load the file in chunks
+        result = bulk_import_inventory_csv(file.stream, mode=request_obj.form.get('mode', 'append'))
         db.session.commit()
         
+        errors = format_errors(result['errors'])
         return jsonify({
             'success': True,
-            'message': f'Successfully imported {items_added} items',
+            'message': import_message(result),
+            'inserted': result['inserted'],
+            'updated': result['updated'],
+            'unchanged': result['unchanged'],
+            'error_count': len(result['errors']),
             'errors': errors if errors else None
         })
         
@@ -171,23 +89,13 @@ def import_inventory_csv(request_obj):
 
 def save_caliber_thresholds(request_obj):
     """Save threshold settings for a caliber"""
-    data = request_obj.json
+    data = request_obj.json or {}
     
     try:
-        caliber = data['caliber']
-        critical = int(data['critical'])
-        low = int(data['low'])
-        target = int(data['target'])
-        
-        # Update the default thresholds in session
-        if 'thresholds' not in session:
-            session['thresholds'] = {}
-        
-        session['thresholds'][caliber] = {
-            'critical': critical,
-            'low': low,
-            'target': target
-        }
+        caliber = data.get('caliber')
+        save_thresholds_for_user(current_user, {caliber: data})
+        db.session.commit()
+        session.pop('thresholds', None)
         
         return jsonify({
             'success': True,
@@ -195,6 +103,7 @@ def save_caliber_thresholds(request_obj):
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': str(e)
@@ -202,23 +111,7 @@ def save_caliber_thresholds(request_obj):
 
 def get_caliber_thresholds(caliber):
     """Get threshold settings for a caliber"""
-    # Get thresholds from session if they exist
-    thresholds = {}
-    if 'thresholds' in session and caliber in session['thresholds']:
-        thresholds = session['thresholds'][caliber]
-    
-    if not thresholds:
-        # Return default thresholds if none are set
-        default_thresholds = {
-            "9mm Luger": {"critical": 100, "low": 200, "target": 500},
-            ".223 Remington": {"critical": 60, "low": 150, "target": 400},
-            "5.56 NATO": {"critical": 60, "low": 150, "target": 400},
-            ".45 ACP": {"critical": 50, "low": 100, "target": 300},
-            ".22 LR": {"critical": 150, "low": 300, "target": 1000},
-            "12 Gauge": {"critical": 25, "low": 50, "target": 200}
-        }
-        
-        thresholds = default_thresholds.get(caliber, {"critical": 50, "low": 100, "target": 500})
+    thresholds = get_thresholds_for_user(current_user, caliber)
     
     return jsonify({
         'success': True,
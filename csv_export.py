@@ -0,0 +1,164 @@
+import csv
+import io
+import logging
+import zlib
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from models import db, AmmoBox, RangeTrip, RangeTripItem
+
+# Streaming CSV exports.
+#
+# Rows are read as plain column tuples in chunks through a server-side cursor
+# (yield_per), written with the csv module into a small buffer, and sent as
+# soon as each chunk is ready, optionally gzip-compressed on the way out. The
+# whole result set is never held in memory and the first bytes go out after
+# the first chunk, however large the table is.
+
+# Rows fetched per round trip and written per response chunk
+EXPORT_CHUNK_SIZE = 500
+
+# (CSV header, column) pairs for each export, in file order. The inventory
+# header is also the header import_csv expects.
+INVENTORY_COLUMNS = [
+    ('name', AmmoBox.name),
+    ('upc', AmmoBox.upc),
+    ('caliber', AmmoBox.caliber),
+    ('count_per_box', AmmoBox.count_per_box),
+    ('quantity', AmmoBox.quantity),
+    ('notes', AmmoBox.notes)
+]
+
+RANGE_TRIP_COLUMNS = [
+    ('id', RangeTrip.id),
+    ('name', RangeTrip.name),
+    ('date', RangeTrip.date),
+    ('location', RangeTrip.location),
+    ('status', RangeTrip.status),
+    ('temperature', RangeTrip.temperature),
+    ('weather_condition', RangeTrip.weather_condition),
+    ('wind_speed', RangeTrip.wind_speed),
+    ('humidity', RangeTrip.humidity),
+    ('notes', RangeTrip.notes)
+]
+
+RANGE_TRIP_ITEM_COLUMNS = [
+    ('range_trip_id', RangeTripItem.range_trip_id),
+    ('range_trip_name', RangeTrip.name),
+    ('range_trip_date', RangeTrip.date),
+    ('name', RangeTripItem.name),
+    ('caliber', RangeTripItem.caliber),
+    ('count_per_box', RangeTripItem.count_per_box),
+    ('quantity_out', RangeTripItem.quantity_out),
+    ('quantity_in', RangeTripItem.quantity_in),
+    ('rounds_used', RangeTripItem.rounds_used)
+]
+
+
+def stream_rows(statement, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of row tuples from a select, chunk_size rows at a time.
+
+    yield_per makes SQLAlchemy use a server-side cursor where the driver
+    supports one (psycopg2 opens a named cursor), so only one chunk is
+    buffered on the client at a time.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def csv_chunks(header, row_chunks):
+    """
+    Write a header and chunks of rows as CSV, yielding one string per chunk.
+
+    Text fields are quoted and numbers are not, as in the original export.
+    None is written as an empty field.
+    """
+    buffer = io.StringIO()
+    # The header is written unquoted so import_csv recognises it
+    buffer.write(','.join(header) + '\n')
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+
+    for rows in row_chunks:
+        writer.writerows(tuple('' if value is None else value for value in row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of strings on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(columns, statement, filename, compress=False):
+    """
+    Build a streaming CSV download.
+
+    Args:
+        columns: (header, column) pairs, in file order
+        statement: Select returning the columns in the same order
+        filename: Download name without extension
+        compress: Gzip the body (the download gets a .csv.gz name)
+
+    Returns:
+        Flask Response that streams the file
+    """
+    header = [name for name, _ in columns]
+
+    def generate():
+        try:
+            chunks = csv_chunks(header, stream_rows(statement))
+            if compress:
+                yield from gzip_chunks(chunks)
+            else:
+                for chunk in chunks:
+                    yield chunk.encode('utf-8')
+        except Exception as e:
+            # Headers are already sent; all we can do is cut the download short
+            logging.error(f"Error streaming {filename} export: {str(e)}")
+            raise
+
+    if compress:
+        mimetype, filename = 'application/gzip', f"{filename}.csv.gz"
+    else:
+        mimetype, filename = 'text/csv', f"{filename}.csv"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
+    )
+
+
+def inventory_csv_response(compress=False):
+    """Stream the inventory as CSV in the import format"""
+    statement = select(*[column for _, column in INVENTORY_COLUMNS]).order_by(
+        AmmoBox.caliber, AmmoBox.name, AmmoBox.id)
+    return csv_response(INVENTORY_COLUMNS, statement, 'ammo_inventory', compress)
+
+
+def range_trips_csv_response(compress=False):
+    """Stream all range trips as CSV"""
+    statement = select(*[column for _, column in RANGE_TRIP_COLUMNS]).order_by(
+        RangeTrip.date, RangeTrip.id)
+    return csv_response(RANGE_TRIP_COLUMNS, statement, 'range_trips', compress)
+
+
+def range_trip_items_csv_response(compress=False):
+    """Stream the ammunition checked out on every range trip as CSV"""
+    statement = select(*[column for _, column in RANGE_TRIP_ITEM_COLUMNS]).join(
+        RangeTrip, RangeTripItem.range_trip_id == RangeTrip.id
+    ).order_by(RangeTrip.date, RangeTripItem.range_trip_id, RangeTripItem.id)
+    return csv_response(RANGE_TRIP_ITEM_COLUMNS, statement, 'range_trip_items', compress)
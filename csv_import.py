@@ -0,0 +1,499 @@
+import codecs
+import csv
+import io
+from datetime import datetime
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, cast, func, insert, literal, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, AmmoBox, UpcData
+from caliber_rollups import apply_rollup_delta
+
+# Bulk inventory import from CSV.
+#
+# The upload is parsed incrementally with the csv module (quoted commas,
+# doubled quotes and embedded newlines all work) and validated a chunk at a
+# time. Valid rows are loaded into a temporary staging table, with COPY on
+# Postgres and an executemany INSERT elsewhere, then moved into ammo_boxes
+# with one INSERT ... SELECT. The caliber rollups are updated from a single
+# aggregate over the staging table, since the bulk insert bypasses the ORM.
+#
+# In the "add" and "replace" modes rows are merged on (user_id, upc) instead:
+# boxes already in the inventory get their quantity increased or replaced,
+# new UPCs are inserted, and the UPC catalog is upserted with
+# INSERT ... ON CONFLICT so later scans of those boxes resolve locally.
+
+# Header the file must start with (the inventory export writes the same one)
+IMPORT_COLUMNS = ('name', 'upc', 'caliber', 'count_per_box', 'quantity', 'notes')
+
+# How imported rows combine with the existing inventory: append always creates
+# new boxes, add and replace merge on UPC
+IMPORT_MODES = ('append', 'add', 'replace')
+MERGE_MODES = ('add', 'replace')
+
+# Rows validated and loaded per batch
+IMPORT_CHUNK_SIZE = 5000
+
+# Errors listed in the response; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Longest values the ammo_boxes columns accept
+FIELD_LIMITS = {'name': 255, 'upc': 20, 'caliber': 50}
+
+# Fields that may not be blank (merging also needs the UPC)
+REQUIRED_FIELDS = ('name', 'caliber')
+
+ammo_table = AmmoBox.__table__
+upc_table = UpcData.__table__
+
+staging_metadata = MetaData()
+
+# Per-connection scratch table holding one import's validated rows
+staging_table = Table(
+    'ammo_import_staging', staging_metadata,
+    Column('line', Integer, primary_key=True),
+    Column('name', String(255), nullable=False),
+    Column('upc', String(20), nullable=False),
+    Column('caliber', String(50), nullable=False),
+    Column('count_per_box', Integer, nullable=False),
+    Column('quantity', Integer, nullable=False),
+    Column('notes', Text),
+    prefixes=['TEMPORARY']
+)
+
+# Existing box each merged UPC resolves to, with its quantity after the import
+match_table = Table(
+    'ammo_import_matches', staging_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('upc', String(20), nullable=False),
+    Column('quantity', Integer, nullable=False),
+    prefixes=['TEMPORARY']
+)
+
+STAGING_COLUMNS = tuple(column.name for column in staging_table.columns)
+
+
+def read_csv_rows(stream):
+    """
+    Parse an uploaded CSV file incrementally.
+
+    Args:
+        stream: Binary file object (or any iterable of UTF-8 byte lines)
+
+    Returns:
+        Iterator of (line number, list of fields) for each data row; the line
+        number is where the record starts in the file
+
+    Raises:
+        ValueError: If the file is empty or the header is not IMPORT_COLUMNS
+    """
+    reader = csv.reader(codecs.iterdecode(stream, 'utf-8-sig'))
+    check_header(next(reader, None))
+    return numbered_rows(reader)
+
+
+def check_header(header):
+    """
+    Make sure a parsed header row matches IMPORT_COLUMNS.
+
+    Raises:
+        ValueError: If the header is missing or different
+    """
+    if header is None:
+        raise ValueError('The CSV file is empty')
+    if tuple(field.strip().lower() for field in header) != IMPORT_COLUMNS:
+        raise ValueError(f"Invalid CSV format. Expected header: {','.join(IMPORT_COLUMNS)}")
+
+
+def numbered_rows(reader, first_line=1):
+    """
+    Yield (line number, fields) for the non-blank records of a csv.reader.
+
+    Args:
+        reader: csv.reader positioned at the first record to number
+        first_line: File line number of the reader's first line
+    """
+    line_offset = first_line - 1
+    while True:
+        line = line_offset + reader.line_num + 1
+        try:
+            fields = next(reader)
+        except StopIteration:
+            return
+        # Skip blank lines
+        if fields:
+            yield line, fields
+
+
+def iter_chunks(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Group an iterator of rows into lists of at most chunk_size"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_row(fields, require_upc=False):
+    """
+    Check one CSV row and convert it to column values.
+
+    Args:
+        fields: List of field strings
+        require_upc: Reject rows without a UPC (needed to merge)
+
+    Returns:
+        Tuple of (dictionary of IMPORT_COLUMNS values or None, error message or None)
+    """
+    if len(fields) != len(IMPORT_COLUMNS):
+        return None, f"Expected {len(IMPORT_COLUMNS)} fields, got {len(fields)}"
+
+    row = dict(zip(IMPORT_COLUMNS, (field.strip() for field in fields)))
+
+    required = REQUIRED_FIELDS + ('upc',) if require_upc else REQUIRED_FIELDS
+    for field in required:
+        if not row[field]:
+            return None, f"{field} is required"
+
+    for field, limit in FIELD_LIMITS.items():
+        if len(row[field]) > limit:
+            return None, f"{field} is longer than {limit} characters"
+
+    try:
+        row['count_per_box'] = int(row['count_per_box'])
+        row['quantity'] = int(row['quantity'])
+    except ValueError:
+        return None, "count_per_box and quantity must be integers"
+
+    if row['count_per_box'] < 0 or row['quantity'] < 0:
+        return None, "count_per_box and quantity cannot be negative"
+
+    row['notes'] = row['notes'] or None
+    return row, None
+
+
+def validate_chunk(chunk, require_upc=False):
+    """
+    Validate a chunk of (line number, fields) rows.
+
+    Returns:
+        Tuple of (list of staging row tuples, list of (line number, message) errors)
+    """
+    valid = []
+    errors = []
+    for line, fields in chunk:
+        row, error = validate_row(fields, require_upc)
+        if error:
+            errors.append((line, error))
+        else:
+            valid.append((line,) + tuple(row[field] for field in IMPORT_COLUMNS))
+    return valid, errors
+
+
+def _use_copy(connection):
+    """COPY is only available on Postgres"""
+    return connection.dialect.name == 'postgresql'
+
+
+def _copy_rows(connection, rows):
+    """Load staging rows with COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    buffer.seek(0)
+
+    # COPY reads an empty unquoted field as NULL. A blank UPC (allowed in
+    # append mode) must stay '' as it does through the INSERT fallback;
+    # notes is None for blank notes and is meant to load as NULL.
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {staging_table.name} ({', '.join(STAGING_COLUMNS)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NOT_NULL (name, upc, caliber))",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_rows(connection, rows):
+    """Fallback for other backends: one executemany INSERT per chunk"""
+    connection.execute(insert(staging_table), [dict(zip(STAGING_COLUMNS, row)) for row in rows])
+
+
+def load_staging_rows(connection, rows):
+    """Append validated rows to the staging table"""
+    if not rows:
+        return
+    if _use_copy(connection):
+        _copy_rows(connection, rows)
+    else:
+        _insert_rows(connection, rows)
+
+
+def merge_staging_rows(connection, user_id=None):
+    """
+    Insert every staged row into ammo_boxes with one INSERT ... SELECT and
+    apply the matching rollup deltas.
+
+    Returns:
+        Number of ammo boxes inserted
+    """
+    now = datetime.utcnow()
+    staged = staging_table.c
+
+    result = connection.execute(
+        insert(ammo_table).from_select(
+            ['user_id', 'name', 'upc', 'caliber', 'count_per_box', 'quantity',
+             'total_rounds', 'notes', 'created_at', 'updated_at'],
+            select(
+                cast(literal(user_id), Integer), staged.name, staged.upc, staged.caliber,
+                staged.count_per_box, staged.quantity, staged.count_per_box * staged.quantity,
+                staged.notes, literal(now, ammo_table.c.created_at.type),
+                literal(now, ammo_table.c.updated_at.type)
+            ).order_by(staged.line)
+        )
+    )
+
+    totals = connection.execute(
+        select(
+            staged.caliber,
+            func.sum(staged.count_per_box * staged.quantity),
+            func.sum(staged.quantity),
+            func.count()
+        ).group_by(staged.caliber)
+    ).all()
+    for caliber, rounds, boxes, items in totals:
+        apply_rollup_delta(connection, user_id, caliber, rounds=int(rounds), boxes=int(boxes), items=int(items))
+
+    return result.rowcount
+
+
+def _owner_filter(user_id):
+    if user_id is None:
+        return ammo_table.c.user_id.is_(None)
+    return ammo_table.c.user_id == user_id
+
+
+def _incoming_rows(mode):
+    """
+    Collapse the staged rows to one per UPC.
+
+    Names, caliber, box count and notes come from the last row for a UPC. In
+    add mode its quantities are summed; in replace mode the last row wins.
+    """
+    staged = staging_table.c
+    keys = select(
+        staged.upc,
+        func.max(staged.line).label('last_line'),
+        func.sum(staged.quantity).label('total_quantity')
+    ).group_by(staged.upc).subquery('incoming_keys')
+
+    last = staging_table.alias('last_row')
+    quantity = keys.c.total_quantity if mode == 'add' else last.c.quantity
+    return select(
+        keys.c.upc, last.c.name, last.c.caliber, last.c.count_per_box, last.c.notes,
+        quantity.label('quantity')
+    ).join(last, last.c.line == keys.c.last_line).subquery('incoming')
+
+
+def _upsert_statement(connection, table):
+    """INSERT with ON CONFLICT support for the connection's dialect"""
+    if connection.dialect.name == 'postgresql':
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def upsert_upc_catalog(connection, incoming):
+    """Insert or refresh the UpcData row of every imported UPC in one statement"""
+    stmt = _upsert_statement(connection, upc_table).from_select(
+        ['upc', 'name', 'caliber', 'count_per_box', 'created_at'],
+        # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+        select(
+            incoming.c.upc, incoming.c.name, incoming.c.caliber, incoming.c.count_per_box,
+            literal(datetime.utcnow(), upc_table.c.created_at.type)
+        ).where(true())
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['upc'],
+        set_={
+            'name': stmt.excluded.name,
+            'caliber': stmt.excluded.caliber,
+            'count_per_box': stmt.excluded.count_per_box
+        }
+    ))
+
+
+def merge_staging_rows_by_upc(connection, user_id=None, mode='add'):
+    """
+    Merge the staged rows into the owner's inventory by UPC.
+
+    ammo_boxes has no unique key on (user_id, upc), since an inventory may
+    hold several boxes of one UPC, so each UPC is matched to the owner's
+    oldest box with that UPC. Matched boxes are updated with one
+    UPDATE ... FROM, the other UPCs are inserted with one INSERT ... SELECT,
+    and total_rounds is recomputed in SQL.
+
+    Args:
+        connection: Connection holding the staging table
+        user_id: Owner of the inventory being merged into
+        mode: "add" to add quantities, "replace" to overwrite them
+
+    Returns:
+        Dictionary with inserted, updated and unchanged counts
+    """
+    incoming = _incoming_rows(mode)
+    boxes = ammo_table.c
+    matches = match_table.c
+
+    # Pick the box each UPC merges into and work out its new quantity
+    existing = select(func.min(boxes.id).label('id'), boxes.upc).where(
+        _owner_filter(user_id),
+        boxes.upc.in_(select(staging_table.c.upc))
+    ).group_by(boxes.upc).subquery('existing')
+
+    new_quantity = boxes.quantity + incoming.c.quantity if mode == 'add' else incoming.c.quantity
+    connection.execute(insert(match_table).from_select(
+        ['id', 'upc', 'quantity'],
+        select(existing.c.id, existing.c.upc, new_quantity)
+        .select_from(existing)
+        .join(ammo_table, boxes.id == existing.c.id)
+        .join(incoming, incoming.c.upc == existing.c.upc)
+    ))
+    matched = connection.execute(select(func.count()).select_from(match_table)).scalar()
+
+    # Rollup deltas for the boxes whose quantity changes, computed before updating them
+    changed = (matches.quantity != boxes.quantity)
+    update_totals = connection.execute(
+        select(
+            boxes.caliber,
+            func.sum(boxes.count_per_box * matches.quantity - boxes.total_rounds),
+            func.sum(matches.quantity - boxes.quantity)
+        ).join(match_table, matches.id == boxes.id).where(changed).group_by(boxes.caliber)
+    ).all()
+
+    updated = connection.execute(
+        update(ammo_table).where(boxes.id == matches.id, changed).values(
+            quantity=matches.quantity,
+            total_rounds=boxes.count_per_box * matches.quantity
+        )
+    ).rowcount
+
+    # Everything else is a new box
+    new_rows = select(incoming).where(incoming.c.upc.not_in(select(matches.upc))).subquery('new_rows')
+    insert_totals = connection.execute(
+        select(
+            new_rows.c.caliber,
+            func.sum(new_rows.c.count_per_box * new_rows.c.quantity),
+            func.sum(new_rows.c.quantity),
+            func.count()
+        ).group_by(new_rows.c.caliber)
+    ).all()
+
+    now = datetime.utcnow()
+    inserted = connection.execute(
+        insert(ammo_table).from_select(
+            ['user_id', 'name', 'upc', 'caliber', 'count_per_box', 'quantity',
+             'total_rounds', 'notes', 'created_at', 'updated_at'],
+            select(
+                cast(literal(user_id), Integer), new_rows.c.name, new_rows.c.upc, new_rows.c.caliber,
+                new_rows.c.count_per_box, new_rows.c.quantity, new_rows.c.count_per_box * new_rows.c.quantity,
+                new_rows.c.notes, literal(now, ammo_table.c.created_at.type),
+                literal(now, ammo_table.c.updated_at.type)
+            )
+        )
+    ).rowcount
+
+    upsert_upc_catalog(connection, incoming)
+
+    for caliber, rounds, box_count in update_totals:
+        apply_rollup_delta(connection, user_id, caliber, rounds=int(rounds), boxes=int(box_count))
+    for caliber, rounds, box_count, items in insert_totals:
+        apply_rollup_delta(connection, user_id, caliber, rounds=int(rounds), boxes=int(box_count), items=int(items))
+
+    return {'inserted': inserted, 'updated': updated, 'unchanged': matched - updated}
+
+
+def _scratch_tables(mode):
+    return (staging_table, match_table) if mode in MERGE_MODES else (staging_table,)
+
+
+def create_scratch_tables(connection, mode):
+    """Create the temporary tables an import in this mode loads into"""
+    # A failed import on a connection without transactional DDL can leave the tables behind
+    for table in _scratch_tables(mode):
+        table.drop(connection, checkfirst=True)
+        table.create(connection)
+
+
+def merge_scratch_tables(connection, user_id, mode):
+    """
+    Move everything staged so far into ammo_boxes and drop the scratch tables.
+
+    Returns:
+        Dictionary with inserted, updated and unchanged counts
+    """
+    if mode in MERGE_MODES:
+        counts = merge_staging_rows_by_upc(connection, user_id, mode)
+    else:
+        counts = {'inserted': merge_staging_rows(connection, user_id), 'updated': 0, 'unchanged': 0}
+
+    for table in _scratch_tables(mode):
+        table.drop(connection)
+    return counts
+
+
+def import_message(result):
+    """One-line summary of an import result for the user"""
+    if result['updated'] or result['unchanged']:
+        return (f"Imported {result['inserted']} new items, updated {result['updated']}, "
+                f"{result['unchanged']} unchanged")
+    return f"Successfully imported {result['inserted']} items"
+
+
+def format_errors(errors, limit=MAX_REPORTED_ERRORS):
+    """Turn (line number, message) pairs into report strings, capped at limit"""
+    report = [f"Line {line}: {message}" for line, message in errors[:limit]]
+    if len(errors) > limit:
+        report.append(f"... and {len(errors) - limit} more errors")
+    return report
+
+
+def import_inventory_csv(stream, user_id=None, chunk_size=IMPORT_CHUNK_SIZE, mode='append'):
+    """
+    Bulk import ammo boxes from a CSV upload.
+
+    Every valid row is imported and invalid rows are reported by line. The
+    caller is responsible for committing.
+
+    Args:
+        stream: Binary file object of the upload
+        user_id: Owner recorded on the imported boxes
+        chunk_size: Rows validated and loaded per batch
+        mode: One of IMPORT_MODES
+
+    Returns:
+        Dictionary with inserted, updated and unchanged counts, errors (list
+        of (line, message)) and rows (data rows read)
+
+    Raises:
+        ValueError: If the mode is unknown, the file is empty or has the wrong header
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+
+    rows = read_csv_rows(stream)
+    connection = db.session.connection()
+    create_scratch_tables(connection, mode)
+
+    errors = []
+    row_count = 0
+    for chunk in iter_chunks(rows, chunk_size):
+        row_count += len(chunk)
+        valid, chunk_errors = validate_chunk(chunk, require_upc=mode in MERGE_MODES)
+        errors.extend(chunk_errors)
+        load_staging_rows(connection, valid)
+
+    counts = merge_scratch_tables(connection, user_id, mode)
+    return dict(counts, errors=errors, rows=row_count)
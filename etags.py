@@ -0,0 +1,122 @@
+import hashlib
+import threading
+from functools import wraps
+from flask import request, session, current_app, make_response
+from flask.globals import request_ctx
+from flask_login import current_user
+from page_cache import shared_version
+from upc_lookup import catalog_version
+
+# Conditional GET (ETag / If-None-Match) for pages and JSON reads.
+#
+# A response's ETag is a hash of the same counters the page cache keys on:
+# users.data_version for data owned by the user, the shared 'inventory'
+# counter in data_versions for inventory (both bumped by the routes that
+# write, see page_cache.py) and the 'upc_catalog' counter for the UPC
+# catalog (see upc_lookup.py). All are known before the view runs, so a
+# client that already holds the current representation gets a 304 without a
+# single query beyond the counter lookups and no template rendering. The
+# path and query string are part of the tag, so every URL and filter
+# combination validates independently.
+#
+# Responses are private to the logged-in user. "no-cache" lets the browser
+# store them but makes it revalidate on every use, which with a 304 costs a
+# round trip and a few hundred bytes.
+
+# Browser stores the response and revalidates it on every use
+REVALIDATE = 'private, no-cache'
+
+# Browser reuses the response for a short while before revalidating
+SHORT_LIVED = 'private, max-age=30'
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(view, counter):
+    with _stats_lock:
+        counts = _stats.setdefault(view, {'not_modified': 0, 'full': 0, 'untagged': 0})
+        counts[counter] += 1
+
+
+def stats():
+    """Per-view counts of 304s, full responses and responses sent without an ETag"""
+    with _stats_lock:
+        return {view: dict(counts) for view, counts in _stats.items()}
+
+
+def compute_etag(view, shared=False, catalog=False):
+    """
+    ETag for the current request, computed without running the view.
+
+    Args:
+        view: Name of the endpoint, part of the tag
+        shared: The response shows inventory shared between users
+        catalog: The response shows the UPC catalog
+
+    Returns:
+        Quoted strong ETag value
+    """
+    parts = [view, request.full_path]
+    if current_user.is_authenticated:
+        parts += [current_user.id, current_user.data_version]
+    if shared:
+        parts.append(shared_version())
+    if catalog:
+        parts.append(catalog_version())
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def uncacheable(response):
+    """Mark a response that must not be stored or answered with a 304 later"""
+    response = make_response(response)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def conditional_get(view, shared=False, catalog=False, cache_control=REVALIDATE):
+    """
+    Answer If-None-Match with 304 Not Modified while the data is unchanged.
+
+    Place below @login_required and above @cached_page. Successful responses
+    get an ETag and the given Cache-Control policy, except those the view
+    already gave a Cache-Control header (see uncacheable()) and pages that
+    showed a flash message.
+
+    Args:
+        view: Name of the endpoint in ETags and statistics
+        shared: The response shows inventory shared between users
+        catalog: The response shows the UPC catalog
+        cache_control: Cache-Control header for tagged responses
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages must be rendered, not answered from the browser's copy
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                _count(view, 'untagged')
+                return fn(*args, **kwargs)
+
+            etag = compute_etag(view, shared, catalog)
+            if request.if_none_match.contains_weak(etag.strip('"')):
+                _count(view, 'not_modified')
+                response = current_app.response_class(status=304)
+                response.headers['ETag'] = etag
+                response.headers['Cache-Control'] = cache_control
+                response.vary.add('Cookie')
+                return response
+
+            response = make_response(fn(*args, **kwargs))
+            if (response.status_code != 200 or 'Cache-Control' in response.headers
+                    or getattr(request_ctx, 'flashes', None)):
+                _count(view, 'untagged')
+                return response
+
+            _count(view, 'full')
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db, Firearm
+from page_cache import cached_page, bumps_data_version
 from datetime import datetime
 from sqlalchemy import func
 
@@ -8,6 +9,7 @@ firearms = Blueprint('firearms', __name__)
 
 @firearms.route('/gunsafe')
 @login_required
+@cached_page('gunsafe')
 def gunsafe():
     """Display the user's firearms collection (GunSafe)"""
     user_firearms = Firearm.query.filter_by(user_id=current_user.id).all()
@@ -26,6 +28,7 @@ def gunsafe():
 
 @firearms.route('/add_firearm', methods=['POST'])
 @login_required
+@bumps_data_version(shared=False)
 def add_firearm():
     """Add a new firearm to the user's collection"""
     try:
@@ -91,6 +94,7 @@ def get_firearm(firearm_id):
 
 @firearms.route('/edit_firearm', methods=['POST'])
 @login_required
+@bumps_data_version(shared=False)
 def edit_firearm():
     """Update an existing firearm"""
     try:
@@ -140,6 +144,7 @@ def edit_firearm():
         
 @firearms.route('/delete_firearm', methods=['POST'])
 @login_required
+@bumps_data_version(shared=False)
 def delete_firearm():
     """Delete a firearm from the collection"""
     try:
@@ -0,0 +1,18 @@
+# Gunicorn settings, read automatically from the working directory.
+#
+# The database is migrated and seeded once in the master process before any
+# worker forks, so workers (and their restarts) only import the app.
+
+
+def on_starting(server):
+    """Migrate and seed the database before the first worker starts"""
+    from app import create_app
+    from models import db
+    from startup import initialize_database
+
+    app = create_app()
+    initialize_database(app)
+
+    # Workers must open their own connections rather than inherit these
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,272 @@
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import time
+from bs4 import BeautifulSoup, SoupStrainer
+
+# HTML parsing for the scraper.
+#
+# Pages are parsed with the fastest BeautifulSoup tree builder available (lxml
+# when installed, html.parser otherwise), and only the regions the scraper
+# reads are turned into a tree: a SoupStrainer skips the navigation, footer,
+# scripts and everything else on the page. Product pages that embed a JSON-LD
+# Product block are read straight from the raw HTML without any tree at all.
+
+# Tree builders in order of preference (all expose the BeautifulSoup API the scraper uses)
+PARSER_BACKENDS = ('lxml', 'html.parser')
+
+# Configured backend: "auto" picks the first available one
+SCRAPER_PARSER = os.environ.get('SCRAPER_PARSER', 'auto')
+
+# Classes of the elements each page type needs (everything inside them is kept)
+SEARCH_REGION_CLASSES = {'product-item', 'product-grid-tile', 'product'}
+PRODUCT_REGION_CLASSES = {'product-name', 'product-info-container', 'product-description',
+                          'product-image-container', 'prices'}
+
+# <script type="application/ld+json"> blocks, found without parsing the document
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*type\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Product identifiers in the order they are tried for the UPC
+GTIN_FIELDS = ('gtin12', 'gtin13', 'gtin', 'gtin14', 'gtin8', 'upc')
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scraper_fixtures')
+
+
+def available_backends():
+    """Parser backends that can be used in this environment"""
+    return [backend for backend in PARSER_BACKENDS
+            if backend == 'html.parser' or importlib.util.find_spec(backend) is not None]
+
+
+def resolve_backend(backend=None):
+    """
+    Pick the parser backend to use.
+
+    Args:
+        backend: Backend name, "auto" or None for the configured default
+
+    Returns:
+        Name of an available backend (falls back to html.parser)
+    """
+    backend = backend or SCRAPER_PARSER
+    available = available_backends()
+    if backend == 'auto':
+        return available[0]
+    if backend not in available:
+        logging.warning(f"HTML parser backend {backend} is not available, using {available[0]}")
+        return available[0]
+    return backend
+
+
+def _region_strainer(classes):
+    """SoupStrainer matching any element that carries one of the given classes"""
+    def has_region_class(value):
+        # Depending on the tree builder this sees single classes or the raw attribute
+        return value is not None and any(cls in classes for cls in value.split())
+
+    return SoupStrainer(class_=has_region_class)
+
+
+SEARCH_STRAINER = _region_strainer(SEARCH_REGION_CLASSES)
+PRODUCT_STRAINER = _region_strainer(PRODUCT_REGION_CLASSES)
+
+
+def parse_html(html, strainer=None, backend=None):
+    """
+    Parse HTML into a BeautifulSoup tree.
+
+    Args:
+        html: Page HTML (str or bytes)
+        strainer: SoupStrainer restricting which elements are built, or None for the whole page
+        backend: Parser backend name (see resolve_backend)
+
+    Returns:
+        BeautifulSoup object
+    """
+    return BeautifulSoup(html, resolve_backend(backend), parse_only=strainer)
+
+
+def parse_search_page(html, backend=None):
+    """Parse only the product tiles of a search results page"""
+    return parse_html(html, SEARCH_STRAINER, backend)
+
+
+def parse_product_page(html, backend=None):
+    """Parse only the name, attribute, description, image and price regions of a product page"""
+    return parse_html(html, PRODUCT_STRAINER, backend)
+
+
+def _json_ld_objects(data):
+    """Yield every object in a JSON-LD document, including @graph members"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _json_ld_objects(item)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from _json_ld_objects(data['@graph'])
+
+
+def _is_product(obj):
+    types = obj.get('@type')
+    types = types if isinstance(types, list) else [types]
+    return 'Product' in types
+
+
+def _first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+
+def _normalize_gtin(value):
+    """Reduce a GTIN to digits; a GTIN-13/14 with leading zeros becomes a 12 digit UPC"""
+    digits = re.sub(r'[^0-9]', '', str(value or ''))
+    while len(digits) > 12 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits or None
+
+
+def _format_price(offers):
+    offer = _first(offers)
+    if not isinstance(offer, dict):
+        return None
+
+    price = offer.get('price', offer.get('lowPrice'))
+    if price in (None, ''):
+        return None
+    try:
+        amount = f"{float(price):.2f}"
+    except (TypeError, ValueError):
+        return str(price)
+
+    currency = offer.get('priceCurrency', 'USD')
+    return f"${amount}" if currency == 'USD' else f"{amount} {currency}"
+
+
+def _image_url(image):
+    image = _first(image)
+    if isinstance(image, dict):
+        return image.get('url') or image.get('contentUrl')
+    return image
+
+
+def extract_json_ld_product(html):
+    """
+    Pull product data from the first JSON-LD Product block of a page.
+
+    Works on the raw HTML with a regex; no document tree is built.
+
+    Args:
+        html: Page HTML (str or bytes)
+
+    Returns:
+        Dictionary with whichever of name, upc, price, description and
+        image_url the block provides (empty if the page has no Product block)
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    for block in JSON_LD_PATTERN.findall(html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            continue
+
+        for obj in _json_ld_objects(data):
+            if not _is_product(obj):
+                continue
+
+            product = {
+                'name': (obj.get('name') or '').strip() or None,
+                'upc': next((_normalize_gtin(obj[field]) for field in GTIN_FIELDS if obj.get(field)), None),
+                'price': _format_price(obj.get('offers')),
+                'description': (obj.get('description') or '').strip() or None,
+                'image_url': _image_url(obj.get('image'))
+            }
+            return {key: value for key, value in product.items() if value}
+
+    return {}
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    """
+    Load the saved HTML corpus.
+
+    Files named search_*.html are search result pages and product_*.html are
+    product pages.
+
+    Returns:
+        List of (kind, file name, html) tuples
+    """
+    fixtures = []
+    for name in sorted(os.listdir(fixture_dir)):
+        kind = name.split('_', 1)[0]
+        if kind in ('search', 'product') and name.endswith('.html'):
+            with open(os.path.join(fixture_dir, name), encoding='utf-8') as f:
+                fixtures.append((kind, name, f.read()))
+    return fixtures
+
+
+def benchmark(fixture_dir=FIXTURE_DIR, rounds=20):
+    """
+    Measure parse-and-extract throughput over the fixture corpus.
+
+    Each available backend is timed with a full parse and with the region
+    strainers, and the strained results are checked against the full parse so
+    a speedup never comes from dropping data.
+
+    Returns:
+        List of dictionaries with backend, mode, pages_per_sec and matches_full
+    """
+    from scraper import PalmettoScraper
+
+    scraper = PalmettoScraper(cache=False)
+    fixtures = load_fixtures(fixture_dir)
+    if not fixtures:
+        raise ValueError(f"No fixtures found in {fixture_dir}")
+
+    def extract(kind, html, backend, strained):
+        if kind == 'search':
+            soup = parse_search_page(html, backend) if strained else parse_html(html, backend=backend)
+            return scraper.parse_search_results(soup)
+        soup = parse_product_page(html, backend) if strained else parse_html(html, backend=backend)
+        return scraper.parse_product_details(soup, f"fixture:{kind}")
+
+    # Extraction is logged per product; keep the benchmark output readable
+    previous_level = logging.getLogger('scraper').level
+    logging.getLogger('scraper').setLevel(logging.WARNING)
+    try:
+        results = []
+        for backend in available_backends():
+            expected = [extract(kind, html, backend, False) for kind, _, html in fixtures]
+            for strained in (False, True):
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    output = [extract(kind, html, backend, strained) for kind, _, html in fixtures]
+                elapsed = time.perf_counter() - started
+
+                results.append({
+                    'backend': backend,
+                    'mode': 'strained' if strained else 'full',
+                    'pages_per_sec': round(len(fixtures) * rounds / elapsed, 1),
+                    'matches_full': output == expected
+                })
+    finally:
+        logging.getLogger('scraper').setLevel(previous_level)
+
+    return results
+
+
+# Benchmark usage: python html_parsing.py [fixture_dir] [rounds]
+if __name__ == "__main__":
+    fixture_dir = sys.argv[1] if len(sys.argv) > 1 else FIXTURE_DIR
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"{'backend':<12} {'mode':<9} {'pages/sec':>10}  matches full parse")
+    for row in benchmark(fixture_dir, rounds):
+        print(f"{row['backend']:<12} {row['mode']:<9} {row['pages_per_sec']:>10}  {row['matches_full']}")
@@ -0,0 +1,215 @@
+import email.utils
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+# Persistent HTTP cache for scraper fetches, stored in a SQLite file so it is
+# shared by every worker and survives restarts.
+#
+# Responses are kept per URL with their ETag/Last-Modified validators and an
+# expiry computed from Cache-Control (or Expires). Fresh entries are served
+# from disk; stale ones are revalidated with a conditional request, and a 304
+# refreshes the expiry without downloading the body again. The file is kept
+# under a byte budget by evicting the least recently used entries.
+
+HTTP_CACHE_ENABLED = os.environ.get('SCRAPER_CACHE', 'true').lower() == 'true'
+HTTP_CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'rubyridge-http-cache'))
+HTTP_CACHE_MAX_BYTES = int(float(os.environ.get('SCRAPER_CACHE_MAX_MB', 64)) * 1024 * 1024)
+HTTP_CACHE_DEFAULT_TTL = int(os.environ.get('SCRAPER_CACHE_DEFAULT_TTL', 3600))  # When the server gives no lifetime
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'body', 'encoding', 'etag', 'last_modified', 'expires_at', 'size'])
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: value or True}"""
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+def freshness_lifetime(headers, default_ttl=HTTP_CACHE_DEFAULT_TTL):
+    """
+    Work out how long a response may be served without revalidation.
+
+    Returns:
+        Lifetime in seconds, 0 if it must always be revalidated, or None if it
+        must not be stored at all
+    """
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                return max(0, int(directives[name]))
+            except (TypeError, ValueError):
+                return 0
+
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            expires_at = email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return 0
+        return max(0, int(expires_at - time.time()))
+
+    return default_ttl
+
+
+class HttpCache:
+    """SQLite-backed URL -> response cache with conditional revalidation and LRU eviction"""
+
+    def __init__(self, directory=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES, default_ttl=HTTP_CACHE_DEFAULT_TTL):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'http_cache.sqlite3')
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'bytes_saved': 0}
+
+        self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+
+    def lookup(self, url):
+        """Return the stored CacheEntry for a URL (fresh or stale), or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, body, encoding, etag, last_modified, expires_at, size FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry.expires_at > time.time()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Validators to send when revalidating a stale entry"""
+        headers = {}
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def _count(self, name, amount=1):
+        self.stats[name] += amount
+
+    def record_hit(self, entry):
+        """Serve a fresh entry from disk"""
+        with self.lock:
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), entry.url))
+            self._count('hits')
+            self._count('bytes_saved', entry.size)
+
+    def record_not_modified(self, entry, headers):
+        """Refresh a stale entry after the server answered 304 Not Modified"""
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        now = time.time()
+        with self.lock:
+            if lifetime is None:
+                self.conn.execute("DELETE FROM responses WHERE url = ?", (entry.url,))
+            else:
+                self.conn.execute(
+                    "UPDATE responses SET expires_at = ?, last_access = ?, "
+                    "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (now + lifetime, now, headers.get('ETag'), headers.get('Last-Modified'), entry.url)
+                )
+            self._count('revalidated')
+            self._count('bytes_saved', entry.size)
+
+    def store(self, url, response):
+        """Store a 200 response unless its Cache-Control forbids it"""
+        with self.lock:
+            self._count('misses')
+
+        lifetime = freshness_lifetime(response.headers, self.default_ttl)
+        if lifetime is None or response.status_code != 200:
+            return
+
+        body = response.content
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        # Nothing to revalidate with, so an immediately stale entry would never be reused
+        if lifetime == 0 and not (etag or last_modified):
+            return
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, encoding, etag, last_modified, expires_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body, response.encoding, etag, last_modified, now + lifetime, now, len(body))
+            )
+            self._count('stores')
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes (lock held)"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+            self._count('evictions')
+
+    def hit_ratio(self):
+        lookups = self.stats['hits'] + self.stats['revalidated'] + self.stats['misses']
+        return (self.stats['hits'] + self.stats['revalidated']) / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logging.info(
+            f"HTTP cache: {self.stats['hits']} hits, {self.stats['revalidated']} revalidated, "
+            f"{self.stats['misses']} misses, hit ratio {self.hit_ratio():.1%}, "
+            f"{self.stats['bytes_saved'] / 1024:.1f} KiB saved"
+        )
+
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """Get the process-wide HttpCache, creating it on first use (None if disabled)"""
+    global _http_cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+
+    with _http_cache_lock:
+        if _http_cache is None:
+            try:
+                _http_cache = HttpCache()
+            except (OSError, sqlite3.Error) as e:
+                logging.error(f"Could not open HTTP cache in {HTTP_CACHE_DIR}: {str(e)}")
+                return None
+        return _http_cache
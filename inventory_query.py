@@ -0,0 +1,129 @@
+import base64
+import json
+from sqlalchemy import tuple_, func
+from models import db, AmmoBox
+
+# Keyset-paginated inventory reads for the JSON inventory API
+
+# Fields a client may request, mapped to their columns
+INVENTORY_FIELDS = {
+    'id': AmmoBox.id,
+    'name': AmmoBox.name,
+    'upc': AmmoBox.upc,
+    'caliber': AmmoBox.caliber,
+    'count_per_box': AmmoBox.count_per_box,
+    'quantity': AmmoBox.quantity,
+    'total_rounds': AmmoBox.total_rounds,
+    'notes': AmmoBox.notes
+}
+
+# Columns that make up the sort key and the cursor
+KEYSET_FIELDS = ('caliber', 'name', 'id')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row as an opaque cursor string"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+    if (not isinstance(values, list) or len(values) != len(KEYSET_FIELDS)
+            or not isinstance(values[2], int)):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_fields(fields_param):
+    """
+    Turn a comma-separated field list into column names.
+
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not fields_param:
+        return list(INVENTORY_FIELDS.keys())
+
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in INVENTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def fetch_inventory_page(fields=None, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False,
+                         caliber=None, upc=None, name_prefix=None):
+    """
+    Fetch one page of inventory ordered by (caliber, name, id).
+
+    Reads plain column tuples instead of building AmmoBox objects.
+
+    Args:
+        fields: Field names to return (defaults to all fields)
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of rows to return
+        descending: Sort in descending order
+        caliber: Exact caliber filter, or a list of calibers to match any of
+        upc: Exact UPC filter
+        name_prefix: Case-insensitive name prefix filter
+
+    Returns:
+        Tuple of (list of row dictionaries, next cursor or None)
+    """
+    fields = fields or list(INVENTORY_FIELDS.keys())
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    # The sort key is always selected so the next cursor can be built
+    selected = list(fields) + [field for field in KEYSET_FIELDS if field not in fields]
+    query = db.session.query(*[INVENTORY_FIELDS[field] for field in selected])
+
+    if caliber:
+        calibers = [caliber] if isinstance(caliber, str) else list(caliber)
+        if len(calibers) == 1:
+            query = query.filter(AmmoBox.caliber == calibers[0])
+        else:
+            query = query.filter(AmmoBox.caliber.in_(calibers))
+    if upc:
+        query = query.filter(AmmoBox.upc == upc)
+    if name_prefix:
+        # Served by ix_ammo_boxes_name_lower
+        query = query.filter(func.lower(AmmoBox.name).startswith(name_prefix.lower(), autoescape=True))
+
+    sort_key = tuple_(AmmoBox.caliber, AmmoBox.name, AmmoBox.id)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.filter(sort_key < after if descending else sort_key > after)
+
+    if descending:
+        query = query.order_by(AmmoBox.caliber.desc(), AmmoBox.name.desc(), AmmoBox.id.desc())
+    else:
+        query = query.order_by(AmmoBox.caliber, AmmoBox.name, AmmoBox.id)
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [dict(zip(fields, row[:len(fields)])) for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        last = dict(zip(selected, rows[-1]))
+        next_cursor = encode_cursor(last[field] for field in KEYSET_FIELDS)
+
+    return items, next_cursor
@@ -1,4 +1,8 @@
-from app import app  # noqa: F401
+from app import create_app
+from startup import initialize_database
+
+app = create_app()
 
 if __name__ == "__main__":
+    initialize_database(app)
     app.run(host="0.0.0.0", port=5000, debug=True)
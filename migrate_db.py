@@ -1,188 +1,285 @@
-import os
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+import logging
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, select, insert, func
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.sql import text
+from models import db, SchemaVersion, AmmoBox, CaliberRollup, StockStatus
+from stock_alerts import write_stock_status
+
+# Versioned schema migrations.
+#
+# db.create_all() creates any missing table with its current definition; the
+# numbered steps below then bring tables created by older releases up to
+# date. Each step checks the live schema before changing it, so it is safe to
+# run against a database that already has the change, and is recorded in
+# schema_version once applied. When the schema is current, startup costs a
+# single max(version) lookup on the schema_version primary key.
+#
+# On Postgres, processes that find pending steps serialize on an advisory
+# lock and re-check the version once they hold it, so N workers booting at
+# once migrate the database exactly once.
+#
+# To change the schema: update models.py, then append a step to MIGRATIONS
+# with the next version number. Never renumber or edit an applied step.
+
+# Key of the advisory lock held while migrating
+MIGRATION_LOCK_KEY = 0x52524D47
+
+schema_version_table = SchemaVersion.__table__
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table, columns):
+    """Add (name, type DDL) columns that the table does not have yet"""
+    if not inspect(conn).has_table(table):
+        return
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            logging.info(f"Adding {name} column to {table} table...")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def add_owner_and_price_columns(conn):
+    _add_columns(conn, 'ammo_boxes', [
+        ('user_id', 'INTEGER REFERENCES users(id)'),
+        ('purchase_price', 'FLOAT')
+    ])
+    _add_columns(conn, 'users', [('profile_image_url', 'VARCHAR(255)')])
+
+
+def add_range_trip_columns(conn):
+    _add_columns(conn, 'range_trips', [
+        ('temperature', 'FLOAT'),
+        ('weather_condition', 'VARCHAR(50)'),
+        ('wind_speed', 'FLOAT'),
+        ('humidity', 'FLOAT'),
+        ('user_id', 'INTEGER REFERENCES users(id)')
+    ])
+
+
+def add_thresholds_version(conn):
+    _add_columns(conn, 'users', [('thresholds_version', 'INTEGER NOT NULL DEFAULT 0')])
+
+
+def make_thresholds_per_user(conn):
+    """Add caliber_thresholds.user_id and key rows on (user_id, caliber)"""
+    if not inspect(conn).has_table('caliber_thresholds'):
+        return
+    _add_columns(conn, 'caliber_thresholds', [('user_id', 'INTEGER REFERENCES users(id)')])
+
+    # SQLite cannot alter constraints; tables it creates already have the new one
+    if conn.dialect.name != 'postgresql':
+        return
+    constraints = {c['name'] for c in inspect(conn).get_unique_constraints('caliber_thresholds')}
+    if 'uq_caliber_thresholds_user_caliber' not in constraints:
+        conn.execute(text("ALTER TABLE caliber_thresholds DROP CONSTRAINT IF EXISTS caliber_thresholds_caliber_key"))
+        conn.execute(text("""
+            ALTER TABLE caliber_thresholds
+            ADD CONSTRAINT uq_caliber_thresholds_user_caliber UNIQUE (user_id, caliber)
+        """))
+
+
+def _has_index(conn, name):
+    """
+    Whether an index exists, looked up by name in the catalog.
+
+    Reflection cannot see expression indexes on SQLite, so the system
+    catalog is queried directly instead of going through inspect().
+    """
+    if conn.dialect.name == 'postgresql':
+        query = text("SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = :name")
+    elif conn.dialect.name == 'sqlite':
+        query = text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name")
+    else:
+        return name in {index['name'] for table in inspect(conn).get_table_names()
+                        for index in inspect(conn).get_indexes(table)}
+    return conn.execute(query, {'name': name}).first() is not None
+
+
+def _create_indexes(conn, names):
+    """Create indexes declared in models.py by name, skipping any that exist"""
+    declared = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        index = declared[name]
+        if inspect(conn).has_table(index.table.name) and not _has_index(conn, name):
+            index.create(conn)
+
+
+def add_hot_column_indexes(conn):
+    _create_indexes(conn, [
+        'ix_ammo_boxes_user_upc',
+        'ix_ammo_boxes_upc',
+        'ix_ammo_boxes_caliber_name',
+        'ix_range_trips_user_date',
+        'ix_range_trip_items_trip_caliber',
+        'ix_range_trip_items_ammo_box_id',
+        'ix_firearms_user_id',
+        'ix_range_trip_firearms_range_trip_id',
+        'ix_range_trip_firearms_firearm_id',
+    ])
+
+
+def add_data_version(conn):
+    _add_columns(conn, 'users', [('data_version', 'INTEGER NOT NULL DEFAULT 0')])
+
+
+def rekey_caliber_rollups(conn):
+    """
+    Recreate caliber_rollups keyed on (COALESCE(user_id, 0), caliber).
+
+    The table only holds totals derived from ammo_boxes, so it is rebuilt from
+    them rather than altered; this also merges any duplicate rows for shared
+    (ownerless) boxes that the old NULL-distinct constraint let through.
+    """
+    rollup_table = CaliberRollup.__table__
+    if not inspect(conn).has_table('caliber_rollups'):
+        return
+    if _has_index(conn, 'uq_caliber_rollups_owner_caliber'):
+        return
+
+    rollup_table.drop(conn)
+    rollup_table.create(conn)
+    boxes = AmmoBox.__table__.c
+    conn.execute(insert(rollup_table).from_select(
+        ['user_id', 'caliber', 'total_rounds', 'box_count', 'item_count', 'updated_at'],
+        select(
+            boxes.user_id,
+            boxes.caliber,
+            func.coalesce(func.sum(boxes.total_rounds), 0),
+            func.coalesce(func.sum(boxes.quantity), 0),
+            func.count(boxes.id),
+            func.max(boxes.updated_at)
+        ).group_by(boxes.user_id, boxes.caliber)
+    ))
+
+
+def resolve_stock_status_through_shared_inventory(conn):
+    """Re-derive stock_status with shared boxes counted for every user"""
+    if inspect(conn).has_table('stock_status'):
+        write_stock_status(conn)
+
+
+def rekey_stock_status(conn):
+    """
+    Recreate stock_status keyed on (COALESCE(user_id, 0), caliber).
+
+    Like caliber_rollups, the table is derived data and is rebuilt rather
+    than altered, which also removes duplicate shared rows.
+    """
+    if not inspect(conn).has_table('stock_status') or _has_index(conn, 'uq_stock_status_owner_caliber'):
+        return
+    StockStatus.__table__.drop(conn)
+    StockStatus.__table__.create(conn)
+    write_stock_status(conn)
+
+
+def add_name_search_index(conn):
+    _create_indexes(conn, ['ix_ammo_boxes_name_lower'])
+
+
+# Ordered (version, description, step) list
+MIGRATIONS = [
+    (1, 'Add ammo_boxes owner and purchase price, users.profile_image_url', add_owner_and_price_columns),
+    (2, 'Add range trip weather and owner columns', add_range_trip_columns),
+    (3, 'Add users.thresholds_version', add_thresholds_version),
+    (4, 'Make caliber thresholds per user', make_thresholds_per_user),
+    (5, 'Index the hot lookup columns', add_hot_column_indexes),
+    (6, 'Add users.data_version', add_data_version),
+    (7, 'Key caliber rollups on COALESCE(user_id, 0) and caliber', rekey_caliber_rollups),
+    (8, 'Resolve stock status through shared inventory', resolve_stock_status_through_shared_inventory),
+    (9, 'Index lower(ammo_boxes.name) for inventory search', add_name_search_index),
+    (10, 'Key stock status on COALESCE(user_id, 0) and caliber', rekey_stock_status),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Highest applied migration, or None if schema_version does not exist yet"""
+    try:
+        return conn.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+    except DBAPIError:
+        conn.rollback()
+        return None
+
+
+def _lock(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+
+def _unlock(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
 
-# Create a minimal Flask app for migration
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db = SQLAlchemy(app)
 
 def migrate_database():
     """
-    Execute database migrations to add new columns and update table structures
+    Bring the database schema up to LATEST_VERSION.
+
+    Must run inside an app context.
+
+    Returns:
+        List of migration versions applied by this call (empty if the schema was current)
     """
-    with app.app_context():
-        conn = db.engine.connect()
-        
-        # Check if ammo_boxes.user_id exists
-        result = conn.execute(text("""
-            SELECT column_name FROM information_schema.columns 
-            WHERE table_name='ammo_boxes' AND column_name='user_id'
-        """))
-        if result.rowcount == 0:
-            print("Adding user_id column to ammo_boxes table...")
-            conn.execute(text("""
-                ALTER TABLE ammo_boxes 
-                ADD COLUMN user_id INTEGER REFERENCES users(id)
-            """))
-            
-        # Check if ammo_boxes.purchase_price exists
-        result = conn.execute(text("""
-            SELECT column_name FROM information_schema.columns 
-            WHERE table_name='ammo_boxes' AND column_name='purchase_price'
-        """))
-        if result.rowcount == 0:
-            print("Adding purchase_price column to ammo_boxes table...")
-            conn.execute(text("""
-                ALTER TABLE ammo_boxes 
-                ADD COLUMN purchase_price FLOAT
-            """))
-            
-        # Check if users table exists
-        result = conn.execute(text("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_name='users'
-        """))
-        if result.rowcount == 0:
-            print("Creating users table...")
-            conn.execute(text("""
-                CREATE TABLE users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(64) UNIQUE NOT NULL,
-                    email VARCHAR(120) UNIQUE NOT NULL,
-                    password_hash VARCHAR(256) NOT NULL,
-                    first_name VARCHAR(64),
-                    last_name VARCHAR(64),
-                    profile_image_url VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP
-                )
-            """))
-        else:
-            # Check if profile_image_url column exists in users table
-            result = conn.execute(text("""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name='users' AND column_name='profile_image_url'
-            """))
-            if result.rowcount == 0:
-                print("Adding profile_image_url column to users table...")
-                conn.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN profile_image_url VARCHAR(255)
-                """))
-                
-            # Update users.id to VARCHAR if it's INTEGER
-            result = conn.execute(text("""
-                SELECT data_type FROM information_schema.columns 
-                WHERE table_name='users' AND column_name='id'
-            """))
-            data_type = result.scalar()
-            if data_type and data_type.upper() == 'INTEGER':
-                print("Changing users.id column type from INTEGER to VARCHAR...")
-                # This is complex and might require a table rebuild
-                print("NOTE: You may need to recreate the users table manually.")
-            
-        # Check if oauth table exists
-        result = conn.execute(text("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_name='oauth'
-        """))
-        if result.rowcount == 0:
-            print("Creating oauth table for authentication...")
-            conn.execute(text("""
-                CREATE TABLE oauth (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id),
-                    provider VARCHAR(50) NOT NULL,
-                    browser_session_key VARCHAR NOT NULL,
-                    token JSON NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    CONSTRAINT uq_user_browser_session_key_provider UNIQUE (user_id, browser_session_key, provider)
-                )
-            """))
-        
-        # Create the firearms table if it doesn't exist
-        result = conn.execute(text("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_name='firearms'
-        """))
-        if result.rowcount == 0:
-            print("Creating firearms table for GunSafe feature...")
-            conn.execute(text("""
-                CREATE TABLE firearms (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id) NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    make VARCHAR(100) NOT NULL,
-                    model VARCHAR(100) NOT NULL,
-                    serial_number VARCHAR(100),
-                    caliber VARCHAR(50) NOT NULL,
-                    type VARCHAR(50) NOT NULL,
-                    purchase_date DATE,
-                    purchase_price FLOAT,
-                    notes TEXT,
-                    status VARCHAR(20) DEFAULT 'active',
-                    image_url VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-        
-        # Create range_trip_firearms table if it doesn't exist
-        result = conn.execute(text("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_name='range_trip_firearms'
-        """))
-        if result.rowcount == 0:
-            print("Creating range_trip_firearms table for tracking firearms used in range trips...")
-            conn.execute(text("""
-                CREATE TABLE range_trip_firearms (
-                    id SERIAL PRIMARY KEY,
-                    range_trip_id INTEGER REFERENCES range_trips(id) NOT NULL,
-                    firearm_id INTEGER REFERENCES firearms(id) NOT NULL,
-                    rounds_fired INTEGER DEFAULT 0,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-        
-        # Check and add weather-related columns to range_trips
-        weather_columns = [
-            ('temperature', 'FLOAT'),
-            ('weather_condition', 'VARCHAR(50)'),
-            ('wind_speed', 'FLOAT'),
-            ('humidity', 'FLOAT')
-        ]
-        
-        for col_name, col_type in weather_columns:
-            result = conn.execute(text(f"""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name='range_trips' AND column_name='{col_name}'
-            """))
-            if result.rowcount == 0:
-                print(f"Adding {col_name} column to range_trips table...")
-                conn.execute(text(f"""
-                    ALTER TABLE range_trips 
-                    ADD COLUMN {col_name} {col_type}
-                """))
-                
-        # Check if user_id exists in range_trips
-        result = conn.execute(text("""
-            SELECT column_name FROM information_schema.columns 
-            WHERE table_name='range_trips' AND column_name='user_id'
-        """))
-        if result.rowcount == 0:
-            print("Adding user_id column to range_trips table...")
-            conn.execute(text("""
-                ALTER TABLE range_trips 
-                ADD COLUMN user_id INTEGER REFERENCES users(id)
-            """))
-            
-        # Commit all changes
-        db.session.commit()
-        print("Database migration completed successfully!")
-        
-if __name__ == "__main__":
-    migrate_database()
\ No newline at end of file
+    engine = db.engine
+    with engine.connect() as conn:
+        version = current_version(conn)
+        conn.commit()
+        if version == LATEST_VERSION:
+            return []
+
+        _lock(conn)
+        try:
+            # Another process may have migrated while we waited for the lock
+            version = current_version(conn)
+            if version is None or version < LATEST_VERSION:
+                db.metadata.create_all(conn)
+                conn.commit()
+                version = current_version(conn)
+
+            applied = []
+            for number, description, step in MIGRATIONS:
+                if number <= version:
+                    continue
+                logging.info(f"Applying schema migration {number}: {description}")
+                step(conn)
+                conn.execute(insert(schema_version_table).values(
+                    version=number, description=description, applied_at=datetime.utcnow()
+                ))
+                conn.commit()
+                applied.append(number)
+            return applied
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            _unlock(conn)
+            conn.commit()
+
+
+@click.command('migrate-db')
+@click.option('--status', is_flag=True, help='Only show the current and latest schema version.')
+@with_appcontext
+def migrate_db_command(status):
+    """Apply pending schema migrations."""
+    if status:
+        with db.engine.connect() as conn:
+            version = current_version(conn)
+        click.echo(f"Schema version {version if version is not None else 'none'} (latest {LATEST_VERSION})")
+        return
+
+    started = time.perf_counter()
+    applied = migrate_database()
+    elapsed = (time.perf_counter() - started) * 1000
+    if applied:
+        click.echo(f"Applied migrations {', '.join(str(number) for number in applied)} in {elapsed:.1f} ms")
+    else:
+        click.echo(f"Schema is current (version {LATEST_VERSION}, checked in {elapsed:.1f} ms)")
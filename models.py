@@ -1,9 +1,10 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from flask_dance.consumer.storage.sqla import OAuthConsumerMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index, func, literal_column
 
 # Initialize SQLAlchemy with no app yet
 db = SQLAlchemy()
@@ -22,6 +23,10 @@ class User(UserMixin, db.Model):
     # profile_image_url = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
+    # Bumped whenever the user's caliber thresholds change (invalidates cached copies)
+    thresholds_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped after every write request by the user (keys their cached pages, see page_cache.py)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     ammo_boxes = db.relationship('AmmoBox', backref='user', lazy=True)
@@ -84,6 +89,14 @@ class AmmoBox(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index('ix_ammo_boxes_user_upc', 'user_id', 'upc'),  # Profile, UPC merge import
+        Index('ix_ammo_boxes_upc', 'upc'),  # Boxes of a catalog UPC
+        Index('ix_ammo_boxes_caliber_name', 'caliber', 'name', 'id'),  # Inventory listing and keyset pages
+        Index('ix_ammo_boxes_name_lower', func.lower(name).label('name_lower'),  # Inventory search by name
+              postgresql_ops={'name_lower': 'text_pattern_ops'}),
+    )
+
     def __init__(self, name, upc, caliber, count_per_box, quantity, notes="", user_id=None, purchase_price=None):
         self.name = name
         self.upc = upc
@@ -131,6 +144,8 @@ class Firearm(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (Index('ix_firearms_user_id', 'user_id'),)
+    
     def __init__(self, user_id, name, make, model, caliber, type, 
                 serial_number=None, purchase_date=None, purchase_price=None, 
                 notes=None, image_url=None):
@@ -190,19 +205,111 @@ class UpcData(db.Model):
             "count_per_box": self.count_per_box
         }
 
+class UpcApiResponse(db.Model):
+    """Raw responses from the external UPC lookup API, kept to avoid repeat calls"""
+    __tablename__ = 'upc_api_responses'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    upc = db.Column(db.String(20), nullable=False, unique=True)
+    status_code = db.Column(db.Integer, nullable=False)
+    found = db.Column(db.Boolean, nullable=False, default=False)  # False for UPCs the API does not know
+    body = db.Column(db.Text, nullable=True)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __init__(self, upc, status_code, found, body=None):
+        self.upc = upc
+        self.status_code = status_code
+        self.found = found
+        self.body = body
+        self.fetched_at = datetime.utcnow()
+
+class ScrapeJob(db.Model):
+    """A background ammunition scrape, shared by every worker so any of them can report on it"""
+    __tablename__ = 'scrape_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    query_key = db.Column(db.String(220), nullable=False, index=True)  # Normalized query + product limit
+    search_terms = db.Column(db.String(200), nullable=False)  # Not "query", which would hide Model.query
+    max_products = db.Column(db.Integer, nullable=False, default=5)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    total = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    results = db.Column(db.Text, nullable=True)  # JSON list of products found so far
+    message = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __init__(self, id, query_key, search_terms, max_products):
+        self.id = id
+        self.query_key = query_key
+        self.search_terms = search_terms
+        self.max_products = max_products
+        self.status = 'queued'
+        self.total = 0
+        self.completed = 0
+        self.created_at = datetime.utcnow()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'query': self.search_terms,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'results': json.loads(self.results) if self.results else [],
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ImportCheckpoint(db.Model):
+    """Progress of an offline inventory import, committed together with each imported chunk"""
+    __tablename__ = 'import_checkpoints'
+
+    id = db.Column(db.String(64), primary_key=True)  # Hash of the file identity and import options
+    file_path = db.Column(db.String(500), nullable=False)
+    next_offset = db.Column(db.BigInteger, nullable=False, default=0)  # Byte offset of the next chunk
+    next_line = db.Column(db.Integer, nullable=False, default=2)  # File line the next chunk starts on
+    chunks = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    unchanged = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    finished = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, id, file_path, next_offset, next_line):
+        self.id = id
+        self.file_path = file_path
+        self.next_offset = next_offset
+        self.next_line = next_line
+        self.chunks = 0
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.finished = False
+
 class CaliberThreshold(db.Model):
-    """Stores threshold values for ammunition calibers"""
+    """Stores a user's stock threshold values for an ammunition caliber"""
     __tablename__ = 'caliber_thresholds'
     
     id = db.Column(db.Integer, primary_key=True)
-    caliber = db.Column(db.String(50), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    caliber = db.Column(db.String(50), nullable=False)
     low_threshold = db.Column(db.Integer, nullable=False, default=100)
     critical_threshold = db.Column(db.Integer, nullable=False, default=50)
     target_stock = db.Column(db.Integer, nullable=False, default=500)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def __init__(self, caliber, low_threshold=100, critical_threshold=50, target_stock=500):
+    __table_args__ = (UniqueConstraint('user_id', 'caliber', name='uq_caliber_thresholds_user_caliber'),)
+    
+    def __init__(self, caliber, low_threshold=100, critical_threshold=50, target_stock=500, user_id=None):
+        self.user_id = user_id
         self.caliber = caliber
         self.low_threshold = low_threshold
         self.critical_threshold = critical_threshold
@@ -217,6 +324,87 @@ class CaliberThreshold(db.Model):
             "target_stock": self.target_stock
         }
 
+class CaliberRollup(db.Model):
+    """Per-user running totals of inventory by caliber"""
+    __tablename__ = 'caliber_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Mirrors AmmoBox.user_id
+    caliber = db.Column(db.String(50), nullable=False)
+    total_rounds = db.Column(db.Integer, nullable=False, default=0)
+    box_count = db.Column(db.Integer, nullable=False, default=0)  # Sum of AmmoBox.quantity
+    item_count = db.Column(db.Integer, nullable=False, default=0)  # Number of AmmoBox rows
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Shared boxes have no owner; COALESCE keeps them to one row per caliber,
+    # since a plain unique constraint treats every NULL as distinct
+    __table_args__ = (
+        Index('uq_caliber_rollups_owner_caliber', func.coalesce(user_id, literal_column('0')), caliber, unique=True),
+    )
+    
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "caliber": self.caliber,
+            "total_rounds": self.total_rounds,
+            "box_count": self.box_count,
+            "item_count": self.item_count
+        }
+
+class StockStatus(db.Model):
+    """Materialized ok/low/critical stock level of each user/caliber pair"""
+    __tablename__ = 'stock_status'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Mirrors AmmoBox.user_id
+    caliber = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, index=True)  # ok, low, critical
+    total_rounds = db.Column(db.Integer, nullable=False, default=0)
+    low_threshold = db.Column(db.Integer, nullable=False)
+    critical_threshold = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)  # When status last changed
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Same key as caliber_rollups: one shared (NULL user) row per caliber
+    __table_args__ = (
+        Index('uq_stock_status_owner_caliber', func.coalesce(user_id, literal_column('0')), caliber, unique=True),
+    )
+    
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "caliber": self.caliber,
+            "status": self.status,
+            "total_rounds": self.total_rounds,
+            "low_threshold": self.low_threshold,
+            "critical_threshold": self.critical_threshold,
+            "changed_at": self.changed_at.isoformat() if self.changed_at else None
+        }
+
+class StockAlertEvent(db.Model):
+    """Outbox of stock level crossings, written in the transaction that caused them"""
+    __tablename__ = 'stock_alert_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    caliber = db.Column(db.String(50), nullable=False)
+    previous_status = db.Column(db.String(10), nullable=True)  # None for a newly tracked caliber
+    status = db.Column(db.String(10), nullable=False)
+    total_rounds = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    delivered_at = db.Column(db.DateTime, nullable=True, index=True)  # Set once a consumer has handled it
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "caliber": self.caliber,
+            "previous_status": self.previous_status,
+            "status": self.status,
+            "total_rounds": self.total_rounds,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
 class RangeTrip(db.Model):
     """Represents a range trip where ammunition was used"""
     __tablename__ = 'range_trips'
@@ -237,6 +425,8 @@ class RangeTrip(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (Index('ix_range_trips_user_date', 'user_id', 'date'),)  # Trip list, newest first
 
     # Relationships
     items = db.relationship('RangeTripItem', backref='range_trip', lazy=True, cascade='all, delete-orphan')
@@ -285,6 +475,11 @@ class RangeTripFirearm(db.Model):
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_range_trip_firearms_range_trip_id', 'range_trip_id'),
+        Index('ix_range_trip_firearms_firearm_id', 'firearm_id'),
+    )
+    
     # Relationship to access firearm details
     firearm = db.relationship('Firearm', backref='range_trips_used', lazy=True)
     
@@ -321,6 +516,11 @@ class RangeTripItem(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index('ix_range_trip_items_trip_caliber', 'range_trip_id', 'caliber'),  # Trip view, usage by caliber
+        Index('ix_range_trip_items_ammo_box_id', 'ammo_box_id'),  # Check-in, box deletes
+    )
+
     def __init__(self, range_trip_id, name, caliber, count_per_box, quantity_out, ammo_box_id=None):
         self.range_trip_id = range_trip_id
         self.ammo_box_id = ammo_box_id
@@ -345,3 +545,18 @@ class RangeTripItem(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+class SchemaVersion(db.Model):
+    """Records each schema migration step applied to the database (see migrate_db)"""
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class DataVersion(db.Model):
+    """Change counter for data shared between users (see page_cache)"""
+    __tablename__ = 'data_versions'
+    
+    scope = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,400 @@
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlparse
+from flask import request, session, make_response
+from flask.globals import request_ctx
+from flask_login import current_user
+from sqlalchemy import update, insert
+from models import db, User, DataVersion
+from upc_lookup import TTLCache
+
+# Read-through cache for the per-user dashboard pages.
+#
+# A page is cached under (user id, view, data version). The data version is
+# users.data_version, which arrives with the user row Flask-Login loads on
+# every request anyway. Pages that show inventory shared between users also
+# include the 'inventory' counter in data_versions, which costs one primary
+# key lookup. Routes that write are decorated with @bumps_data_version, which
+# bumps the user's counter (and the shared one for writes to inventory) in
+# its own transaction once the route has committed. Reads that merely arrive
+# as POST, such as logins without a profile change or batch UPC lookups, bump
+# nothing. A cached page can therefore only be served while nothing it shows
+# has changed. Old versions are never deleted explicitly; they age out of the
+# backend.
+#
+# Backends: "memory" (per-process LRU), "filesystem" (shared by the workers
+# on one host), "redis" (anything that speaks the Redis protocol) or "none".
+
+DEFAULT_CONFIG = {
+    'PAGE_CACHE_BACKEND': 'memory',     # memory, filesystem, redis or none
+    'PAGE_CACHE_SIZE': 512,             # Pages held by the memory backend
+    'PAGE_CACHE_TTL': 300,              # Seconds a page is kept even if nothing changes
+    'PAGE_CACHE_DIR': os.path.join(tempfile.gettempdir(), 'rubyridge-page-cache'),
+    'PAGE_CACHE_REDIS_URL': 'redis://localhost:6379/0',
+}
+
+# data_versions scope bumped by writes to inventory (shared between users)
+SHARED_SCOPE = 'inventory'
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+data_version_table = DataVersion.__table__
+
+
+class MemoryBackend:
+    """Per-process LRU of rendered pages"""
+
+    def __init__(self, max_size, ttl):
+        self.entries = TTLCache(max_size, ttl)
+
+    def get(self, key):
+        return self.entries.get(key)[1]
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileBackend:
+    """One file per page in a directory shared by every worker on the host"""
+
+    # Expired files are swept after this many writes
+    PRUNE_EVERY = 200
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.page')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at = float(f.readline())
+                if expires_at < time.time():
+                    return None
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        # Write to a temporary file and rename so readers never see a partial page
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(f"{time.time() + self.ttl}\n".encode('ascii'))
+            f.write(value)
+        os.replace(temp_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self, everything=False):
+        """Delete expired pages (or all of them)"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.page'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if not everything:
+                    with open(path, 'rb') as f:
+                        if float(f.readline()) >= now:
+                            continue
+                os.remove(path)
+            except (OSError, ValueError):
+                pass
+
+    def clear(self):
+        self.prune(everything=True)
+
+
+class RedisBackend:
+    """
+    Minimal Redis protocol client (GET and SET with EX).
+
+    Speaks RESP directly over one socket so any Redis-compatible server
+    works, including a local stand-in, without a client library.
+    """
+
+    KEY_PREFIX = 'rubyridge:'
+
+    def __init__(self, url, ttl, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.lstrip('/') or 0) if parsed.path else 0
+        self.ttl = ttl
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.password:
+            self._send('AUTH', self.password)
+        if self.database:
+            self._send('SELECT', self.database)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _send(self, *parts):
+        parts = [part if isinstance(part, bytes) else str(part).encode('utf-8') for part in parts]
+        payload = b'*%d\r\n' % len(parts) + b''.join(b'$%d\r\n%s\r\n' % (len(part), part) for part in parts)
+        self._sock.sendall(payload)
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body
+        if kind == b'-':
+            raise RuntimeError(f"Redis error: {body.decode('utf-8', errors='replace')}")
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            return None if length < 0 else self._reader.read(length + 2)[:-2]
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected Redis reply: {line[:40]!r}")
+
+    def command(self, *parts):
+        """Run one command, reconnecting once if the connection was lost"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*parts)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def get(self, key):
+        return self.command('GET', self.KEY_PREFIX + key)
+
+    def set(self, key, value):
+        self.command('SET', self.KEY_PREFIX + key, value, 'EX', int(self.ttl))
+
+    def clear(self):
+        # Shared with other processes; stale pages simply expire
+        pass
+
+
+class PageCache:
+    """Pluggable page cache with per-view hit/miss counters"""
+
+    COUNTERS = ('hits', 'misses', 'bypassed', 'errors')
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG)
+        self.backend = None
+        self._counter_lock = threading.Lock()
+        self.counters = {}
+        self.configure(config or {})
+
+    def configure(self, config):
+        for key in DEFAULT_CONFIG:
+            if key in config:
+                self.config[key] = config[key]
+
+        name = self.config['PAGE_CACHE_BACKEND']
+        ttl = float(self.config['PAGE_CACHE_TTL'])
+        if name == 'memory':
+            self.backend = MemoryBackend(int(self.config['PAGE_CACHE_SIZE']), ttl)
+        elif name == 'filesystem':
+            self.backend = FileBackend(self.config['PAGE_CACHE_DIR'], ttl)
+        elif name == 'redis':
+            self.backend = RedisBackend(self.config['PAGE_CACHE_REDIS_URL'], ttl)
+        elif name == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown PAGE_CACHE_BACKEND: {name}")
+
+    def count(self, view, counter):
+        with self._counter_lock:
+            counts = self.counters.setdefault(view, dict.fromkeys(self.COUNTERS, 0))
+            counts[counter] += 1
+
+    def get(self, view, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            self.count(view, 'errors')
+            logging.warning(f"Page cache read failed for {view}: {str(e)}")
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, view, key, html):
+        try:
+            self.backend.set(key, html.encode('utf-8'))
+        except Exception as e:
+            self.count(view, 'errors')
+            logging.warning(f"Page cache write failed for {view}: {str(e)}")
+
+    def stats(self):
+        with self._counter_lock:
+            views = {view: dict(counts) for view, counts in self.counters.items()}
+
+        for counts in views.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else 0.0
+
+        hits = sum(counts['hits'] for counts in views.values())
+        lookups = hits + sum(counts['misses'] for counts in views.values())
+        return {
+            'backend': self.config['PAGE_CACHE_BACKEND'],
+            'size': len(self.backend) if isinstance(self.backend, MemoryBackend) else None,
+            'hits': hits,
+            'misses': lookups - hits,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'views': views
+        }
+
+
+page_cache = PageCache()
+
+
+def init_page_cache(app):
+    """Configure the page cache from the Flask app config"""
+    page_cache.configure(app.config)
+
+
+def shared_version(scope=SHARED_SCOPE):
+    """Current value of a shared data_versions counter"""
+    row = db.session.get(DataVersion, scope)
+    return row.version if row else 0
+
+
+def bump_data_version(user_id=None, shared=True):
+    """
+    Invalidate cached pages after a write.
+
+    Runs in its own transaction; call it after the write has committed so a
+    page rendered from the old data can never be stored under the new version.
+
+    Args:
+        user_id: User whose pages to invalidate, if any
+        shared: The write changed inventory, so pages that show shared
+            inventory are invalidated for everyone
+    """
+    with db.engine.begin() as connection:
+        if user_id is not None:
+            connection.execute(
+                update(User.__table__).where(User.__table__.c.id == user_id)
+                .values(data_version=User.__table__.c.data_version + 1)
+            )
+
+        if shared:
+            result = connection.execute(
+                update(data_version_table).where(data_version_table.c.scope == SHARED_SCOPE)
+                .values(version=data_version_table.c.version + 1)
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(data_version_table).values(scope=SHARED_SCOPE, version=1))
+
+
+def _write_failed(response):
+    if response.status_code >= 400:
+        return True
+    # JSON routes report validation errors with a 200 and success: false
+    body = response.get_json(silent=True) if response.is_json else None
+    return isinstance(body, dict) and body.get('success') is False
+
+
+def bumps_data_version(shared=True):
+    """
+    Bump data versions after a successful write through the decorated route.
+
+    Place below @login_required. GET requests to routes that also accept a
+    form post and failed writes bump nothing.
+
+    Args:
+        shared: The route writes inventory shared between users; otherwise
+            only the current user's pages are invalidated
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            response = make_response(fn(*args, **kwargs))
+            if request.method in READ_METHODS or _write_failed(response):
+                return response
+
+            user_id = current_user.id if current_user.is_authenticated else None
+            if user_id is None and not shared:
+                return response
+            try:
+                bump_data_version(user_id, shared=shared)
+            except Exception as e:
+                logging.error(f"Error bumping data version after {request.method} {request.path}: {str(e)}")
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_page(view, shared=False):
+    """
+    Serve a rendered page from the cache while the user's data is unchanged.
+
+    Place below @login_required. Requests with query arguments or pending
+    flash messages always render.
+
+    Args:
+        view: Name of the page in cache keys and statistics
+        shared: The page shows inventory shared between users
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if page_cache.backend is None or request.args or session.get('_flashes'):
+                page_cache.count(view, 'bypassed')
+                return fn(*args, **kwargs)
+
+            version = str(current_user.data_version)
+            if shared:
+                version += f".{shared_version()}"
+            key = f"page:{current_user.id}:{view}:{version}"
+
+            html = page_cache.get(view, key)
+            if html is not None:
+                page_cache.count(view, 'hits')
+                return html
+
+            page_cache.count(view, 'misses')
+            result = fn(*args, **kwargs)
+
+            # Only plain rendered pages that did not show a flash message are reusable
+            if isinstance(result, str) and not getattr(request_ctx, 'flashes', None):
+                page_cache.set(view, key, result)
+            return result
+        return wrapper
+    return decorator
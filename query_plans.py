@@ -0,0 +1,128 @@
+import json
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, text
+from models import db, AmmoBox, RangeTrip, RangeTripItem, Firearm, RangeTripFirearm
+
+# Query-plan regression check for the hot lookups (flask check-query-plans,
+# and tests/test_query_plans.py, which runs it against Postgres when
+# TEST_POSTGRES_URL is set).
+#
+# Each query below mirrors the shape of a real request path. The check runs
+# EXPLAIN on it and fails if the plan reads any table with a full scan,
+# which means no index serves that query any more.
+#
+# On Postgres sequential scans are disabled for the check's transaction, so
+# the planner picks an index whenever a usable one exists, however small the
+# tables are. An empty database therefore gives the same answer as a seeded
+# one. SQLite has no statistics unless ANALYZE has been run and always uses
+# an index that matches an equality filter.
+
+# Sample values; the plans do not depend on them
+SAMPLE_USER_ID = 1
+SAMPLE_ID = 1
+SAMPLE_UPC = '020892212602'
+SAMPLE_CALIBER = '9mm Luger'
+
+HOT_QUERIES = [
+    ('inventory by owner (auth.profile)',
+     lambda: select(AmmoBox).where(AmmoBox.user_id == SAMPLE_USER_ID)),
+    ('inventory by UPC (update_upc, delete_upc)',
+     lambda: select(AmmoBox).where(AmmoBox.upc == SAMPLE_UPC)),
+    ('inventory page by caliber (/api/inventory)',
+     lambda: select(AmmoBox.id, AmmoBox.name).where(AmmoBox.caliber == SAMPLE_CALIBER)
+     .order_by(AmmoBox.caliber, AmmoBox.name, AmmoBox.id).limit(51)),
+    ('UPC merge match (CSV import add/replace)',
+     lambda: select(func.min(AmmoBox.id), AmmoBox.upc)
+     .where(AmmoBox.user_id == SAMPLE_USER_ID, AmmoBox.upc.in_([SAMPLE_UPC, '604544617375']))
+     .group_by(AmmoBox.upc)),
+    ('range trips by owner (/range-trips)',
+     lambda: select(RangeTrip).where(RangeTrip.user_id == SAMPLE_USER_ID).order_by(RangeTrip.date.desc())),
+    ('trip items (view_range_trip, checkout, checkin)',
+     lambda: select(RangeTripItem).where(RangeTripItem.range_trip_id == SAMPLE_ID)),
+    ('usage by trip and caliber (/range-trips)',
+     lambda: select(RangeTripItem.range_trip_id, RangeTripItem.caliber, func.sum(RangeTripItem.rounds_used))
+     .join(RangeTrip, RangeTrip.id == RangeTripItem.range_trip_id)
+     .where(RangeTrip.user_id == SAMPLE_USER_ID)
+     .group_by(RangeTripItem.range_trip_id, RangeTripItem.caliber)),
+    ('trip items by box (box deletes)',
+     lambda: select(RangeTripItem.id).where(RangeTripItem.ammo_box_id == SAMPLE_ID)),
+    ('firearms by owner (/firearms/gunsafe)',
+     lambda: select(Firearm).where(Firearm.user_id == SAMPLE_USER_ID)),
+    ('trip firearms (view_range_trip)',
+     lambda: select(RangeTripFirearm).where(RangeTripFirearm.range_trip_id == SAMPLE_ID)),
+    ('trips a firearm was used on',
+     lambda: select(RangeTripFirearm).where(RangeTripFirearm.firearm_id == SAMPLE_ID)),
+]
+
+
+def _postgres_scans(plan):
+    """Relations read by Seq Scan nodes anywhere in a JSON plan"""
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scans.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        scans.extend(_postgres_scans(child))
+    return scans
+
+
+def full_scans(connection, statement):
+    """
+    Explain a statement and list the tables it would read in full.
+
+    Returns:
+        Tuple of (table names, plan text)
+    """
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+
+    if connection.dialect.name == 'postgresql':
+        plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return _postgres_scans(plan[0]['Plan']), json.dumps(plan[0]['Plan'], indent=2)
+
+    # SQLite: "SCAN t" is a full table scan, "SCAN t USING INDEX" only walks an index
+    details = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    scans = [detail.split()[1] for detail in details
+             if detail.startswith('SCAN ') and 'INDEX' not in detail and 'SUBQUERY' not in detail]
+    return scans, '\n'.join(details)
+
+
+def check_query_plans():
+    """
+    Explain every hot query.
+
+    Returns:
+        List of dictionaries with name, scans (tables read in full) and plan
+    """
+    results = []
+    connection = db.session.connection()
+    try:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, build in HOT_QUERIES:
+            scans, plan = full_scans(connection, build())
+            results.append({'name': name, 'scans': scans, 'plan': plan})
+    finally:
+        db.session.rollback()
+    return results
+
+
+@click.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print every plan, not just the failing ones.')
+@with_appcontext
+def check_query_plans_command(verbose):
+    """Fail if any hot query would read a table with a full scan."""
+    failures = 0
+    for result in check_query_plans():
+        ok = not result['scans']
+        failures += not ok
+        click.echo(f"{'ok  ' if ok else 'SCAN'}  {result['name']}"
+                   f"{'' if ok else '  (' + ', '.join(result['scans']) + ')'}")
+        if verbose or not ok:
+            click.echo('      ' + result['plan'].replace('\n', '\n      '))
+
+    if failures:
+        click.echo(f"{failures} hot queries fall back to a full table scan")
+        raise SystemExit(1)
+    click.echo("All hot queries use an index")
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash,
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash
 from models import db, User
+from page_cache import bumps_data_version
 
 quick_auth = Blueprint('quick_auth', __name__)
 
@@ -10,7 +11,7 @@ def quick_login():
     """Super simple login that creates and logs in as budd/dwyer"""
     
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     if request.method == 'POST':
         # Try to get the user first
@@ -32,7 +33,7 @@ def quick_login():
         # Log in the user
         login_user(user)
         flash('Logged in successfully!', 'success')
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
         
     return render_template('quick_login.html')
 
@@ -45,6 +46,7 @@ def quick_logout():
     
 @quick_auth.route('/account-settings', methods=['GET', 'POST'])
 @login_required
+@bumps_data_version(shared=False)
 def account_settings():
     """Display and process account settings page"""
     if request.method == 'POST':
@@ -86,6 +88,7 @@ def account_settings():
     
 @quick_auth.route('/update-account', methods=['POST'])
 @login_required
+@bumps_data_version(shared=False)
 def update_account():
     """Process account settings form submission"""
     # Update user information
@@ -0,0 +1,266 @@
+from sqlalchemy import Integer, column, insert, select, update, values
+from models import db, AmmoBox, RangeTripItem
+from caliber_rollups import apply_rollup_delta
+
+# Set-based inventory movements for range trip checkout and check-in
+
+ammo_table = AmmoBox.__table__
+trip_item_table = RangeTripItem.__table__
+
+
+def _use_bulk_values():
+    """UPDATE ... FROM (VALUES ...) is only used on Postgres"""
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _id_values(name, value_column, rows):
+    """Build a (VALUES ...) AS name (id, value_column) table from (id, value) pairs"""
+    return values(
+        column('id', Integer), column(value_column, Integer), name=name
+    ).data(sorted(rows))
+
+
+def _decrement_returning():
+    """Columns returned for every ammo box that was successfully decremented"""
+    return (ammo_table.c.id, ammo_table.c.user_id, ammo_table.c.name,
+            ammo_table.c.caliber, ammo_table.c.count_per_box)
+
+
+def _decrement_boxes_bulk(requested):
+    """Decrement all requested boxes with one UPDATE ... FROM (VALUES ...) RETURNING"""
+    wanted = _id_values('wanted', 'n', requested.items())
+
+    stmt = update(ammo_table).where(
+        ammo_table.c.id == wanted.c.id,
+        ammo_table.c.quantity >= wanted.c.n
+    ).values(
+        quantity=ammo_table.c.quantity - wanted.c.n,
+        total_rounds=ammo_table.c.count_per_box * (ammo_table.c.quantity - wanted.c.n)
+    ).returning(*_decrement_returning())
+
+    return db.session.execute(stmt).all()
+
+
+def _decrement_boxes_per_row(requested):
+    """Fallback for backends without UPDATE ... FROM VALUES: one conditional UPDATE per box"""
+    rows = []
+    for ammo_id, quantity in sorted(requested.items()):
+        stmt = update(ammo_table).where(
+            ammo_table.c.id == ammo_id,
+            ammo_table.c.quantity >= quantity
+        ).values(
+            quantity=ammo_table.c.quantity - quantity,
+            total_rounds=ammo_table.c.count_per_box * (ammo_table.c.quantity - quantity)
+        ).returning(*_decrement_returning())
+        rows.extend(db.session.execute(stmt).all())
+    return rows
+
+
+def checkout_boxes(trip_id, requested):
+    """
+    Atomically check out ammo boxes for a range trip.
+
+    Each box is decremented only if it still has enough quantity, in a single
+    conditional UPDATE, so concurrent checkouts can never drive a box negative
+    or lose an update. The matching RangeTripItem rows are inserted in one
+    executemany. The caller is responsible for committing.
+
+    Args:
+        trip_id: ID of the range trip
+        requested: Dictionary mapping ammo box ID to the number of boxes wanted
+
+    Returns:
+        Tuple of (list of checked out box dictionaries, list of ammo box IDs that
+        could not be checked out)
+    """
+    requested = {ammo_id: quantity for ammo_id, quantity in requested.items() if quantity > 0}
+    if not requested:
+        return [], []
+
+    if _use_bulk_values():
+        rows = _decrement_boxes_bulk(requested)
+    else:
+        rows = _decrement_boxes_per_row(requested)
+
+    checked_out = []
+    rollup_deltas = {}
+    for row in rows:
+        quantity = requested[row.id]
+        checked_out.append({
+            'ammo_box_id': row.id,
+            'name': row.name,
+            'caliber': row.caliber,
+            'count_per_box': row.count_per_box,
+            'quantity_out': quantity
+        })
+
+        delta = rollup_deltas.setdefault((row.user_id, row.caliber), [0, 0])
+        delta[0] -= row.count_per_box * quantity
+        delta[1] -= quantity
+
+    if checked_out:
+        db.session.execute(insert(trip_item_table), [
+            dict(item, range_trip_id=trip_id, quantity_in=0, rounds_used=0)
+            for item in checked_out
+        ])
+
+    # The bulk UPDATE bypasses the ORM flush hook, so keep the rollup in step here
+    for (user_id, caliber), (rounds, boxes) in rollup_deltas.items():
+        apply_rollup_delta(db.session.connection(), user_id, caliber, rounds=rounds, boxes=boxes)
+
+    checked_out_ids = {item['ammo_box_id'] for item in checked_out}
+    failed = [ammo_id for ammo_id in requested if ammo_id not in checked_out_ids]
+
+    return checked_out, failed
+
+
+def _lock_items(trip_id, item_ids):
+    """
+    Lock the trip's submitted items and read their current quantity_in.
+
+    SELECT ... FOR UPDATE makes a concurrent check-in of the same items wait
+    until this transaction ends and then read the value it committed, so the
+    change returned to inventory is never computed twice from the same old
+    quantity. Rows are locked in id order to avoid deadlocks.
+    """
+    return dict(db.session.execute(
+        select(trip_item_table.c.id, trip_item_table.c.quantity_in).where(
+            trip_item_table.c.range_trip_id == trip_id,
+            trip_item_table.c.id.in_(list(item_ids))
+        ).order_by(trip_item_table.c.id).with_for_update()
+    ).all())
+
+
+def _checkin_items_bulk(trip_id, quantities, current):
+    """Set quantity_in/rounds_used for all items with one UPDATE ... FROM (VALUES ...) RETURNING"""
+    wanted = _id_values('wanted', 'quantity_in', quantities.items())
+
+    stmt = update(trip_item_table).where(
+        trip_item_table.c.id == wanted.c.id,
+        trip_item_table.c.range_trip_id == trip_id,
+        wanted.c.quantity_in >= 0,
+        wanted.c.quantity_in <= trip_item_table.c.quantity_out
+    ).values(
+        quantity_in=wanted.c.quantity_in,
+        rounds_used=(trip_item_table.c.quantity_out - wanted.c.quantity_in) * trip_item_table.c.count_per_box
+    ).returning(trip_item_table.c.id, trip_item_table.c.ammo_box_id, trip_item_table.c.quantity_in)
+
+    return [(row.id, row.ammo_box_id, row.quantity_in - current[row.id])
+            for row in db.session.execute(stmt).all()]
+
+
+def _checkin_items_per_row(trip_id, quantities, current):
+    """Fallback: one UPDATE per locked item"""
+    rows = []
+    for item_id, quantity_in in sorted(quantities.items()):
+        if item_id not in current or quantity_in < 0:
+            continue
+        stmt = update(trip_item_table).where(
+            trip_item_table.c.id == item_id,
+            trip_item_table.c.quantity_out >= quantity_in
+        ).values(
+            quantity_in=quantity_in,
+            rounds_used=(trip_item_table.c.quantity_out - quantity_in) * trip_item_table.c.count_per_box
+        ).returning(trip_item_table.c.id, trip_item_table.c.ammo_box_id)
+        for row in db.session.execute(stmt).all():
+            rows.append((row.id, row.ammo_box_id, quantity_in - current[item_id]))
+    return rows
+
+
+def _return_boxes_bulk(returned):
+    """Add returned boxes back to inventory with one UPDATE ... FROM (VALUES ...) RETURNING"""
+    back = _id_values('returned', 'n', returned.items())
+
+    stmt = update(ammo_table).where(
+        ammo_table.c.id == back.c.id,
+        ammo_table.c.quantity + back.c.n >= 0
+    ).values(
+        quantity=ammo_table.c.quantity + back.c.n,
+        total_rounds=ammo_table.c.count_per_box * (ammo_table.c.quantity + back.c.n)
+    ).returning(ammo_table.c.id, ammo_table.c.user_id, ammo_table.c.caliber, ammo_table.c.count_per_box)
+
+    return db.session.execute(stmt).all()
+
+
+def _return_boxes_per_row(returned):
+    """Fallback: one UPDATE per returned box"""
+    rows = []
+    for ammo_id, quantity in sorted(returned.items()):
+        stmt = update(ammo_table).where(
+            ammo_table.c.id == ammo_id,
+            ammo_table.c.quantity + quantity >= 0
+        ).values(
+            quantity=ammo_table.c.quantity + quantity,
+            total_rounds=ammo_table.c.count_per_box * (ammo_table.c.quantity + quantity)
+        ).returning(ammo_table.c.id, ammo_table.c.user_id, ammo_table.c.caliber, ammo_table.c.count_per_box)
+        rows.extend(db.session.execute(stmt).all())
+    return rows
+
+
+def checkin_items(trip_id, quantities):
+    """
+    Check ammo back in for a range trip.
+
+    Locks the submitted trip items, sets their quantity_in and rounds_used in
+    one statement, then returns the change in quantity_in to the matching ammo
+    boxes in a second statement. Re-submitting a check-in, even concurrently,
+    only moves the difference, so boxes are never returned twice. The caller
+    is responsible for committing.
+
+    Args:
+        trip_id: ID of the range trip
+        quantities: Dictionary mapping trip item ID to the quantity checked back in
+
+    Returns:
+        Tuple of (list of updated item IDs, list of item IDs that were rejected
+        because they are not on this trip or exceed the quantity checked out)
+
+    Raises:
+        ValueError: If lowering a check-in would take a box below zero
+    """
+    if not quantities:
+        return [], []
+
+    current = _lock_items(trip_id, quantities)
+    if _use_bulk_values():
+        item_rows = _checkin_items_bulk(trip_id, quantities, current)
+    else:
+        item_rows = _checkin_items_per_row(trip_id, quantities, current)
+
+    # Net change per ammo box (several items can point at the same box)
+    returned = {}
+    updated_ids = []
+    for item_id, ammo_box_id, delta in item_rows:
+        updated_ids.append(item_id)
+        if ammo_box_id and delta:
+            returned[ammo_box_id] = returned.get(ammo_box_id, 0) + delta
+
+    returned = {ammo_id: quantity for ammo_id, quantity in returned.items() if quantity}
+    if returned:
+        if _use_bulk_values():
+            box_rows = _return_boxes_bulk(returned)
+        else:
+            box_rows = _return_boxes_per_row(returned)
+
+        # Boxes deleted since checkout are skipped; an existing box that was not
+        # updated would have gone below zero
+        missing = set(returned) - {row.id for row in box_rows}
+        if missing and db.session.execute(
+            select(ammo_table.c.id).where(ammo_table.c.id.in_(list(missing)))
+        ).first():
+            raise ValueError('Not enough boxes left in inventory to lower the check-in quantity')
+
+        rollup_deltas = {}
+        for row in box_rows:
+            quantity = returned[row.id]
+            delta = rollup_deltas.setdefault((row.user_id, row.caliber), [0, 0])
+            delta[0] += row.count_per_box * quantity
+            delta[1] += quantity
+
+        for (user_id, caliber), (rounds, boxes) in rollup_deltas.items():
+            apply_rollup_delta(db.session.connection(), user_id, caliber, rounds=rounds, boxes=boxes)
+
+    updated = set(updated_ids)
+    failed = [item_id for item_id in quantities if item_id not in updated]
+
+    return updated_ids, failed
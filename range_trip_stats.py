@@ -0,0 +1,75 @@
+from sqlalchemy import func
+from sqlalchemy.orm import raiseload
+from models import db, RangeTrip, RangeTripItem
+
+# Aggregated range trip statistics computed in the database
+
+
+def get_range_trip_stats(user_id):
+    """
+    Build the range trips dashboard data for a user.
+
+    Runs a fixed number of queries regardless of how many trips the user has:
+    one for the trip list and one GROUP BY over range_trip_items joined to
+    range_trips for the per-trip and per-caliber rounds used. The returned
+    trips refuse lazy loads of their relationships.
+
+    Args:
+        user_id: ID of the user whose trips to summarize
+
+    Returns:
+        Dictionary with the trip list and the dashboard statistics
+    """
+    # Get all range trips, most recent first. The list shows only trip columns
+    # and the totals attached below, so no relationship is loaded; raiseload
+    # turns any later lazy load into an error instead of one query per trip.
+    trips = RangeTrip.query.filter_by(user_id=user_id).options(
+        raiseload('*')
+    ).order_by(RangeTrip.date.desc()).all()
+
+    # Sum rounds used per trip and caliber in a single grouped query
+    usage_rows = db.session.query(
+        RangeTripItem.range_trip_id,
+        RangeTripItem.caliber,
+        func.coalesce(func.sum(RangeTripItem.rounds_used), 0).label('rounds_used'),
+        func.min(RangeTripItem.id).label('first_item_id')
+    ).join(
+        RangeTrip, RangeTrip.id == RangeTripItem.range_trip_id
+    ).filter(
+        RangeTrip.user_id == user_id
+    ).group_by(
+        RangeTripItem.range_trip_id,
+        RangeTripItem.caliber
+    ).all()
+
+    # Visit calibers in the order the trips and their items are listed, so the
+    # chart order and the most-used tie-break match a trip-by-trip walk
+    trip_order = {trip.id: position for position, trip in enumerate(trips)}
+    usage_rows.sort(key=lambda row: (trip_order.get(row.range_trip_id, len(trip_order)), row.first_item_id))
+
+    rounds_by_trip = {}
+    caliber_usage = {}
+    for row in usage_rows:
+        rounds_by_trip[row.range_trip_id] = rounds_by_trip.get(row.range_trip_id, 0) + row.rounds_used
+        caliber_usage[row.caliber] = caliber_usage.get(row.caliber, 0) + row.rounds_used
+
+    # Attach per-trip totals so the template can show them without extra queries
+    for trip in trips:
+        trip.total_rounds_used = rounds_by_trip.get(trip.id, 0)
+
+    # Get most used caliber (the first one seen wins a tie)
+    most_used_caliber = None
+    most_used_count = 0
+    for caliber, count in caliber_usage.items():
+        if count > most_used_count:
+            most_used_caliber = caliber
+            most_used_count = count
+
+    return {
+        'trips': trips,
+        'total_trips': len(trips),
+        'active_trips': sum(1 for trip in trips if trip.status == 'active'),
+        'total_rounds_used': sum(caliber_usage.values()),
+        'caliber_usage': caliber_usage,
+        'most_used_caliber': most_used_caliber
+    }
@@ -16,8 +16,8 @@ from oauthlib.oauth2.rfc6749.errors import InvalidGrantError
 from sqlalchemy.exc import NoResultFound
 from werkzeug.local import LocalProxy
 
-from app import app, db
-from models import OAuth, User
+from main import app
+from models import db, OAuth, User
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'replit_auth.login'
@@ -0,0 +1,215 @@
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import db, ScrapeJob
+
+# Background ammunition scraping for /api/scrape_ammo.
+#
+# A scrape is recorded as a ScrapeJob row and run on a small thread pool in
+# the worker that received it; the row is updated as each product page
+# finishes, so any worker can answer /api/scrape_jobs/<id> with progress and
+# partial results. Identical queries share the in-flight job, and finished
+# jobs are reused until their results expire.
+
+# Configuration keys read by init_scrape_jobs() and their defaults
+DEFAULT_CONFIG = {
+    'SCRAPE_WORKERS': 2,          # Scrapes run at once per gunicorn worker
+    'SCRAPE_RESULT_TTL': 900,     # Seconds finished results are reused for the same query
+    'SCRAPE_JOB_TIMEOUT': 120,    # Seconds after which an unfinished job is considered dead
+}
+
+MAX_PRODUCTS_LIMIT = 20
+
+# Products are only useful for import with all three of these
+REQUIRED_PRODUCT_FIELDS = ('upc', 'caliber', 'count_per_box')
+
+NO_RESULTS_MESSAGE = "No ammunition products found. Try a different search term."
+
+# Fallback entries when scraping finds nothing for a recognisable caliber
+GENERIC_CALIBERS = {
+    "9mm": "9mm Luger",
+    "5.56": "5.56 NATO",
+    ".223": ".223 Remington",
+    ".45": ".45 ACP",
+    ".22": ".22 LR",
+    "12 gauge": "12 Gauge"
+}
+
+config = dict(DEFAULT_CONFIG)
+_app = None
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def init_scrape_jobs(app):
+    """Remember the app (worker threads need its context) and read the job settings"""
+    global _app
+    _app = app
+    for key in DEFAULT_CONFIG:
+        if key in app.config:
+            config[key] = app.config[key]
+
+
+def _get_executor():
+    # Created on first use so importing the module starts no threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(config['SCRAPE_WORKERS']),
+                                           thread_name_prefix='scrape-job')
+        return _executor
+
+
+def query_key(query, max_products):
+    """Normalize a query so equivalent searches share a job"""
+    return f"{' '.join(query.lower().split())}|{max_products}"
+
+
+def generic_scrape_results(query):
+    """
+    Build a placeholder product for a query that names a known caliber.
+
+    Returns:
+        List with one generic product, or an empty list
+    """
+    detected_caliber = None
+    for cal_pattern, cal_name in GENERIC_CALIBERS.items():
+        if cal_pattern in query:
+            detected_caliber = cal_name
+            break
+
+    if not detected_caliber:
+        return []
+
+    return [{
+        "name": f"Generic {detected_caliber} Ammunition",
+        "upc": "000000000000",  # Generic UPC
+        "caliber": detected_caliber,
+        "count_per_box": 50 if detected_caliber in ["9mm Luger", ".45 ACP"] else 20,
+        "price": "$19.99",
+        "url": "https://palmettostatearmory.com/ammunition.html",
+        "description": f"Generic {detected_caliber} ammunition. Please update with actual details."
+    }]
+
+
+def _is_complete(product):
+    return bool(product) and all(field in product for field in REQUIRED_PRODUCT_FIELDS)
+
+
+def _is_stale(job, now):
+    timeout = timedelta(seconds=float(config['SCRAPE_JOB_TIMEOUT']))
+    return job.status in ('queued', 'running') and job.created_at < now - timeout
+
+
+def _purge_expired_jobs(now):
+    """Delete jobs whose results can no longer be reused"""
+    keep_for = timedelta(seconds=float(config['SCRAPE_RESULT_TTL']) + float(config['SCRAPE_JOB_TIMEOUT']))
+    ScrapeJob.query.filter(ScrapeJob.created_at < now - keep_for).delete(synchronize_session=False)
+
+
+def submit_scrape_job(query, max_products):
+    """
+    Start a background scrape, or reuse an identical one that is running or fresh.
+
+    Args:
+        query: Search terms (lower case)
+        max_products: Maximum number of products to fetch details for
+
+    Returns:
+        The ScrapeJob that will answer the query
+    """
+    now = datetime.utcnow()
+    key = query_key(query, max_products)
+    ttl = timedelta(seconds=float(config['SCRAPE_RESULT_TTL']))
+
+    candidates = ScrapeJob.query.filter(
+        ScrapeJob.query_key == key,
+        ScrapeJob.status.in_(('queued', 'running', 'done'))
+    ).order_by(ScrapeJob.created_at.desc()).limit(5).all()
+
+    for job in candidates:
+        if job.status == 'done' and job.finished_at and job.finished_at >= now - ttl:
+            return job
+        if job.status in ('queued', 'running') and not _is_stale(job, now):
+            return job
+
+    _purge_expired_jobs(now)
+    job = ScrapeJob(id=uuid.uuid4().hex, query_key=key, search_terms=query, max_products=max_products)
+    db.session.add(job)
+    db.session.commit()
+
+    _get_executor().submit(_run_job, job.id)
+    return job
+
+
+def get_scrape_job(job_id):
+    """
+    Get a job for status polling, failing it if its worker has gone away.
+
+    Returns:
+        The ScrapeJob, or None if there is no such job
+    """
+    job = db.session.get(ScrapeJob, job_id)
+    if job and _is_stale(job, datetime.utcnow()):
+        job.status = 'failed'
+        job.message = "The search took too long. Please try again."
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
+
+
+def _run_job(job_id):
+    """Run one scrape on a pool thread, saving progress as each product page finishes"""
+    from scraper import PalmettoScraper
+
+    with _app.app_context():
+        job = db.session.get(ScrapeJob, job_id)
+        if job is None:
+            return
+
+        try:
+            job.status = 'running'
+            db.session.commit()
+
+            slots = []
+
+            def on_search(products):
+                slots.extend([None] * len(products))
+                job.total = len(products)
+                db.session.commit()
+
+            def on_details(index, details):
+                if _is_complete(details):
+                    slots[index] = details
+                job.completed += 1
+                job.results = json.dumps([product for product in slots if product])
+                db.session.commit()
+
+            scraper = PalmettoScraper()
+            scraper.search_and_get_details(job.search_terms, max_products=job.max_products,
+                                           on_search=on_search, on_details=on_details)
+
+            results = [product for product in slots if product]
+            if not results:
+                # If no results from scraping, use simulated data based on query
+                results = generic_scrape_results(job.search_terms)
+                if not results:
+                    job.message = NO_RESULTS_MESSAGE
+
+            job.results = json.dumps(results)
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error processing ammunition search: {str(e)}")
+            job = db.session.get(ScrapeJob, job_id)
+            if job:
+                job.status = 'failed'
+                job.message = f"Error processing ammunition search: {str(e)}"[:500]
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
@@ -1,20 +1,139 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+import os
 import re
 import logging
 import json
+import threading
 import time
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlparse
+from http_cache import get_http_cache
+from html_parsing import parse_search_page, parse_product_page, extract_json_ld_product
+from ammo_classifier import classify, classify_many
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Politeness and concurrency settings (overridable from the environment)
+SCRAPER_RATE = float(os.environ.get('SCRAPER_RATE', 1.0))          # Requests per second per host
+SCRAPER_BURST = int(os.environ.get('SCRAPER_BURST', 2))            # Requests allowed back to back
+SCRAPER_WORKERS = int(os.environ.get('SCRAPER_WORKERS', 4))        # Concurrent detail page fetches
+SCRAPER_DEADLINE = float(os.environ.get('SCRAPER_DEADLINE', 20))   # Seconds for a whole search
+REQUEST_TIMEOUT = 10
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at rate tokens per second up to burst.
+    
+    Callers reserve a token up front and then sleep until it is due, so
+    waiters are served in the order they arrived.
+    """
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, deadline=None):
+        """
+        Take one token, waiting for it if necessary.
+        
+        Args:
+            deadline: time.monotonic() value to give up at, or None to wait indefinitely
+            
+        Returns:
+            True if a token was taken, False if it would not be available before the deadline
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            
+            wait_for = 0.0
+            if self.tokens < 1:
+                wait_for = (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+            if deadline is not None and now + wait_for > deadline:
+                return False
+            
+            # Tokens may go negative: that is the queue of reserved slots
+            self.tokens -= 1
+        
+        if wait_for > 0:
+            time.sleep(wait_for)
+        return True
+
+
+class HostRateLimiter:
+    """One token bucket per host, shared by every scraper in the process"""
+    
+    def __init__(self, rate=SCRAPER_RATE, burst=SCRAPER_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+    
+    def acquire(self, url, deadline=None):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire(deadline)
+
+
+# Process-wide limiter so concurrent searches share each host's budget
+rate_limiter = HostRateLimiter()
+
+
+# Product fields JSON-LD must provide for the DOM to be skipped entirely
+STRUCTURED_REQUIRED_FIELDS = ('name', 'upc', 'price')
+
+# How product pages were extracted: "json-ld" (no DOM), "json-ld+dom" or "dom"
+extraction_stats = {'json-ld': 0, 'json-ld+dom': 0, 'dom': 0}
+_extraction_stats_lock = threading.Lock()
+
+
+def record_extraction(path):
+    with _extraction_stats_lock:
+        extraction_stats[path] += 1
+
+
+def log_extraction_stats():
+    with _extraction_stats_lock:
+        stats = dict(extraction_stats)
+    total = sum(stats.values())
+    if total:
+        logger.info(
+            f"Product extraction: {stats['json-ld']} JSON-LD only, {stats['json-ld+dom']} JSON-LD + DOM, "
+            f"{stats['dom']} DOM only, fast path rate {stats['json-ld'] / total:.1%}"
+        )
+
+
+def _request_timeout(deadline):
+    """Per-request timeout that never runs past the overall deadline"""
+    if deadline is None:
+        return REQUEST_TIMEOUT
+    return max(0.1, min(REQUEST_TIMEOUT, deadline - time.monotonic()))
+
 class PalmettoScraper:
     """A class to scrape ammunition data from Palmetto State Armory."""
     
-    def __init__(self):
+    def __init__(self, max_workers=SCRAPER_WORKERS, deadline=SCRAPER_DEADLINE, limiter=None, cache=None):
+        self.max_workers = max(1, max_workers)
+        self.deadline = deadline
+        self.limiter = limiter or rate_limiter
+        self.cache = cache if cache is not None else get_http_cache()
+        
+        # One session shared by all worker threads, with a connection pool big enough for them
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.base_url = "https://palmettostatearmory.com"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -25,19 +144,56 @@ class PalmettoScraper:
         }
         self.session.headers.update(self.headers)
     
-    def search_ammo(self, query, page=1):
+    def fetch(self, url, deadline=None):
+        """
+        GET a page through the HTTP cache and the per-host rate limiter.
+        
+        Fresh cached pages are returned without touching the network (or the
+        rate limit); stale ones are revalidated with a conditional request.
+        
+        Args:
+            url: URL to fetch
+            deadline: time.monotonic() value after which to give up
+            
+        Returns:
+            Page HTML, or None if the deadline passed before the request could be sent
+            
+        Raises:
+            requests.RequestException: If the request fails
+        """
+        cached = self.cache.lookup(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            self.cache.record_hit(cached)
+            return cached.body.decode(cached.encoding or 'utf-8', errors='replace')
+        
+        if not self.limiter.acquire(url, deadline):
+            logger.warning(f"Deadline reached before fetching {url}")
+            return None
+        
+        headers = self.cache.conditional_headers(cached) if cached else {}
+        response = self.session.get(url, headers=headers, timeout=_request_timeout(deadline))
+        
+        if response.status_code == 304 and cached:
+            self.cache.record_not_modified(cached, response.headers)
+            return cached.body.decode(cached.encoding or 'utf-8', errors='replace')
+        
+        response.raise_for_status()
+        if self.cache:
+            self.cache.store(url, response)
+        return response.text
+    
+    def search_ammo(self, query, page=1, deadline=None):
         """
         Search for ammunition on Palmetto State Armory.
         
         Args:
             query: Search terms (e.g., "9mm ammo")
             page: Page number to fetch
+            deadline: time.monotonic() value after which to give up
             
         Returns:
             List of ammunition products with details
         """
-        results = []
-        
         try:
             # Add "ammo" to query if it doesn't already contain ammo-related keywords
             search_terms = query.lower()
@@ -50,100 +206,16 @@ class PalmettoScraper:
             search_url = f"{self.base_url}/search/?q={query}&page={page}"
             logger.info(f"Searching {search_url}")
             
-            # Make the request with a timeout
-            response = self.session.get(search_url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse the HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all product items
-            product_items = soup.select('.product-item')
-            logger.info(f"Found {len(product_items)} product items")
-            
-            # If no results with standard selectors, try alternative selectors
-            if not product_items:
-                logger.info("No products found with standard selectors, trying alternatives")
-                product_items = soup.select('.product-grid-tile')
-            
-            if not product_items:
-                logger.info("Still no products found, trying generic product containers")
-                product_items = soup.select('.product')
-            
-            logger.info(f"After trying alternative selectors: {len(product_items)} products")
+            # Make the request (cached, rate limited and bounded by the deadline)
+            html = self.fetch(search_url, deadline)
+            if html is None:
+                return []
             
             # For debugging - log the first 200 chars of the HTML
-            logger.info(f"HTML snippet: {response.text[:200]}...")
-            
-            for item in product_items:
-                try:
-                    # Try different selectors for product details based on site structure
-                    title_elem = (item.select_one('.product-title') or 
-                                 item.select_one('.product-name') or 
-                                 item.select_one('h2.name') or
-                                 item.select_one('.title'))
-                    
-                    price_elem = (item.select_one('.price .price-sales') or 
-                                 item.select_one('.product-price') or
-                                 item.select_one('.price'))
-                    
-                    link_elem = (item.select_one('a.name-link') or 
-                                item.select_one('a.product-link') or
-                                item.select_one('a'))
-                    
-                    if not title_elem or not link_elem:
-                        logger.info("Skipping item: missing title or link element")
-                        continue
-                    
-                    # Get text content
-                    title = title_elem.text.strip() if hasattr(title_elem, 'text') else "Unknown Product"
-                    logger.info(f"Found product: {title}")
-                    
-                    # Use query terms to determine if this is ammo
-                    search_calibers = ['9mm', '5.56', '223', '.223', '22lr', '.22', '308', '.308', '45acp', '.45']
-                    is_relevant = False
-                    
-                    # Check if any of our search calibers is in the title
-                    for caliber in search_calibers:
-                        if caliber in title.lower().replace(' ', ''):
-                            is_relevant = True
-                            break
-                    
-                    # Also check for ammunition keywords
-                    ammo_keywords = ['ammo', 'ammunition', 'round', 'rounds', 'cartridge', 'cartridges', 'bullet', 'bullets']
-                    if any(keyword in title.lower() for keyword in ammo_keywords):
-                        is_relevant = True
-                    
-                    if not is_relevant:
-                        logger.info(f"Skipping - not ammunition: {title}")
-                        continue
-                    
-                    # Extract price if available
-                    price = price_elem.text.strip() if (price_elem and hasattr(price_elem, 'text')) else "Price not available"
-                    
-                    # Extract product link
-                    if hasattr(link_elem, 'get') and link_elem.get('href'):
-                        product_link = link_elem['href']
-                        if product_link.startswith('http'):
-                            full_url = product_link
-                        else:
-                            full_url = urljoin(self.base_url, product_link)
-                    else:
-                        logger.info(f"Skipping - no valid link for: {title}")
-                        continue
-                    
-                    # Add to results
-                    results.append({
-                        'title': title,
-                        'price': price,
-                        'url': full_url
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Error extracting product details: {e}")
-                    continue
+            logger.info(f"HTML snippet: {html[:200]}...")
             
-            return results
+            # Parse only the product tiles and extract them
+            return self.parse_search_results(parse_search_page(html))
             
         except requests.RequestException as e:
             logger.error(f"Request failed: {e}")
@@ -152,118 +224,129 @@ class PalmettoScraper:
             logger.error(f"Unexpected error: {e}")
             return []
     
-    def extract_product_details(self, product_url):
+    def parse_search_results(self, soup):
+        """
+        Extract ammunition products from a parsed search results page.
+        
+        Args:
+            soup: BeautifulSoup tree of the search page (see html_parsing.parse_search_page)
+        
+        Returns:
+            List of dictionaries with title, price and url
+        """
+        results = []
+        
+        # Find all product items
+        product_items = soup.select('.product-item')
+        logger.info(f"Found {len(product_items)} product items")
+        
+        # If no results with standard selectors, try alternative selectors
+        if not product_items:
+            logger.info("No products found with standard selectors, trying alternatives")
+            product_items = soup.select('.product-grid-tile')
+        
+        if not product_items:
+            logger.info("Still no products found, trying generic product containers")
+            product_items = soup.select('.product')
+        
+        logger.info(f"After trying alternative selectors: {len(product_items)} products")
+        
+        for item in product_items:
+            try:
+                # Try different selectors for product details based on site structure
+                title_elem = (item.select_one('.product-title') or 
+                             item.select_one('.product-name') or 
+                             item.select_one('h2.name') or
+                             item.select_one('.title'))
+                
+                price_elem = (item.select_one('.price .price-sales') or 
+                             item.select_one('.product-price') or
+                             item.select_one('.price'))
+                
+                link_elem = (item.select_one('a.name-link') or 
+                            item.select_one('a.product-link') or
+                            item.select_one('a'))
+                
+                if not title_elem or not link_elem:
+                    logger.info("Skipping item: missing title or link element")
+                    continue
+                
+                # Get text content
+                title = title_elem.text.strip() if hasattr(title_elem, 'text') else "Unknown Product"
+                logger.info(f"Found product: {title}")
+                
+                # Extract price if available
+                price = price_elem.text.strip() if (price_elem and hasattr(price_elem, 'text')) else "Price not available"
+                
+                # Extract product link
+                if hasattr(link_elem, 'get') and link_elem.get('href'):
+                    product_link = link_elem['href']
+                    if product_link.startswith('http'):
+                        full_url = product_link
+                    else:
+                        full_url = urljoin(self.base_url, product_link)
+                else:
+                    logger.info(f"Skipping - no valid link for: {title}")
+                    continue
+                
+                # Add to candidates (relevance is checked for the whole page at once)
+                results.append({
+                    'title': title,
+                    'price': price,
+                    'url': full_url
+                })
+            
+            except Exception as e:
+                logger.error(f"Error extracting product details: {e}")
+                continue
+        
+        # Keep only titles that name a caliber or read as ammunition
+        relevant = []
+        classifications = classify_many([result['title'] for result in results])
+        for result, classification in zip(results, classifications):
+            if classification['is_ammo']:
+                relevant.append(result)
+            else:
+                logger.info(f"Skipping - not ammunition: {result['title']}")
+        
+        return relevant
+    
+    def extract_product_details(self, product_url, deadline=None):
         """
         Extract detailed information from a product page.
         
         Args:
             product_url: URL of the product page
+            deadline: time.monotonic() value after which to give up
             
         Returns:
             Dictionary with product details including UPC if available
         """
         try:
-            # Add a small delay to avoid being rate-limited
-            time.sleep(1)
-            
-            # Make the request
-            response = self.session.get(product_url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse the HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract product name
-            product_name = soup.select_one('h1.product-name')
-            name = product_name.text.strip() if product_name else "Name not found"
-            
-            # Extract UPC from product details
-            upc = None
-            product_info = soup.select('.product-info-container .attribute-group')
-            for info in product_info:
-                # Look for UPC in product attributes
-                upc_label = info.find(string=re.compile(r'UPC', re.IGNORECASE))
-                if upc_label:
-                    # Get the next sibling which should contain the UPC value
-                    upc_value = upc_label.find_next(string=True)
-                    if upc_value:
-                        upc = upc_value.strip()
-                        # Clean up UPC to get only numbers
-                        upc = re.sub(r'[^0-9]', '', upc)
-                        break
-            
-            # Extract description which may contain caliber info
-            description_elem = soup.select_one('.product-description')
-            description = description_elem.text.strip() if description_elem else ""
-            
-            # Try to extract caliber from name or description
-            caliber_patterns = [
-                r'(\d+\s*mm)',                     # matches like "9mm"
-                r'(\.\d+\s*[A-Za-z]+)',            # matches like ".223 Remington"
-                r'(5\.56)',                        # matches "5.56"
-                r'(7\.62)',                        # matches "7.62"
-                r'(\d+\s*[Gg]auge)',               # matches like "12 gauge"
-                r'(\d+\s*[Aa][Cc][Pp])',           # matches like "45 ACP"
-                r'(10mm)',                          # specific case for 10mm
-                r'(38 Special)',                    # specific case
-                r'(357 Magnum)',                    # specific case
-                r'(44 Magnum)',                     # specific case
-                r'(300 Blackout)',                  # specific case
-                r'(6\.5 Creedmoor)',                # specific case
-                r'(7mm-\d+)',                       # matches like "7mm-08"
-                r'(30-\d+)',                        # matches like "30-06"
-                r'(6\.5x\d+)',                      # matches like "6.5x55"
-            ]
-            
-            caliber = None
-            text_to_search = f"{name} {description}"
-            
-            for pattern in caliber_patterns:
-                match = re.search(pattern, text_to_search, re.IGNORECASE)
-                if match:
-                    caliber = match.group(1).strip()
-                    break
-            
-            # Try to extract rounds per box from description
-            count_per_box = None
-            count_patterns = [
-                r'(\d+)\s*(?:rd|round|count|ct)\b',  # matches like "20 rd" or "50 round" or "100 count"
-                r'(?:box\s*of\s*)(\d+)',             # matches like "box of 50"
-                r'(\d+)(?:\s*-\s*|\s+)(?:round|rd|count|ct)\b'  # matches like "20-round" or "50 rd"
-            ]
-            
-            for pattern in count_patterns:
-                match = re.search(pattern, text_to_search, re.IGNORECASE)
-                if match:
-                    count_per_box = int(match.group(1).strip())
-                    break
-            
-            # Extract image URL if available
-            image_elem = soup.select_one('.product-image-container img')
-            image_url = image_elem.get('src') if image_elem else None
-            
-            # Extract price
-            price_elem = soup.select_one('.prices .price-sales')
-            price = price_elem.text.strip() if price_elem else "Price not available"
-            
-            # Return the extracted details
-            details = {
-                'name': name,
-                'url': product_url,
-                'price': price,
-                'description': description[:200] + '...' if len(description) > 200 else description,
-                'image_url': image_url
-            }
-            
-            if upc:
-                details['upc'] = upc
-            
-            if caliber:
-                details['caliber'] = caliber
-            
-            if count_per_box:
-                details['count_per_box'] = count_per_box
-            
+            # Make the request (cached, rate limited and bounded by the deadline)
+            html = self.fetch(product_url, deadline)
+            if html is None:
+                return None
+            
+            # Fast path: a complete JSON-LD Product block needs no DOM at all
+            structured = extract_json_ld_product(html)
+            if all(field in structured for field in STRUCTURED_REQUIRED_FIELDS):
+                details = self.build_details(
+                    product_url,
+                    structured['name'],
+                    structured.get('description', ''),
+                    structured['price'],
+                    structured.get('image_url'),
+                    structured['upc']
+                )
+                path = 'json-ld'
+            else:
+                # Parse only the regions holding product data and extract them
+                details = self.parse_product_details(parse_product_page(html), product_url)
+                path = self.merge_structured_details(details, structured)
+            
+            details['extraction'] = path
+            record_extraction(path)
             return details
             
         except requests.RequestException as e:
@@ -273,27 +356,190 @@ class PalmettoScraper:
             logger.error(f"Unexpected error extracting product details: {e}")
             return None
     
-    def search_and_get_details(self, query, max_products=5):
+    def parse_product_details(self, soup, product_url):
+        """
+        Extract product details from a parsed product page.
+        
+        Args:
+            soup: BeautifulSoup tree of the product page (see html_parsing.parse_product_page)
+            product_url: URL the page was fetched from
+        
+        Returns:
+            Dictionary with product details including UPC if available
+        """
+        # Extract product name
+        product_name = soup.select_one('h1.product-name')
+        name = product_name.text.strip() if product_name else "Name not found"
+        
+        # Extract UPC from product details
+        upc = None
+        product_info = soup.select('.product-info-container .attribute-group')
+        for info in product_info:
+            # Look for UPC in product attributes
+            upc_label = info.find(string=re.compile(r'UPC', re.IGNORECASE))
+            if upc_label:
+                # Get the next sibling which should contain the UPC value
+                upc_value = upc_label.find_next(string=True)
+                if upc_value:
+                    upc = upc_value.strip()
+                    # Clean up UPC to get only numbers
+                    upc = re.sub(r'[^0-9]', '', upc)
+                    break
+        
+        # Extract description which may contain caliber info
+        description_elem = soup.select_one('.product-description')
+        description = description_elem.text.strip() if description_elem else ""
+        
+        # Extract image URL if available
+        image_elem = soup.select_one('.product-image-container img')
+        image_url = image_elem.get('src') if image_elem else None
+        
+        # Extract price
+        price_elem = soup.select_one('.prices .price-sales')
+        price = price_elem.text.strip() if price_elem else "Price not available"
+        
+        return self.build_details(product_url, name, description, price, image_url, upc)
+    
+    def merge_structured_details(self, details, structured):
+        """
+        Fill fields the DOM heuristics missed from a partial JSON-LD block.
+        
+        Args:
+            details: Dictionary returned by parse_product_details (updated in place)
+            structured: Dictionary returned by extract_json_ld_product
+            
+        Returns:
+            The extraction path: "json-ld+dom" if JSON-LD filled any field, "dom" otherwise
+        """
+        if not structured:
+            return 'dom'
+        
+        missing_values = {
+            'name': "Name not found",
+            'price': "Price not available",
+            'description': "",
+            'image_url': None,
+            'upc': None
+        }
+        filled = False
+        for field, missing in missing_values.items():
+            if details.get(field, missing) == missing and structured.get(field):
+                details[field] = structured[field]
+                filled = True
+        
+        # Re-derive caliber and rounds per box from the completed name and description
+        if filled:
+            rebuilt = self.build_details(details['url'], details['name'], details['description'],
+                                         details['price'], details['image_url'], details.get('upc'))
+            details.clear()
+            details.update(rebuilt)
+        
+        # JSON-LD that only repeated what the DOM already had did not help
+        return 'json-ld+dom' if filled else 'dom'
+    
+    def build_details(self, product_url, name, description, price, image_url, upc=None):
+        """
+        Assemble the details dictionary and infer caliber and rounds per box.
+        
+        Args:
+            product_url: URL of the product page
+            name: Product name
+            description: Product description text
+            price: Display price
+            image_url: Product image URL or None
+            upc: UPC digits or None
+            
+        Returns:
+            Dictionary with product details including UPC if available
+        """
+        # Extract caliber and rounds per box from name and description
+        classification = classify(f"{name} {description}")
+        caliber = classification['caliber']
+        count_per_box = classification['count_per_box']
+        
+        # Return the extracted details
+        details = {
+            'name': name,
+            'url': product_url,
+            'price': price,
+            'description': description[:200] + '...' if len(description) > 200 else description,
+            'image_url': image_url
+        }
+        
+        if upc:
+            details['upc'] = upc
+        
+        if caliber:
+            details['caliber'] = caliber
+        
+        if count_per_box:
+            details['count_per_box'] = count_per_box
+        
+        return details
+    
+    def search_and_get_details(self, query, max_products=5, on_search=None, on_details=None):
         """
         Search for products and get detailed information for each.
         
+        Detail pages are fetched concurrently, paced by the per-host rate
+        limiter. If the deadline passes, the details fetched so far are returned.
+        
         Args:
             query: Search terms
             max_products: Maximum number of products to fetch details for
+            on_search: Optional callback(products) with the search results to be detailed
+            on_details: Optional callback(index, details) as each detail page finishes
+                (details is None if the page failed); called from this thread
             
         Returns:
-            List of products with detailed information
+            List of products with detailed information, in search order
         """
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        
         # Search for products
-        search_results = self.search_ammo(query)
+        search_results = self.search_ammo(query, deadline=deadline)[:max_products]
+        if on_search:
+            on_search(search_results)
+        if not search_results:
+            if self.cache:
+                self.cache.log_stats()
+            return []
         
-        # Get details for each product, limited by max_products
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(search_results)))
+        try:
+            futures = []
+            for product in search_results:
+                logger.info(f"Getting details for: {product['title']}")
+                futures.append(executor.submit(self.extract_product_details, product['url'], deadline))
+            
+            # Collect pages as they finish until all are done or the deadline passes
+            index_of = {future: index for index, future in enumerate(futures)}
+            done, not_done = set(), set(futures)
+            while not_done:
+                timeout = max(0, deadline - time.monotonic()) if deadline else None
+                finished, not_done = wait(not_done, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not finished:
+                    break
+                done |= finished
+                if on_details:
+                    for future in sorted(finished, key=index_of.get):
+                        on_details(index_of[future], None if future.cancelled() else future.result())
+            
+            if not_done:
+                logger.warning(f"Deadline reached: returning {len(done)} of {len(futures)} product details")
+        finally:
+            # Don't block on stragglers; their requests are bounded by the deadline anyway
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Keep search order and skip pages that failed or did not finish
         detailed_results = []
-        for product in search_results[:max_products]:
-            logger.info(f"Getting details for: {product['title']}")
-            details = self.extract_product_details(product['url'])
-            if details:
-                detailed_results.append(details)
+        for future in futures:
+            if future in done and not future.cancelled() and future.result():
+                detailed_results.append(future.result())
+        
+        if self.cache:
+            self.cache.log_stats()
+        log_extraction_stats()
         
         return detailed_results
 
@@ -10,7 +10,7 @@ auth_simple = Blueprint('auth_simple', __name__)
 def login():
     """Handle user login with static credentials"""
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
         
     if request.method == 'POST':
         username = request.form.get('username')
@@ -38,7 +38,7 @@ def login():
             # Log in the user
             login_user(user, remember=remember)
             flash('Login successful!', 'success')
-            return redirect(url_for('home'))
+            return redirect(url_for('main.home'))
         else:
             flash('Invalid username or password', 'danger')
             
@@ -0,0 +1,212 @@
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, AmmoBox, UpcData, RangeTrip, User, CaliberRollup, StockStatus
+from migrate_db import migrate_database
+from caliber_rollups import rebuild_caliber_rollups
+from stock_alerts import rebuild_stock_status
+
+# One-time database setup, kept out of the import path.
+#
+# Importing app.py or calling create_app() never touches the database. The
+# schema migration and default data below run once per deployment instead:
+# from the gunicorn master before workers fork (gunicorn.conf.py), from
+# `flask init-db`, or from the development server entry point.
+
+# Create default UPC data
+DEFAULT_UPC_DATA = [
+    {
+        "upc": "604544617375",
+        "name": "Federal Premium .223 Rem 55gr FMJ",
+        "caliber": ".223 Remington",
+        "count_per_box": 20
+    },
+    {
+        "upc": "020892212602",
+        "name": "Winchester 9mm Luger 115gr FMJ",
+        "caliber": "9mm Luger",
+        "count_per_box": 50
+    },
+    {
+        "upc": "029465088414",
+        "name": "Remington UMC .45 ACP 230gr FMJ",
+        "caliber": ".45 ACP",
+        "count_per_box": 50
+    },
+    {
+        "upc": "076683051202",
+        "name": "CCI Blazer Brass 9mm 115gr FMJ",
+        "caliber": "9mm Luger",
+        "count_per_box": 50
+    },
+    {
+        "upc": "090255815511",
+        "name": "Federal American Eagle 5.56mm 55gr FMJ",
+        "caliber": "5.56 NATO",
+        "count_per_box": 20
+    }
+]
+
+# Default inventory items to add
+DEFAULT_INVENTORY = [
+    {
+        "name": "Federal Premium .223 Rem 55gr FMJ",
+        "upc": "604544617375",
+        "caliber": ".223 Remington",
+        "count_per_box": 20,
+        "quantity": 3,
+        "notes": "Range ammo"
+    },
+    {
+        "name": "Winchester 9mm Luger 115gr FMJ",
+        "upc": "020892212602",
+        "caliber": "9mm Luger",
+        "count_per_box": 50,
+        "quantity": 5,
+        "notes": "Training ammo"
+    }
+]
+
+# Code timed by benchmark_startup() in a fresh interpreter
+STARTUP_BENCHMARK_SCRIPT = """
+import time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+if {initialize}:
+    from startup import initialize_database
+    initialize_database(app)
+response = app.test_client().get({path!r})
+print(time.perf_counter() - started, response.status_code)
+"""
+
+
+def seed_database():
+    """Create the default user, UPC catalog entries, inventory and range trip if missing"""
+    if not User.query.filter_by(username='budd').first():
+        default_user = User(username='budd', email='budd@example.com')
+        default_user.set_password('dwyer')
+        db.session.add(default_user)
+        logging.info("Default user account created: username=budd, password=dwyer")
+
+    # Add default UPC data if it doesn't exist
+    default_upcs = [item["upc"] for item in DEFAULT_UPC_DATA]
+    existing = {row.upc for row in db.session.query(UpcData.upc).filter(UpcData.upc.in_(default_upcs))}
+    for upc_item in DEFAULT_UPC_DATA:
+        if upc_item["upc"] not in existing:
+            db.session.add(UpcData(
+                upc=upc_item["upc"],
+                name=upc_item["name"],
+                caliber=upc_item["caliber"],
+                count_per_box=upc_item["count_per_box"]
+            ))
+
+    # Add default inventory if no items exist
+    if not AmmoBox.query.first():
+        for item in DEFAULT_INVENTORY:
+            db.session.add(AmmoBox(
+                name=item["name"],
+                upc=item["upc"],
+                caliber=item["caliber"],
+                count_per_box=item["count_per_box"],
+                quantity=item["quantity"],
+                notes=item["notes"]
+            ))
+
+    # Add a sample range trip for demonstration if none exist
+    if not RangeTrip.query.first():
+        db.session.add(RangeTrip(
+            name="Sample Range Trip",
+            date=date.today(),
+            location="Local Range",
+            notes="Sample trip created automatically"
+        ))
+
+    db.session.commit()
+
+    # Backfill the caliber rollup for databases created before it existed
+    if not CaliberRollup.query.first() and AmmoBox.query.first():
+        rebuild_caliber_rollups()
+    elif not StockStatus.query.first() and CaliberRollup.query.first():
+        rebuild_stock_status()
+
+
+def initialize_database(app):
+    """
+    Migrate the schema and seed default data.
+
+    Args:
+        app: Flask application whose database to set up
+    """
+    with app.app_context():
+        started = time.perf_counter()
+        applied = migrate_database()
+        logging.info(f"Schema check took {(time.perf_counter() - started) * 1000:.1f} ms"
+                     f"{f', applied migrations {applied}' if applied else ''}")
+
+        try:
+            seed_database()
+        except Exception:
+            db.session.rollback()
+            raise
+        logging.info("Database initialized with default data")
+
+
+def benchmark_startup(runs=5, path='/about', initialize=False):
+    """
+    Measure cold import-to-first-request latency in fresh interpreters.
+
+    Args:
+        runs: Number of interpreters to start
+        path: URL requested once the app is built
+        initialize: Also run initialize_database() before the request, as
+            every import used to
+
+    Returns:
+        Dictionary with the per-run seconds, median, min and max
+    """
+    script = STARTUP_BENCHMARK_SCRIPT.format(initialize=bool(initialize), path=path)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout
+        seconds, status_code = output.split()[-2:]
+        if int(status_code) >= 500:
+            raise RuntimeError(f"GET {path} returned {status_code}")
+        timings.append(float(seconds))
+
+    return {
+        'runs': timings,
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings)
+    }
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Apply schema migrations and seed the default data."""
+    initialize_database(current_app._get_current_object())
+    click.echo("Database initialized")
+
+
+@click.command('startup-benchmark')
+@click.option('--runs', type=int, default=5, show_default=True, help='Fresh interpreters to start.')
+@click.option('--path', default='/about', show_default=True, help='URL of the first request.')
+@with_appcontext
+def startup_benchmark_command(runs, path):
+    """Time cold import-to-first-request, with and without database initialization."""
+    for label, initialize in (('import + first request', False), ('with initialize_database', True)):
+        result = benchmark_startup(runs=runs, path=path, initialize=initialize)
+        click.echo(f"{label:<26} median {result['median'] * 1000:7.1f} ms  "
+                   f"(min {result['min'] * 1000:.1f}, max {result['max'] * 1000:.1f})")
@@ -13,6 +13,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const manualUpcInput = document.getElementById('manualUpc');
     const manualLookupBtn = document.getElementById('manualLookupBtn');
     const addAmmoForm = document.getElementById('addAmmoForm');
+    const batchScanMode = document.getElementById('batchScanMode');
+    const scanQueueCard = document.getElementById('scanQueueCard');
+    const scanQueue = document.getElementById('scanQueue');
+    const clearQueueBtn = document.getElementById('clearQueueBtn');
     
     // Form fields
     const ammoUpcField = document.getElementById('ammoUpc');
@@ -26,6 +30,23 @@ document.addEventListener('DOMContentLoaded', function() {
     let quaggaScanner = null;
     let scanning = false;
     
+    // Batched lookup state: scans are queued briefly and resolved together
+    const BATCH_DELAY_MS = 300;
+    const MAX_BATCH_SIZE = 25;
+    const RESCAN_IGNORE_MS = 2000;
+    const lookupResults = new Map();   // UPC -> resolved lookup entry
+    const pendingLookups = new Map();  // UPC -> callbacks waiting for the next batch
+    let batchTimer = null;
+    let lastScan = { code: null, time: 0 };
+    
+    // Clear the batch scan list
+    if (clearQueueBtn) {
+        clearQueueBtn.addEventListener('click', function() {
+            scanQueue.innerHTML = '';
+            scanQueueCard.style.display = 'none';
+        });
+    }
+    
     // Start scanner button click handler
     if (startButton) {
         startButton.addEventListener('click', function() {
@@ -199,6 +220,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 
                 const code = result.codeResult.code;
+                
+                // The same box stays in view for several frames
+                const now = Date.now();
+                if (code === lastScan.code && now - lastScan.time < RESCAN_IGNORE_MS) {
+                    return;
+                }
+                lastScan = { code: code, time: now };
+                
                 scanMessage.textContent = `Barcode detected: ${code}`;
                 
                 // Play a success sound
@@ -210,6 +239,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     navigator.vibrate(200);
                 }
                 
+                // In batch mode keep scanning and queue the UPC
+                if (batchScanMode && batchScanMode.checked) {
+                    queueScan(code);
+                    return;
+                }
+                
                 // Stop the scanner and look up the UPC
                 Quagga.stop();
                 scanning = false;
@@ -238,62 +273,123 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     /**
-     * Look up UPC code from server
+     * Resolve a UPC, batching it with any other lookups made in the next few ms
      * @param {string} upc - The UPC code to look up
+     * @returns {Promise<Object>} The lookup entry ({success, data, source} or {success, message})
      */
-    function lookupUpc(upc) {
-        scanMessage.textContent = `Looking up UPC: ${upc}...`;
+    function resolveUpc(upc) {
+        if (lookupResults.has(upc)) {
+            return Promise.resolve(lookupResults.get(upc));
+        }
         
-        fetch(`/api/lookup_upc/${upc}`)
+        return new Promise((resolve, reject) => {
+            if (!pendingLookups.has(upc)) {
+                pendingLookups.set(upc, []);
+            }
+            pendingLookups.get(upc).push({ resolve: resolve, reject: reject });
+            
+            if (pendingLookups.size >= MAX_BATCH_SIZE) {
+                flushLookups();
+            } else if (!batchTimer) {
+                batchTimer = setTimeout(flushLookups, BATCH_DELAY_MS);
+            }
+        });
+    }
+    
+    /**
+     * Send all queued UPCs to the server in one batch request
+     */
+    function flushLookups() {
+        if (batchTimer) {
+            clearTimeout(batchTimer);
+            batchTimer = null;
+        }
+        if (pendingLookups.size === 0) {
+            return;
+        }
+        
+        const batch = new Map(pendingLookups);
+        pendingLookups.clear();
+        
+        fetch('/api/lookup_upcs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ upcs: Array.from(batch.keys()) })
+        })
             .then(response => response.json())
             .then(data => {
-                if (data.success) {
-                    // Check the source of the data (database or API)
-                    let sourceInfo = "";
-                    if (data.source === "api") {
-                        sourceInfo = " (from UPC Item DB API)";
-                        // For API results, allow user to edit fields as they might need refinement
-                        ammoNameField.classList.add("border-info");
-                        ammoCaliberField.classList.add("border-info");
-                        ammoCountPerBoxField.classList.add("border-info");
-                    }
-                    
-                    scanMessage.textContent = `UPC found: ${data.data.name}${sourceInfo}`;
-                    
-                    // Populate the form fields with the UPC data
-                    ammoUpcField.value = upc;
-                    ammoNameField.value = data.data.name;
-                    ammoCaliberField.value = data.data.caliber;
-                    ammoCountPerBoxField.value = data.data.count_per_box;
-                    ammoQuantityField.value = 1; // Default to 1 box
-                    
-                    // If from API, add a note
-                    if (data.source === "api") {
-                        ammoNotesField.value = 'Data from UPC Item DB API - verify details';
-                    } else {
-                        ammoNotesField.value = ''; // Clear any previous notes
+                if (!data.success) {
+                    throw new Error(data.message);
+                }
+                batch.forEach((waiters, upc) => {
+                    const entry = data.results[upc] || { success: false, message: 'UPC not found' };
+                    // Found UPCs are kept for the session; misses may be added later
+                    if (entry.success) {
+                        lookupResults.set(upc, entry);
                     }
-                    
-                    // Show the scan results form
-                    scanResults.style.display = 'block';
-                    
-                    // Scroll to the form
-                    scanResults.scrollIntoView({ behavior: 'smooth', block: 'start' });
+                    waiters.forEach(waiter => waiter.resolve(entry));
+                });
+            })
+            .catch(error => {
+                batch.forEach(waiters => waiters.forEach(waiter => waiter.reject(error)));
+            });
+    }
+    
+    /**
+     * Add a scanned UPC to the batch list and resolve it in the background
+     * @param {string} upc - The UPC code that was scanned
+     */
+    function queueScan(upc) {
+        scanQueueCard.style.display = 'block';
+        
+        const row = document.createElement('button');
+        row.type = 'button';
+        row.className = 'list-group-item list-group-item-action bg-dark text-white d-flex justify-content-between align-items-center';
+        
+        const label = document.createElement('span');
+        label.textContent = upc;
+        const status = document.createElement('span');
+        status.className = 'badge bg-secondary';
+        status.textContent = 'Looking up...';
+        row.appendChild(label);
+        row.appendChild(status);
+        scanQueue.prepend(row);
+        
+        resolveUpc(upc)
+            .then(entry => {
+                if (entry.success) {
+                    label.textContent = `${entry.data.name} (${upc})`;
+                    status.className = 'badge bg-success';
+                    status.textContent = entry.data.caliber;
                 } else {
-                    scanMessage.textContent = `UPC not found: ${upc}`;
-                    showAlert('UPC not found in database. Enter details manually.', 'warning');
-                    
-                    // Show the form with empty fields for manual entry
-                    ammoUpcField.value = upc;
-                    ammoNameField.value = '';
-                    ammoCaliberField.value = '';
-                    ammoCountPerBoxField.value = '';
-                    ammoQuantityField.value = 1;
-                    ammoNotesField.value = '';
-                    
-                    scanResults.style.display = 'block';
+                    status.className = 'badge bg-warning text-dark';
+                    status.textContent = 'Not found';
                 }
+                row.addEventListener('click', () => showLookupResult(upc, entry));
             })
+            .catch(error => {
+                console.error('Error looking up UPC:', error);
+                status.className = 'badge bg-danger';
+                status.textContent = 'Error';
+                row.addEventListener('click', () => lookupUpc(upc));
+            });
+    }
+    
+    /**
+     * Look up UPC code from server
+     * @param {string} upc - The UPC code to look up
+     */
+    function lookupUpc(upc) {
+        scanMessage.textContent = `Looking up UPC: ${upc}...`;
+        
+        const lookup = resolveUpc(upc);
+        // Someone is waiting on this one, so don't hold it for the batch window
+        flushLookups();
+        
+        lookup
+            .then(data => showLookupResult(upc, data))
             .catch(error => {
                 console.error('Error looking up UPC:', error);
                 scanMessage.textContent = 'Error looking up UPC';
@@ -301,6 +397,60 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    /**
+     * Fill the add form from a lookup entry
+     * @param {string} upc - The UPC code that was looked up
+     * @param {Object} data - The lookup entry returned by the server
+     */
+    function showLookupResult(upc, data) {
+        if (data.success) {
+            // Check the source of the data (database or API)
+            let sourceInfo = "";
+            if (data.source === "api") {
+                sourceInfo = " (from UPC Item DB API)";
+                // For API results, allow user to edit fields as they might need refinement
+                ammoNameField.classList.add("border-info");
+                ammoCaliberField.classList.add("border-info");
+                ammoCountPerBoxField.classList.add("border-info");
+            }
+            
+            scanMessage.textContent = `UPC found: ${data.data.name}${sourceInfo}`;
+            
+            // Populate the form fields with the UPC data
+            ammoUpcField.value = upc;
+            ammoNameField.value = data.data.name;
+            ammoCaliberField.value = data.data.caliber;
+            ammoCountPerBoxField.value = data.data.count_per_box;
+            ammoQuantityField.value = 1; // Default to 1 box
+            
+            // If from API, add a note
+            if (data.source === "api") {
+                ammoNotesField.value = 'Data from UPC Item DB API - verify details';
+            } else {
+                ammoNotesField.value = ''; // Clear any previous notes
+            }
+            
+            // Show the scan results form
+            scanResults.style.display = 'block';
+            
+            // Scroll to the form
+            scanResults.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        } else {
+            scanMessage.textContent = `UPC not found: ${upc}`;
+            showAlert('UPC not found in database. Enter details manually.', 'warning');
+            
+            // Show the form with empty fields for manual entry
+            ammoUpcField.value = upc;
+            ammoNameField.value = '';
+            ammoCaliberField.value = '';
+            ammoCountPerBoxField.value = '';
+            ammoQuantityField.value = 1;
+            ammoNotesField.value = '';
+            
+            scanResults.style.display = 'block';
+        }
+    }
+    
     /**
      * Add ammunition to inventory
      * @param {Object} data - The ammunition data to add
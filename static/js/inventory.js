@@ -41,15 +41,47 @@ document.addEventListener('DOMContentLoaded', function() {
         deleteModal = new bootstrap.Modal(deleteConfirmModal);
     }
     
+    // Inventory rows are paged in lazily from the JSON API
+    const inventoryLoader = document.getElementById('inventoryLoader');
+    const loadMoreInventory = document.getElementById('loadMoreInventory');
+    const inventoryEmptyRow = document.getElementById('inventoryEmptyRow');
+    const INVENTORY_PAGE_SIZE = 100;
+    let inventoryCursor = null;
+    let inventoryLoading = false;
+    let inventoryExhausted = false;
+    let inventoryRequestId = 0;
+    let searchTimer = null;
+    
     // Attach event listeners for search and filter
     if (inventorySearch) {
-        inventorySearch.addEventListener('input', filterInventory);
+        inventorySearch.addEventListener('input', function() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(filterInventory, 300);
+        });
     }
     
     if (caliberFilter) {
         caliberFilter.addEventListener('change', filterInventory);
     }
     
+    if (loadMoreInventory) {
+        loadMoreInventory.addEventListener('click', loadInventoryPage);
+    }
+    
+    if (inventoryTable) {
+        // Fetch the next page as the loader scrolls into view
+        if (inventoryLoader && 'IntersectionObserver' in window) {
+            const observer = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadInventoryPage();
+                }
+            });
+            observer.observe(inventoryLoader);
+        }
+        
+        loadInventoryPage();
+    }
+    
     // Attach click handlers for edit and delete buttons
     if (inventoryTable) {
         inventoryTable.addEventListener('click', function(e) {
@@ -142,36 +174,125 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     /**
-     * Filter inventory table based on search and filter inputs
+     * Reload the inventory table using the current search and filter inputs
      */
     function filterInventory() {
-        const searchTerm = inventorySearch.value.toLowerCase();
-        const caliber = caliberFilter.value;
+        const tbody = inventoryTable.querySelector('tbody');
+        tbody.querySelectorAll('tr[data-id]').forEach(row => row.remove());
         
-        const rows = inventoryTable.querySelectorAll('tbody tr');
+        inventoryCursor = null;
+        inventoryExhausted = false;
+        inventoryLoading = false;
+        inventoryRequestId++;
         
-        rows.forEach(row => {
-            // Skip header row
-            if (!row.dataset.id) return;
-            
-            const rowCaliber = row.dataset.caliber;
-            const cells = row.querySelectorAll('td');
-            const textContent = Array.from(cells).slice(0, 6).map(cell => cell.textContent.toLowerCase()).join(' ');
-            
-            let showRow = true;
-            
-            // Apply search filter
-            if (searchTerm && !textContent.includes(searchTerm)) {
-                showRow = false;
-            }
-            
-            // Apply caliber filter
-            if (caliber && rowCaliber !== caliber) {
-                showRow = false;
-            }
-            
-            row.style.display = showRow ? '' : 'none';
+        loadInventoryPage();
+    }
+    
+    /**
+     * Turn the search box text into /api/inventory filters: a UPC when it is
+     * all digits, the matching calibers when it names one, otherwise a name prefix
+     */
+    function addSearchParams(params, term) {
+        if (/^\d{6,14}$/.test(term)) {
+            params.set('upc', term);
+            return;
+        }
+        
+        const needle = term.toLowerCase();
+        const calibers = caliberFilter && !caliberFilter.value
+            ? Array.from(caliberFilter.options)
+                .map(option => option.value)
+                .filter(caliber => caliber && caliber.toLowerCase().includes(needle))
+            : [];
+        if (calibers.length > 0) {
+            calibers.forEach(caliber => params.append('caliber', caliber));
+        } else {
+            params.set('name_prefix', term);
+        }
+    }
+    
+    /**
+     * Fetch the next page of inventory rows from /api/inventory
+     */
+    function loadInventoryPage() {
+        if (inventoryLoading || inventoryExhausted) return;
+        inventoryLoading = true;
+        
+        const requestId = inventoryRequestId;
+        const params = new URLSearchParams({ limit: INVENTORY_PAGE_SIZE });
+        
+        if (inventoryCursor) {
+            params.set('cursor', inventoryCursor);
+        }
+        if (caliberFilter && caliberFilter.value) {
+            params.set('caliber', caliberFilter.value);
+        }
+        if (inventorySearch && inventorySearch.value.trim()) {
+            addSearchParams(params, inventorySearch.value.trim());
+        }
+        
+        // Revalidate against the browser cache: unchanged pages come back as 304s
+        fetch(`/api/inventory?${params.toString()}`, { cache: 'no-cache' })
+            .then(response => response.json())
+            .then(result => {
+                // Ignore pages for a search that has since changed
+                if (requestId !== inventoryRequestId) return;
+                
+                if (!result.success) {
+                    showAlert('Error loading inventory: ' + result.message, 'danger');
+                    return;
+                }
+                
+                const tbody = inventoryTable.querySelector('tbody');
+                result.items.forEach(item => {
+                    tbody.insertBefore(buildInventoryRow(item), inventoryEmptyRow);
+                });
+                
+                inventoryCursor = result.next_cursor;
+                inventoryExhausted = !result.next_cursor;
+                
+                const hasRows = tbody.querySelector('tr[data-id]') !== null;
+                inventoryEmptyRow.classList.toggle('d-none', hasRows);
+                inventoryLoader.classList.toggle('d-none', inventoryExhausted);
+            })
+            .catch(error => {
+                console.error('Error loading inventory:', error);
+                showAlert('Error loading inventory: ' + error.message, 'danger');
+            })
+            .finally(() => {
+                if (requestId === inventoryRequestId) {
+                    inventoryLoading = false;
+                }
+            });
+    }
+    
+    /**
+     * Build a table row for an inventory item
+     * @param {Object} item - Inventory item returned by the API
+     * @returns {HTMLElement} The table row element
+     */
+    function buildInventoryRow(item) {
+        const row = document.createElement('tr');
+        row.dataset.id = item.id;
+        row.dataset.caliber = item.caliber;
+        
+        [item.name, item.caliber, item.count_per_box, item.quantity, item.total_rounds, item.notes || ''].forEach(value => {
+            const cell = document.createElement('td');
+            cell.textContent = value;
+            row.appendChild(cell);
         });
+        
+        const actions = document.createElement('td');
+        actions.innerHTML = `
+            <button class="btn btn-sm btn-secondary edit-item" data-item-id="${item.id}">
+                <i class="fas fa-edit"></i>
+            </button>
+            <button class="btn btn-sm btn-danger delete-item" data-item-id="${item.id}">
+                <i class="fas fa-trash"></i>
+            </button>`;
+        row.appendChild(actions);
+        
+        return row;
     }
     
     /**
@@ -348,7 +469,7 @@ document.addEventListener('DOMContentLoaded', function() {
      * @param {string} caliber - The caliber to load thresholds for
      */
     function loadThresholdsForCaliber(caliber) {
-        fetch(`/api/get_thresholds/${encodeURIComponent(caliber)}`)
+        fetch(`/api/get_thresholds/${encodeURIComponent(caliber)}`, { cache: 'no-cache' })
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
@@ -444,6 +565,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const file = csvFile.files[0];
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('mode', document.getElementById('csvImportMode').value);
         
         fetch('/api/import_csv', {
             method: 'POST',
@@ -40,6 +40,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const scrapeNoResults = document.getElementById('scrapeNoResults');
     const scrapeError = document.getElementById('scrapeError');
     
+    // How often to check on a background scrape
+    const SCRAPE_POLL_INTERVAL_MS = 1000;
+    
     // Modal instances
     let addModal = document.getElementById('addUpcModal') ? new bootstrap.Modal(document.getElementById('addUpcModal')) : null;
     let editModal = document.getElementById('editUpcModal') ? new bootstrap.Modal(document.getElementById('editUpcModal')) : null;
@@ -357,6 +360,13 @@ document.addEventListener('DOMContentLoaded', function() {
         })
             .then(response => response.json())
             .then(result => {
+                if (result.success && result.job_id) {
+                    // Scraping runs in the background; poll until it finishes
+                    showScrapeJob(result.job);
+                    pollScrapeJob(result.job_id, query);
+                    return;
+                }
+                
                 // Hide loading indicator
                 scrapeLoading.style.display = 'none';
                 
@@ -391,6 +401,70 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    /**
+     * Poll a background scrape job until it is done, showing results as they arrive
+     * @param {string} jobId - ID returned by /api/scrape_ammo
+     * @param {string} query - The search this job belongs to
+     */
+    function pollScrapeJob(jobId, query) {
+        setTimeout(() => {
+            // Stop if a newer search has replaced this one
+            if (scrapeQuery.value.trim() !== query) {
+                return;
+            }
+            
+            fetch(`/api/scrape_jobs/${jobId}`)
+                .then(response => response.json())
+                .then(result => {
+                    if (!result.success) {
+                        throw new Error(result.message);
+                    }
+                    
+                    showScrapeJob(result.job);
+                    if (result.job.status === 'queued' || result.job.status === 'running') {
+                        pollScrapeJob(jobId, query);
+                    }
+                })
+                .catch(error => {
+                    console.error('Error checking scrape job:', error);
+                    scrapeLoading.style.display = 'none';
+                    scrapeError.textContent = 'Error: ' + error.message;
+                    scrapeError.style.display = 'block';
+                });
+        }, SCRAPE_POLL_INTERVAL_MS);
+    }
+    
+    /**
+     * Show the progress and results of a scrape job
+     * @param {Object} job - Job status returned by the server
+     */
+    function showScrapeJob(job) {
+        const finished = job.status === 'done' || job.status === 'failed';
+        
+        if (job.results && job.results.length > 0) {
+            scrapeResults.style.display = 'block';
+            renderProductResults(job.results);
+        }
+        
+        if (!finished) {
+            const progress = job.total ? ` (${job.completed} of ${job.total} products checked)` : '';
+            scrapeLoading.style.display = 'block';
+            const status = scrapeLoading.querySelector('.scrape-progress');
+            if (status) {
+                status.textContent = `Searching${progress}...`;
+            }
+            return;
+        }
+        
+        scrapeLoading.style.display = 'none';
+        if (job.status === 'failed') {
+            scrapeError.textContent = job.message || 'An error occurred while scraping ammo data';
+            scrapeError.style.display = 'block';
+        } else if (!job.results || job.results.length === 0) {
+            scrapeNoResults.style.display = 'block';
+        }
+    }
+    
     /**
      * Render product results from scraper
      * @param {Array} products - Array of product objects
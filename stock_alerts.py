@@ -0,0 +1,355 @@
+import logging
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, select, insert, update, delete, case, union, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, CaliberRollup, CaliberThreshold, StockStatus, StockAlertEvent
+from caliber_thresholds import default_thresholds
+
+# Materialized low-stock status, maintained incrementally.
+#
+# Inventory is shared: boxes without an owner (user_id NULL, which is what
+# every add and import path writes) count for everyone, and a user also sees
+# any boxes they own. Thresholds are per user. stock_status therefore holds:
+#   (NULL, caliber)  the shared total against the built-in thresholds
+#   (user, caliber)  shared plus owned total against the user's thresholds,
+#                    only for users who saved thresholds for the caliber or
+#                    own boxes of it
+# A user's view is their own rows plus the shared rows for every other
+# caliber, which is exactly what the inventory page shows them.
+#
+# apply_rollup_delta() calls refresh_stock_status() on the same connection
+# whenever a round total changes, and saving thresholds re-evaluates the
+# saved calibers from an after_flush hook, so stock_status commits or rolls
+# back with the change that caused it. Only the affected caliber is
+# re-evaluated. When a level changes (ok, low, critical) an event is written
+# to stock_alert_events, a local outbox that a notifier can drain with
+# pending_alert_events() / mark_events_delivered().
+#
+# Rows are written with INSERT ... ON CONFLICT DO UPDATE against the
+# (COALESCE(user_id, 0), caliber) unique index, like caliber_rollups, so two
+# transactions refreshing the same pair cannot both insert it.
+
+status_table = StockStatus.__table__
+event_table = StockAlertEvent.__table__
+rollup_table = CaliberRollup.__table__
+threshold_table = CaliberThreshold.__table__
+
+STOCK_LEVELS = ('ok', 'low', 'critical')
+
+# Statuses listed on the restock view
+RESTOCK_LEVELS = ('low', 'critical')
+
+
+def status_for(total_rounds, critical, low):
+    """Stock level for a round total (same comparisons as the inventory page)"""
+    if total_rounds <= critical:
+        return 'critical'
+    if total_rounds <= low:
+        return 'low'
+    return 'ok'
+
+
+def _pair_filter(table, user_id, caliber):
+    user_filter = table.c.user_id.is_(None) if user_id is None else table.c.user_id == user_id
+    return (user_filter, table.c.caliber == caliber)
+
+
+def _visible_total(connection, user_id, caliber):
+    """
+    Rounds of a caliber a user sees: shared boxes plus their own.
+
+    Returns:
+        Tuple of (total or None if nobody has the caliber, whether the user owns any of it)
+    """
+    owners = rollup_table.c.user_id.is_(None)
+    if user_id is not None:
+        owners = owners | (rollup_table.c.user_id == user_id)
+    total, owned = connection.execute(
+        select(func.sum(rollup_table.c.total_rounds), func.count(rollup_table.c.user_id))
+        .where(owners, rollup_table.c.caliber == caliber)
+    ).one()
+    return total, bool(owned)
+
+
+def _saved_thresholds(connection, user_id, caliber):
+    """(critical, low) a user saved for a caliber, or None"""
+    if user_id is None:
+        return None
+    row = connection.execute(
+        select(threshold_table.c.critical_threshold, threshold_table.c.low_threshold)
+        .where(*_pair_filter(threshold_table, user_id, caliber))
+    ).first()
+    return tuple(row) if row is not None else None
+
+
+def _tracking_users(connection, caliber):
+    """Users with their own status row for a caliber: saved thresholds or owned boxes"""
+    saved = select(threshold_table.c.user_id).where(
+        threshold_table.c.caliber == caliber, threshold_table.c.user_id.is_not(None))
+    owned = select(rollup_table.c.user_id).where(
+        rollup_table.c.caliber == caliber, rollup_table.c.user_id.is_not(None))
+    return sorted(connection.execute(union(saved, owned)).scalars())
+
+
+def _refresh_pair(connection, user_id, caliber, thresholds=None):
+    key_filter = _pair_filter(status_table, user_id, caliber)
+
+    total, owned = _visible_total(connection, user_id, caliber)
+    thresholds = thresholds or _saved_thresholds(connection, user_id, caliber)
+    if total is None or (user_id is not None and thresholds is None and not owned):
+        # Nothing to track, or the user simply sees the shared row
+        connection.execute(delete(status_table).where(*key_filter))
+        return None
+
+    if thresholds is None:
+        defaults = default_thresholds(caliber)
+        thresholds = (defaults['critical'], defaults['low'])
+    critical, low = thresholds
+    status = status_for(total, critical, low)
+    now = datetime.utcnow()
+
+    previous = connection.execute(select(status_table.c.status).where(*key_filter)).scalar()
+    values = {
+        'status': status,
+        'total_rounds': total,
+        'critical_threshold': critical,
+        'low_threshold': low,
+        'updated_at': now
+    }
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (pg_insert if dialect == 'postgresql' else sqlite_insert)(status_table).values(
+            user_id=user_id, caliber=caliber, changed_at=now, **values)
+        # changed_at compares against the stored row, which may be newer than previous
+        changed_at = case((status_table.c.status != stmt.excluded.status, stmt.excluded.changed_at),
+                          else_=status_table.c.changed_at)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[func.coalesce(status_table.c.user_id, literal_column('0')), status_table.c.caliber],
+            set_=dict(values, changed_at=changed_at)
+        ))
+    elif previous is None:
+        connection.execute(insert(status_table).values(user_id=user_id, caliber=caliber, changed_at=now, **values))
+    else:
+        if status != previous:
+            values['changed_at'] = now
+        connection.execute(update(status_table).where(*key_filter).values(**values))
+
+    # A newly tracked caliber only raises an alert if it starts below ok
+    if status != (previous or 'ok'):
+        connection.execute(insert(event_table).values(
+            user_id=user_id,
+            caliber=caliber,
+            previous_status=previous,
+            status=status,
+            total_rounds=total,
+            created_at=now
+        ))
+        logging.info(f"Stock level of {caliber} for user {user_id}: {previous or 'new'} -> {status} ({total} rounds)")
+
+    return status
+
+
+def refresh_stock_status(connection, user_id, caliber, thresholds=None):
+    """
+    Re-evaluate the stock level of a caliber after its total or thresholds changed.
+
+    A change to shared boxes (user_id None) re-evaluates the shared row and
+    the row of every user who tracks the caliber separately.
+
+    Args:
+        connection: Connection to execute on (keeps the caller's transaction)
+        user_id: Owner of the boxes that changed, or whose thresholds were saved
+        caliber: Caliber name
+        thresholds: (critical, low) to use instead of reading them, e.g. while saving them
+
+    Returns:
+        The new status of the pair, or None if it is not tracked separately
+    """
+    if user_id is not None:
+        return _refresh_pair(connection, user_id, caliber, thresholds)
+
+    status = _refresh_pair(connection, None, caliber)
+    for tracking_user_id in _tracking_users(connection, caliber):
+        _refresh_pair(connection, tracking_user_id, caliber)
+    return status
+
+
+@event.listens_for(db.session, 'after_flush')
+def _refresh_after_threshold_flush(session, flush_context):
+    """Re-evaluate the status of every caliber whose thresholds this flush saved"""
+    saved = [obj for obj in list(session.new) + list(session.dirty)
+             if isinstance(obj, CaliberThreshold) and obj.user_id is not None
+             and session.is_modified(obj, include_collections=False)]
+    if not saved:
+        return
+
+    connection = session.connection()
+    for row in saved:
+        refresh_stock_status(connection, row.user_id, row.caliber, (row.critical_threshold, row.low_threshold))
+
+
+def compute_stock_status(connection):
+    """
+    Evaluate every tracked pair from scratch.
+
+    Returns:
+        Dictionary mapping (user_id, caliber) to (status, total_rounds, critical, low)
+    """
+    shared = {}
+    owned = {}
+    for user_id, caliber, total in connection.execute(
+            select(rollup_table.c.user_id, rollup_table.c.caliber, rollup_table.c.total_rounds)):
+        if user_id is None:
+            shared[caliber] = shared.get(caliber, 0) + total
+        else:
+            owned[(user_id, caliber)] = total
+
+    saved = {
+        (user_id, caliber): (critical, low)
+        for user_id, caliber, critical, low in connection.execute(
+            select(threshold_table.c.user_id, threshold_table.c.caliber,
+                   threshold_table.c.critical_threshold, threshold_table.c.low_threshold)
+            .where(threshold_table.c.user_id.is_not(None))
+        )
+    }
+
+    pairs = {(None, caliber): total for caliber, total in shared.items()}
+    for user_id, caliber in set(saved) | set(owned):
+        if caliber in shared or (user_id, caliber) in owned:
+            pairs[(user_id, caliber)] = shared.get(caliber, 0) + owned.get((user_id, caliber), 0)
+
+    results = {}
+    for (user_id, caliber), total in pairs.items():
+        if (user_id, caliber) in saved:
+            critical, low = saved[(user_id, caliber)]
+        else:
+            defaults = default_thresholds(caliber)
+            critical, low = defaults['critical'], defaults['low']
+        results[(user_id, caliber)] = (status_for(total, critical, low), total, critical, low)
+    return results
+
+
+def write_stock_status(connection):
+    """
+    Replace every stock_status row with a fresh evaluation. No events are
+    emitted; the caller is responsible for committing.
+
+    Returns:
+        Number of status rows written
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'caliber': caliber,
+            'status': status,
+            'total_rounds': total,
+            'critical_threshold': critical,
+            'low_threshold': low,
+            'changed_at': now,
+            'updated_at': now
+        }
+        for (user_id, caliber), (status, total, critical, low) in compute_stock_status(connection).items()
+    ]
+
+    connection.execute(delete(status_table))
+    if rows:
+        connection.execute(insert(status_table), rows)
+    return len(rows)
+
+
+def rebuild_stock_status():
+    """
+    Recompute stock_status for every tracked pair.
+
+    Used to backfill the table; no events are emitted.
+
+    Returns:
+        Number of status rows written
+    """
+    try:
+        count = write_stock_status(db.session.connection())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logging.info(f"Rebuilt stock status: {count} rows")
+    return count
+
+
+def list_low_stock(user_id=None, levels=RESTOCK_LEVELS):
+    """
+    List calibers below their low threshold, most urgent first.
+
+    Reads only stock_status.
+
+    Args:
+        user_id: List what this user sees (their own rows, else the shared
+            row of each caliber); None lists every row
+        levels: Statuses to include
+
+    Returns:
+        List of StockStatus rows
+    """
+    query = StockStatus.query.filter(StockStatus.status.in_(levels))
+    if user_id is not None:
+        own_calibers = select(StockStatus.caliber).where(StockStatus.user_id == user_id)
+        query = query.filter(
+            (StockStatus.user_id == user_id)
+            | (StockStatus.user_id.is_(None) & StockStatus.caliber.not_in(own_calibers))
+        )
+
+    urgency = case((StockStatus.status == 'critical', 0), else_=1)
+    return query.order_by(urgency, StockStatus.total_rounds, StockStatus.caliber).all()
+
+
+def pending_alert_events(limit=100):
+    """Oldest undelivered outbox events"""
+    return StockAlertEvent.query.filter(
+        StockAlertEvent.delivered_at.is_(None)
+    ).order_by(StockAlertEvent.id).limit(limit).all()
+
+
+def mark_events_delivered(event_ids):
+    """
+    Mark outbox events as handled. The caller is responsible for committing.
+
+    Returns:
+        Number of events marked
+    """
+    if not event_ids:
+        return 0
+    result = db.session.execute(
+        update(event_table)
+        .where(event_table.c.id.in_(list(event_ids)), event_table.c.delivered_at.is_(None))
+        .values(delivered_at=datetime.utcnow())
+    )
+    return result.rowcount
+
+
+@click.command('stock-alerts')
+@click.option('--rebuild', is_flag=True, help='Recompute stock_status from caliber_rollups first.')
+@click.option('--deliver', is_flag=True, help='Print pending alert events and mark them delivered.')
+@with_appcontext
+def stock_alerts_command(rebuild, deliver):
+    """List low and critical calibers across all users."""
+    if rebuild:
+        click.echo(f"Stock status rebuilt ({rebuild_stock_status()} rows)")
+
+    for row in list_low_stock():
+        click.echo(f"{row.status.upper():<8} user={row.user_id or 'shared'} {row.caliber}: {row.total_rounds} rounds "
+                   f"(low {row.low_threshold}, critical {row.critical_threshold})")
+
+    if deliver:
+        events = pending_alert_events(limit=None)
+        for event in events:
+            click.echo(f"{event.created_at:%Y-%m-%d %H:%M} user={event.user_id or 'shared'} {event.caliber}: "
+                       f"{event.previous_status or 'new'} -> {event.status} ({event.total_rounds} rounds)")
+        mark_events_delivered([event.id for event in events])
+        db.session.commit()
+        click.echo(f"{len(events)} events delivered")
@@ -0,0 +1,21 @@
+import json
+from ammo_classifier import classify, classify_many, evaluate, CORPUS_PATH
+
+
+def test_labeled_corpus_is_classified_correctly():
+    total, mismatches = evaluate()
+    assert total > 0
+    assert mismatches == []
+
+
+def test_keyword_without_caliber_is_ammunition():
+    assert classify('Bulk range ammo, 500 rounds') == {'caliber': None, 'count_per_box': 500, 'is_ammo': True}
+    assert classify('Gun cleaning kit')['is_ammo'] is False
+
+
+def test_classify_many_matches_classify_on_the_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        titles = [entry['title'] for entry in json.load(f)]
+
+    assert classify_many(titles) == [classify(title) for title in titles]
+    assert classify_many([]) == []
@@ -0,0 +1,39 @@
+import csv
+from models import db, AmmoBox
+from bulk_import import parse_chunk, read_header, import_inventory_file
+
+HEADER = b"name,upc,caliber,count_per_box,quantity,notes\n"
+
+# Latin-1 "Señor" on line 3: not UTF-8
+DATA = (HEADER
+        + b"Federal 9mm,029465064389,9mm Luger,50,2,\n"
+        + b"Se\xf1or .45,029465088414,.45 ACP,50,1,\n"
+        + b"\"Multi\nline\",,.22 LR,500,1,\n"
+        + b"CCI Blazer,076683000000,.22 LR,50,x,\n")
+
+
+def test_invalid_utf8_rows_are_reported_by_line(tmp_path):
+    path = tmp_path / 'inventory.csv'
+    path.write_bytes(DATA)
+    offset, line = read_header(path)
+
+    valid, errors, rows = parse_chunk(path, offset, len(DATA), line, False)
+
+    assert rows == 4
+    assert [row[:2] for row in valid] == [(2, 'Federal 9mm'), (4, 'Multi\nline')]
+    assert [error_line for error_line, _ in errors] == [3, 6]
+    assert errors[0][1] == "Row is not valid UTF-8"
+
+
+def test_cli_import_skips_badly_encoded_rows(app, tmp_path):
+    path = tmp_path / 'inventory.csv'
+    path.write_bytes(DATA)
+    errors_path = tmp_path / 'errors.csv'
+
+    checkpoint = import_inventory_file(str(path), workers=1, errors_path=str(errors_path))
+
+    assert (checkpoint.rows, checkpoint.inserted, checkpoint.error_count) == (4, 2, 2)
+    assert sorted(box.name for box in AmmoBox.query.all()) == ['Federal 9mm', 'Multi\nline']
+    assert not any('\ufffd' in box.name for box in db.session.query(AmmoBox).all())
+    with open(errors_path, newline='', encoding='utf-8') as f:
+        assert [row[0] for row in csv.reader(f)] == ['3', '6']
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, AmmoBox, CaliberRollup
+from caliber_rollups import apply_rollup_delta, rebuild_caliber_rollups
+
+
+def test_deltas_for_shared_boxes_collect_in_one_row(app):
+    for _ in range(3):
+        connection = db.session.connection()
+        apply_rollup_delta(connection, None, '9mm Luger', rounds=50, boxes=1, items=1)
+        db.session.commit()
+
+    rows = CaliberRollup.query.filter_by(caliber='9mm Luger').all()
+    assert [(row.user_id, row.total_rounds, row.box_count, row.item_count) for row in rows] == [(None, 150, 3, 3)]
+
+
+def test_rollup_key_treats_missing_owner_as_one_value(app):
+    row = {'user_id': None, 'caliber': '.45 ACP', 'total_rounds': 50, 'box_count': 1, 'item_count': 1}
+    db.session.execute(insert(CaliberRollup.__table__).values(**row))
+    with pytest.raises(IntegrityError):
+        db.session.execute(insert(CaliberRollup.__table__).values(**row))
+    db.session.rollback()
+
+
+def test_box_changes_keep_rollup_in_sync(app, user):
+    db.session.add(AmmoBox(name='Shared', upc='1', caliber='9mm Luger', count_per_box=50, quantity=2))
+    db.session.add(AmmoBox(name='Owned', upc='2', caliber='9mm Luger', count_per_box=50, quantity=1, user_id=user.id))
+    db.session.commit()
+
+    box = AmmoBox.query.filter_by(name='Shared').one()
+    box.quantity = 1
+    box.update_total_rounds()
+    db.session.commit()
+
+    assert rebuild_caliber_rollups(check_only=True) == []
+
+
+def test_rekey_keeps_a_table_created_with_the_new_key(app):
+    from migrate_db import rekey_caliber_rollups
+
+    # No box backs this row, so a rebuild from ammo_boxes would drop it
+    db.session.execute(insert(CaliberRollup.__table__).values(
+        user_id=None, caliber='.45 ACP', total_rounds=50, box_count=1, item_count=1))
+    db.session.commit()
+
+    with db.engine.begin() as connection:
+        rekey_caliber_rollups(connection)
+
+    assert CaliberRollup.query.filter_by(caliber='.45 ACP').count() == 1
@@ -0,0 +1,44 @@
+import io
+from models import db, AmmoBox
+from csv_import import import_inventory_csv, _copy_rows
+
+HEADER = b"name,upc,caliber,count_per_box,quantity,notes\n"
+
+
+def test_append_accepts_rows_without_upc(app):
+    data = HEADER + b"Bulk 9mm,,9mm Luger,50,2,\nBoxed .45,029465088414,.45 ACP,50,1,range\n"
+
+    result = import_inventory_csv(io.BytesIO(data), mode='append')
+    db.session.commit()
+
+    assert result['inserted'] == 2 and result['errors'] == []
+    box = AmmoBox.query.filter_by(name='Bulk 9mm').one()
+    assert box.upc == '' and box.notes is None and box.total_rounds == 100
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.sql = self.data = None
+
+    def copy_expert(self, sql, buffer):
+        self.sql, self.data = sql, buffer.read()
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.cursor_ = RecordingCursor()
+        self.connection = self
+
+    def cursor(self):
+        return self.cursor_
+
+
+def test_copy_keeps_blank_upc_as_empty_string():
+    connection = RecordingConnection()
+    _copy_rows(connection, [(2, 'Bulk 9mm', '', '9mm Luger', 50, 2, None)])
+
+    assert 'FORCE_NOT_NULL (name, upc, caliber)' in connection.cursor_.sql
+    assert connection.cursor_.data == '2,Bulk 9mm,,9mm Luger,50,2,\n'
@@ -0,0 +1,38 @@
+import pytest
+from models import db, AmmoBox
+
+
+@pytest.fixture
+def boxes(app):
+    for name, upc, caliber in [('Federal American Eagle', '029465064389', '9mm Luger'),
+                               ('federal Champion', '029465088613', '.22 LR'),
+                               ('Winchester White Box', '020892212602', '9mm Luger'),
+                               ('Hornady Custom', '090255900903', '9mm Makarov')]:
+        db.session.add(AmmoBox(name=name, upc=upc, caliber=caliber, count_per_box=50, quantity=1))
+    db.session.commit()
+
+
+def search(client, **params):
+    response = client.get('/api/inventory', query_string=params)
+    result = response.get_json()
+    assert result['success'], result
+    return sorted(item['name'] for item in result['items'])
+
+
+def test_name_prefix_ignores_case(client, boxes):
+    assert search(client, name_prefix='federal') == ['Federal American Eagle', 'federal Champion']
+    assert search(client, name_prefix='WINCH') == ['Winchester White Box']
+    assert search(client, name_prefix='eagle') == []
+
+
+def test_name_prefix_escapes_wildcards(client, boxes):
+    assert search(client, name_prefix='%') == []
+    assert search(client, name_prefix='_ederal') == []
+
+
+def test_search_box_caliber_and_upc_filters(client, boxes):
+    # What inventory.js sends for "9mm" and "029465064389"
+    assert search(client, caliber=['9mm Luger', '9mm Makarov']) == [
+        'Federal American Eagle', 'Hornady Custom', 'Winchester White Box']
+    assert search(client, caliber='.22 LR') == ['federal Champion']
+    assert search(client, upc='029465064389') == ['Federal American Eagle']
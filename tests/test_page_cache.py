@@ -0,0 +1,50 @@
+from models import db, User, UpcData
+from page_cache import shared_version
+
+
+def versions(user):
+    """The user's data version and the shared inventory version, as committed"""
+    db.session.expire_all()
+    return db.session.get(User, user.id).data_version, shared_version()
+
+
+def test_reads_sent_as_post_do_not_bump(app, client, user):
+    db.session.add(UpcData(upc='012345678905', name='Test 9mm', caliber='9mm Luger', count_per_box=50))
+    db.session.commit()
+    before = versions(user)
+
+    response = client.post('/api/lookup_upcs', json={'upcs': ['012345678905']})
+    assert response.get_json()['success']
+    assert versions(user) == before
+
+    # Logging in only records last_login, which the user's own profile shows
+    response = app.test_client().post('/auth/login', data={'username': 'tester', 'password': 'secret'})
+    assert response.status_code == 302
+    assert versions(user) == (before[0] + 1, before[1])
+
+
+def test_inventory_writes_bump_the_shared_version(client, user):
+    before = versions(user)
+
+    response = client.post('/api/add_inventory', json={'name': 'Test box', 'upc': '012345678905',
+                                                       'caliber': '9mm Luger', 'count_per_box': 50,
+                                                       'quantity': 2})
+    assert response.get_json()['success']
+    assert versions(user) == (before[0] + 1, before[1] + 1)
+
+
+def test_failed_writes_do_not_bump(client, user):
+    before = versions(user)
+
+    response = client.post('/api/add_inventory', json={'name': 'Incomplete box'})
+    assert not response.get_json()['success']
+    assert versions(user) == before
+
+
+def test_threshold_writes_only_bump_the_user(client, user):
+    before = versions(user)
+
+    response = client.post('/api/save_thresholds',
+                           json={'caliber': '9mm Luger', 'critical': 5, 'low': 10, 'target': 500})
+    assert response.get_json()['success']
+    assert versions(user) == (before[0] + 1, before[1])
@@ -0,0 +1,30 @@
+from datetime import date
+from models import db, AmmoBox, RangeTrip, RangeTripItem
+from range_trip_inventory import checkout_boxes, checkin_items
+
+
+def test_repeated_checkin_returns_boxes_once(app, user):
+    box = AmmoBox(name='Range 9mm', upc='1', caliber='9mm Luger', count_per_box=50, quantity=5)
+    trip = RangeTrip(name='Trip', date=date(2024, 1, 1), user_id=user.id)
+    db.session.add_all([box, trip])
+    db.session.commit()
+
+    checked_out, failed = checkout_boxes(trip.id, {box.id: 3})
+    db.session.commit()
+    assert failed == []
+    item_id = RangeTripItem.query.filter_by(range_trip_id=trip.id).one().id
+
+    for _ in range(2):
+        updated, failed = checkin_items(trip.id, {item_id: 2})
+        db.session.commit()
+        assert updated == [item_id] and failed == []
+
+    db.session.expire_all()
+    assert db.session.get(AmmoBox, box.id).quantity == 4
+    assert db.session.get(RangeTripItem, item_id).rounds_used == 50
+
+    # Lowering the check-in takes the difference back out of inventory
+    checkin_items(trip.id, {item_id: 1})
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(AmmoBox, box.id).quantity == 3
@@ -0,0 +1,69 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy.exc import InvalidRequestError
+from models import db, RangeTrip, RangeTripItem
+from range_trip_stats import get_range_trip_stats
+
+
+def add_trips(user, count, calibers=('9mm Luger', '.223 Remington')):
+    """Add trips with one item per caliber, each shooting 10 rounds"""
+    for number in range(count):
+        trip = RangeTrip(name=f"Trip {number}", date=date(2024, 1, 1) + timedelta(days=number), user_id=user.id)
+        db.session.add(trip)
+        db.session.flush()
+        for caliber in calibers:
+            item = RangeTripItem(range_trip_id=trip.id, name=f"{caliber} box", caliber=caliber,
+                                 count_per_box=50, quantity_out=1)
+            item.rounds_used = 10
+            db.session.add(item)
+    db.session.commit()
+
+
+def test_query_count_does_not_grow_with_trips(user, count_queries):
+    add_trips(user, 1)
+    db.session.expire_all()
+    one_trip = count_queries(get_range_trip_stats, user.id)
+
+    add_trips(user, 25)
+    db.session.expire_all()
+    many_trips = count_queries(get_range_trip_stats, user.id)
+
+    assert many_trips == one_trip
+    assert get_range_trip_stats(user.id)['total_rounds_used'] == 26 * 2 * 10
+
+
+def test_stats_match_a_trip_by_trip_walk(user):
+    # Both calibers are used equally; the newest trip lists 9mm Luger first
+    add_trips(user, 1, calibers=('.45 ACP', '9mm Luger'))
+    add_trips(user, 1, calibers=('9mm Luger', '.45 ACP'))
+    db.session.query(RangeTrip).filter_by(name='Trip 0').order_by(RangeTrip.id.desc()).first().date = date(2024, 2, 1)
+    db.session.commit()
+
+    stats = get_range_trip_stats(user.id)
+
+    assert [trip.date for trip in stats['trips']] == sorted((trip.date for trip in stats['trips']), reverse=True)
+    assert list(stats['caliber_usage']) == ['9mm Luger', '.45 ACP']
+    assert stats['most_used_caliber'] == '9mm Luger'
+    assert stats['total_trips'] == 2
+
+
+def test_trip_list_page_query_count_does_not_grow_with_trips(client, user, count_queries):
+    add_trips(user, 1)
+    db.session.expire_all()
+    one_trip = count_queries(client.get, '/range-trips')
+
+    add_trips(user, 25)
+    db.session.expire_all()
+    many_trips = count_queries(client.get, '/range-trips')
+
+    assert many_trips == one_trip
+    assert b'Trip 24' in client.get('/range-trips').data
+
+
+def test_trip_list_refuses_lazy_loads(user):
+    add_trips(user, 1)
+    db.session.expire_all()
+    trip = get_range_trip_stats(user.id)['trips'][0]
+
+    with pytest.raises(InvalidRequestError):
+        trip.items
@@ -0,0 +1,43 @@
+import os
+import pytest
+import scraper
+from html_parsing import FIXTURE_DIR
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def palmetto(monkeypatch):
+    """Scraper that serves pages from the fixture directory instead of the network"""
+    monkeypatch.setattr(scraper, 'get_http_cache', lambda: None)
+    monkeypatch.setattr(scraper, 'extraction_stats', {'json-ld': 0, 'json-ld+dom': 0, 'dom': 0})
+    instance = scraper.PalmettoScraper(max_workers=1)
+    instance.fetch = lambda url, deadline=None: read_fixture(url)
+    return instance
+
+
+def test_complete_json_ld_takes_the_fast_path(palmetto):
+    details = palmetto.extract_product_details('product_hornady_critical_defense_9mm_jsonld.html')
+    assert details['extraction'] == 'json-ld'
+    assert scraper.extraction_stats == {'json-ld': 1, 'json-ld+dom': 0, 'dom': 0}
+
+
+def test_json_ld_that_adds_nothing_counts_as_dom(palmetto):
+    details = palmetto.extract_product_details('product_winchester_usa_45acp_230gr_jsonld_name_only.html')
+    plain = palmetto.extract_product_details('product_winchester_usa_45acp_230gr.html')
+
+    assert details['extraction'] == 'dom'
+    assert dict(details, url=None) == dict(plain, url=None)
+    assert scraper.extraction_stats == {'json-ld': 0, 'json-ld+dom': 0, 'dom': 2}
+
+
+def test_json_ld_filling_a_missing_field_is_counted():
+    instance = scraper.PalmettoScraper.__new__(scraper.PalmettoScraper)
+    details = instance.build_details('url', 'Winchester USA .45 ACP 230gr FMJ, Box of 50', '',
+                                     'Price not available', None)
+
+    assert instance.merge_structured_details(details, {'price': '$27.99'}) == 'json-ld+dom'
+    assert details['price'] == '$27.99'
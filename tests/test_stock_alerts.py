@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, AmmoBox, StockStatus, StockAlertEvent
+from stock_alerts import refresh_stock_status
+
+
+def low_stock(client):
+    response = client.get('/api/low_stock')
+    assert response.status_code == 200
+    return {row['caliber']: (row['status'], row['low_threshold'], row['critical_threshold'])
+            for row in response.get_json()['calibers']}
+
+
+def add_shared_box(caliber, count_per_box, quantity):
+    db.session.add(AmmoBox(name=f"{caliber} box", upc='', caliber=caliber,
+                           count_per_box=count_per_box, quantity=quantity))
+    db.session.commit()
+
+
+def test_low_stock_lists_shared_inventory(client):
+    add_shared_box('.223 Remington', 20, 1)   # 20 rounds, critical under the defaults
+    add_shared_box('9mm Luger', 50, 3)        # 150 rounds, low under the defaults
+
+    assert low_stock(client) == {
+        '.223 Remington': ('critical', 150, 60),
+        '9mm Luger': ('low', 200, 100),
+    }
+
+
+def test_saving_thresholds_changes_low_stock(client, user):
+    add_shared_box('9mm Luger', 50, 3)
+    assert low_stock(client)['9mm Luger'] == ('low', 200, 100)
+
+    response = client.post('/api/save_thresholds',
+                           json={'caliber': '9mm Luger', 'critical': 5, 'low': 10, 'target': 500})
+    assert response.get_json()['success']
+    assert '9mm Luger' not in low_stock(client)
+
+    status = StockStatus.query.filter_by(user_id=user.id, caliber='9mm Luger').one()
+    assert (status.status, status.low_threshold, status.critical_threshold) == ('ok', 10, 5)
+
+    # Shared inventory changes are evaluated against the user's thresholds too
+    box = AmmoBox.query.filter_by(caliber='9mm Luger').one()
+    box.quantity = 0
+    box.update_total_rounds()
+    db.session.commit()
+
+    assert low_stock(client)['9mm Luger'] == ('critical', 10, 5)
+    assert StockAlertEvent.query.filter_by(user_id=user.id, caliber='9mm Luger', status='critical').count() == 1
+
+
+def test_other_users_keep_the_shared_status(client, user):
+    add_shared_box('9mm Luger', 50, 3)
+    client.post('/api/save_thresholds', json={'caliber': '9mm Luger', 'critical': 5, 'low': 10, 'target': 500})
+
+    shared = StockStatus.query.filter_by(user_id=None, caliber='9mm Luger').one()
+    assert (shared.status, shared.low_threshold) == ('low', 200)
+
+
+def test_status_key_treats_shared_rows_as_one_value(app):
+    row = {'user_id': None, 'caliber': '.45 ACP', 'status': 'ok', 'total_rounds': 500,
+           'low_threshold': 200, 'critical_threshold': 100}
+    db.session.execute(insert(StockStatus.__table__).values(**row))
+    with pytest.raises(IntegrityError):
+        db.session.execute(insert(StockStatus.__table__).values(**row))
+    db.session.rollback()
+
+
+def test_refreshing_a_stored_pair_updates_it_in_place(app):
+    add_shared_box('9mm Luger', 50, 3)
+    changed_at = StockStatus.query.filter_by(user_id=None, caliber='9mm Luger').one().changed_at
+
+    # A refresh that finds the row already written (e.g. by a concurrent one) upserts it
+    refresh_stock_status(db.session.connection(), None, '9mm Luger')
+    refresh_stock_status(db.session.connection(), None, '9mm Luger')
+    db.session.commit()
+
+    rows = StockStatus.query.filter_by(caliber='9mm Luger').all()
+    assert [(row.user_id, row.status, row.total_rounds) for row in rows] == [(None, 'low', 150)]
+    assert rows[0].changed_at == changed_at
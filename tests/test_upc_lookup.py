@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+import pytest
+from sqlalchemy import insert
+import upc_lookup
+from models import db, User, UpcData, UpcApiResponse
+from upc_lookup import lookup_upc, lookup_upcs, catalog_changed
+
+UPC = '012345678905'
+
+
+def add_to_catalog_elsewhere(name):
+    """Write upc_data the way another worker would, without touching this process's cache"""
+    with db.engine.begin() as connection:
+        connection.execute(insert(UpcData.__table__).values(upc=UPC, name=name, caliber='9mm Luger', count_per_box=50))
+
+
+def test_catalog_change_in_another_worker_ends_negative_hit(app):
+    # A stored API miss answers the first lookup without any network call
+    db.session.add(UpcApiResponse(upc=UPC, status_code=404, found=False))
+    db.session.commit()
+    assert lookup_upc(UPC) is None
+
+    add_to_catalog_elsewhere('Added elsewhere')
+    db.session.expire_all()
+    assert lookup_upc(UPC) is None  # still the cached miss
+
+    catalog_changed()
+    db.session.expire_all()
+    assert lookup_upc(UPC)['name'] == 'Added elsewhere'
+    assert lookup_upcs([UPC])[UPC]['name'] == 'Added elsewhere'
+
+
+def test_storing_an_api_response_leaves_the_callers_session_alone(app, user, monkeypatch):
+    body = json.dumps({'items': [{'title': 'Federal 9mm 115gr FMJ 50 Rounds', 'brand': 'Federal'}]})
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', lambda upc: (200, body))
+
+    # A change the route has not flushed yet (SQLite would make the separate
+    # transaction wait for a flushed one)
+    with db.session.no_autoflush:
+        user.first_name = 'Pending'
+        assert lookup_upc(UPC)['caliber'] == '9mm Luger'
+    db.session.rollback()
+    assert db.session.get(User, user.id).first_name is None
+
+    # The response was committed on its own, and a later one replaces it
+    upc_lookup._store_api_response(UPC, 404, False, '{"items": []}')
+    db.session.expire_all()
+    stored = UpcApiResponse.query.filter_by(upc=UPC).all()
+    assert [(row.status_code, row.found) for row in stored] == [(404, False)]
+
+
+def lookup_from_threads(app, upc, count):
+    """Look up one UPC from count threads released at the same moment"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def worker(index):
+        with app.app_context():
+            barrier.wait()
+            try:
+                outcomes[index] = ('result', lookup_upc(upc))
+            except Exception as e:
+                outcomes[index] = ('error', e)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_misses_share_one_api_call(app, monkeypatch):
+    calls = []
+    body = json.dumps({'items': [{'title': 'Federal 9mm 115gr FMJ 50 Rounds', 'brand': 'Federal'}]})
+
+    def slow_fetch(upc):
+        calls.append(upc)
+        time.sleep(0.3)
+        return 200, body
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', slow_fetch)
+
+    coalesced = upc_lookup.upc_cache.counters['coalesced']
+    outcomes = lookup_from_threads(app, UPC, 8)
+
+    assert calls == [UPC]
+    assert [kind for kind, _ in outcomes] == ['result'] * 8
+    assert all(result == outcomes[0][1] for _, result in outcomes)
+    assert outcomes[0][1]['caliber'] == '9mm Luger'
+    assert upc_lookup.upc_cache.counters['coalesced'] - coalesced == 7
+
+
+def test_api_failure_reaches_every_waiter(app, monkeypatch):
+    calls = []
+
+    def failing_fetch(upc):
+        calls.append(upc)
+        time.sleep(0.3)
+        raise RuntimeError('upstream exploded')
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', failing_fetch)
+
+    outcomes = lookup_from_threads(app, UPC, 8)
+
+    assert calls == [UPC]
+    assert all(kind == 'error' and str(error) == 'upstream exploded' for kind, error in outcomes)
+
+    # Nothing was cached, so the next lookup tries again
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', lambda upc: (404, '{"items": []}'))
+    assert lookup_upc(UPC) is None
+
+
+def add_catalog_upcs(upcs):
+    for upc in upcs:
+        db.session.add(UpcData(upc=upc, name=f"Box {upc}", caliber='9mm Luger', count_per_box=50))
+    db.session.commit()
+
+
+def test_batch_answers_each_tier_and_only_sends_misses_to_the_pool(app, client, monkeypatch):
+    add_catalog_upcs(['100000000001', '100000000002'])
+    db.session.add(UpcApiResponse(upc='300000000003', status_code=404, found=False))
+    db.session.commit()
+
+    fetched = []
+    pooled = []
+    resolve_in_app_context = upc_lookup._resolve_in_app_context
+
+    def fetch(upc):
+        fetched.append(upc)
+        if upc == '500000000005':
+            return 200, json.dumps({'items': [{'title': 'Winchester .45 ACP 230gr 50 Rounds'}]})
+        return 404, '{"items": []}'
+
+    def record_pooled(app, upc):
+        pooled.append(upc)
+        return resolve_in_app_context(app, upc)
+
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', fetch)
+    monkeypatch.setattr(upc_lookup, '_resolve_in_app_context', record_pooled)
+
+    # Warm the in-process caches: one positive entry, one negative entry
+    assert lookup_upc('100000000002')['name'] == 'Box 100000000002'
+    assert lookup_upc('400000000004') is None
+    fetched.clear()
+
+    response = client.post('/api/lookup_upcs', json={'upcs': [
+        '100000000001',   # catalog
+        '100000000002',   # in-process hit
+        '300000000003',   # stored API miss
+        '400000000004',   # in-process negative hit
+        '500000000005',   # API hit
+        '600000000006',   # API miss
+        '100000000001',   # duplicate
+    ]})
+    results = response.get_json()['results']
+
+    assert results['100000000001'] == {'success': True, 'source': 'database', 'data': {
+        'upc': '100000000001', 'name': 'Box 100000000001', 'caliber': '9mm Luger', 'count_per_box': 50}}
+    assert results['100000000002']['data']['name'] == 'Box 100000000002'
+    assert results['500000000005']['source'] == 'api'
+    assert results['500000000005']['data']['caliber'] == '.45 ACP'
+    for upc in ('300000000003', '400000000004', '600000000006'):
+        assert results[upc]['success'] is False
+    assert len(results) == 6
+
+    assert sorted(pooled) == ['500000000005', '600000000006']
+    assert sorted(fetched) == ['500000000005', '600000000006']
+
+
+def test_batch_round_trips_do_not_grow_with_the_batch(app, count_queries, monkeypatch):
+    monkeypatch.setattr(upc_lookup, 'fetch_upc_from_api', lambda upc: pytest.fail(f"API called for {upc}"))
+
+    small = [f"7{index:011d}" for index in range(3)]
+    large = [f"8{index:011d}" for index in range(60)]
+    add_catalog_upcs(small + large)
+    for upc in ('900000000001', '900000000002'):
+        db.session.add(UpcApiResponse(upc=upc, status_code=404, found=False))
+    db.session.commit()
+
+    # Catalog version, catalog IN query, stored response IN query
+    assert count_queries(lookup_upcs, small + ['900000000001']) == 3
+    assert count_queries(lookup_upcs, large + ['900000000002']) == 3
+
+    # Answered from the in-process caches: only the catalog version is read
+    assert count_queries(lookup_upcs, large + ['900000000002']) == 1
@@ -0,0 +1,572 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import requests
+from flask import current_app
+from sqlalchemy import text, update, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, UpcData, UpcApiResponse, DataVersion
+from ammo_classifier import classify
+
+# UPC resolution with a two-tier cache in front of the database and the
+# UPC Item DB API:
+#   1. in-process LRU with TTL for known UPCs, plus a negative cache for UPCs
+#      the API does not know
+#   2. the upc_data catalog and the upc_api_responses table, which keeps the
+#      raw external API responses so other workers and restarts reuse them
+# The network is only reached on a true cold miss. Concurrent misses for the
+# same UPC are coalesced: threads in a worker share one resolution through
+# SingleFlight, and workers on Postgres serialize on an advisory lock so the
+# first one stores the API response and the rest read it back.
+#
+# In-process entries are keyed on the 'upc_catalog' counter in data_versions,
+# which catalog_changed() bumps after every committed upc_data write. Each
+# lookup reads the counter once (a primary key lookup, shared by every UPC in
+# a batch), so a UPC added or edited through any worker is seen by all the
+# others on their next lookup instead of after the cache TTL.
+
+UPC_API_URL = "https://api.upcitemdb.com/prod/trial/lookup"
+
+# Configuration keys read by init_upc_cache() and their defaults
+DEFAULT_CONFIG = {
+    'UPC_CACHE_SIZE': 2048,                    # Max UPCs held in the in-process cache
+    'UPC_CACHE_TTL': 600,                      # Seconds a found UPC stays cached in-process
+    'UPC_NEGATIVE_CACHE_SIZE': 2048,           # Max unknown UPCs held in-process
+    'UPC_NEGATIVE_CACHE_TTL': 3600,            # Seconds an unknown UPC stays cached in-process
+    'UPC_API_RESPONSE_TTL': 30 * 24 * 3600,    # Seconds a stored API hit is reused
+    'UPC_API_NEGATIVE_TTL': 24 * 3600,         # Seconds a stored API miss is reused
+    'UPC_API_TIMEOUT': 5,                      # Seconds before the external call gives up
+    'UPC_ADVISORY_LOCKS': True,                # Coordinate workers with pg advisory locks
+    'UPC_LOCK_TIMEOUT': 10,                    # Seconds to wait for another worker's lookup
+    'UPC_BATCH_WORKERS': 4,                    # Concurrent API calls per batch lookup
+}
+
+# Largest number of UPCs accepted by one batch lookup
+MAX_BATCH_UPCS = 100
+
+# First key of the two-key advisory lock space, reserved for UPC lookups
+UPC_ADVISORY_LOCK_NAMESPACE = 0x55504320
+
+# API status codes that mean the UPC is definitely unknown (safe to cache)
+NOT_FOUND_STATUS_CODES = (200, 400, 404)
+
+# data_versions scope bumped whenever the upc_data catalog changes
+CATALOG_SCOPE = 'upc_catalog'
+
+data_version_table = DataVersion.__table__
+api_response_table = UpcApiResponse.__table__
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) for a live entry, (False, None) otherwise"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its result"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Call fn() unless a call for key is already running, in which case wait for it.
+
+        Returns:
+            Tuple of (result, shared) where shared is True if another thread
+            produced the result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+
+class UpcLookupCache:
+    """In-process positive and negative UPC caches with hit/miss counters"""
+
+    COUNTERS = ('hits', 'negative_hits', 'db_hits', 'stored_hits', 'stored_negative_hits',
+                'api_calls', 'api_errors', 'misses', 'coalesced', 'lock_waits', 'lock_timeouts')
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG)
+        self.configure(config or {})
+        self._counter_lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def configure(self, config):
+        for key in DEFAULT_CONFIG:
+            if key in config:
+                self.config[key] = config[key]
+
+        self.positive = TTLCache(int(self.config['UPC_CACHE_SIZE']), float(self.config['UPC_CACHE_TTL']))
+        self.negative = TTLCache(int(self.config['UPC_NEGATIVE_CACHE_SIZE']),
+                                 float(self.config['UPC_NEGATIVE_CACHE_TTL']))
+
+    def count(self, counter):
+        with self._counter_lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self.counters)
+
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['size'] = len(self.positive)
+        stats['negative_size'] = len(self.negative)
+        stats['hit_ratio'] = round((stats['hits'] + stats['negative_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+upc_cache = UpcLookupCache()
+upc_flight = SingleFlight()
+
+
+def init_upc_cache(app):
+    """Configure the process-wide UPC cache from the Flask app config"""
+    upc_cache.configure(app.config)
+
+
+def catalog_version():
+    """Current value of the upc_catalog counter"""
+    row = db.session.get(DataVersion, CATALOG_SCOPE)
+    return row.version if row else 0
+
+
+def catalog_changed():
+    """
+    Make every worker stop using its cached lookups after a catalog write.
+
+    Runs in its own transaction; call it after the upc_data change has
+    committed so no worker can cache the old row under the new version.
+    """
+    with db.engine.begin() as connection:
+        result = connection.execute(
+            update(data_version_table).where(data_version_table.c.scope == CATALOG_SCOPE)
+            .values(version=data_version_table.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(data_version_table).values(scope=CATALOG_SCOPE, version=1))
+
+
+def parse_upc_api_response(upc, data):
+    """
+    Turn a UPC Item DB API response into ammunition data.
+
+    Args:
+        upc: The UPC that was looked up
+        data: Decoded JSON response body
+
+    Returns:
+        Dictionary with upc, name, caliber, count_per_box and source, or None
+        if the response has no items
+    """
+    if not data.get('items') or len(data['items']) == 0:
+        return None
+
+    item = data['items'][0]
+
+    # Extract ammunition-related information
+    title = item.get('title', 'Unknown Product')
+    brand = item.get('brand', '')
+
+    # Extract caliber and rounds per box from the title
+    classification = classify(title)
+    caliber = classification['caliber']
+    count_per_box = classification['count_per_box']
+
+    # Default values if we couldn't determine specifics
+    if not caliber:
+        caliber = "Unknown"
+    if not count_per_box:
+        count_per_box = 0
+
+    # Create a result using available information
+    product_name = f"{brand} {title}" if brand else title
+    return {
+        'upc': upc,
+        'name': product_name,
+        'caliber': caliber,
+        'count_per_box': count_per_box,
+        'source': 'api'  # Mark this as coming from the API
+    }
+
+
+def _stored_response_fresh(stored):
+    ttl_key = 'UPC_API_RESPONSE_TTL' if stored.found else 'UPC_API_NEGATIVE_TTL'
+    max_age = timedelta(seconds=float(upc_cache.config[ttl_key]))
+    return stored.fetched_at and datetime.utcnow() - stored.fetched_at <= max_age
+
+
+def _store_api_response(upc, status_code, found, body):
+    """
+    Persist a raw API response, replacing any older one for the UPC.
+
+    Runs in its own transaction, so the caller's session is neither
+    committed nor rolled back by caching a response.
+    """
+    values = {'status_code': status_code, 'found': found, 'body': body, 'fetched_at': datetime.utcnow()}
+    try:
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                stmt = (pg_insert if dialect == 'postgresql' else sqlite_insert)(api_response_table)
+                connection.execute(stmt.values(upc=upc, **values).on_conflict_do_update(
+                    index_elements=[api_response_table.c.upc], set_=values
+                ))
+            else:
+                result = connection.execute(
+                    update(api_response_table).where(api_response_table.c.upc == upc).values(**values)
+                )
+                if result.rowcount == 0:
+                    connection.execute(insert(api_response_table).values(upc=upc, **values))
+    except Exception as e:
+        logging.error(f"Error storing UPC API response for {upc}: {str(e)}")
+
+
+def fetch_upc_from_api(upc):
+    """
+    Call the UPC Item DB API.
+
+    Returns:
+        Tuple of (status_code, body text), or (None, None) on a network error
+    """
+    try:
+        logging.info(f"Looking up UPC {upc} in UPC Item DB API")
+        upc_cache.count('api_calls')
+        response = requests.get(
+            UPC_API_URL,
+            params={'upc': upc},
+            headers={"Accept": "application/json"},
+            timeout=float(upc_cache.config['UPC_API_TIMEOUT'])
+        )
+        return response.status_code, response.text
+    except requests.RequestException as e:
+        upc_cache.count('api_errors')
+        logging.error(f"Error looking up UPC {upc}: {str(e)}")
+        return None, None
+
+
+def resolve_api_response(upc, status_code, body):
+    """
+    Interpret and persist an external API response.
+
+    Returns:
+        Tuple of (result or None, cacheable) where cacheable is False for
+        transient failures that should be retried on the next lookup
+    """
+    if status_code is None:
+        return None, False
+
+    result = None
+    if status_code == 200:
+        try:
+            result = parse_upc_api_response(upc, json.loads(body))
+        except ValueError:
+            logging.warning(f"UPC lookup returned invalid JSON for {upc}")
+            return None, False
+
+    if result is None and status_code not in NOT_FOUND_STATUS_CODES:
+        # Rate limits and server errors say nothing about the UPC itself
+        upc_cache.count('api_errors')
+        logging.warning(f"UPC lookup failed for {upc}: {status_code} {body}")
+        return None, False
+
+    if result is None:
+        logging.warning(f"UPC lookup failed for {upc}: {body}")
+
+    _store_api_response(upc, status_code, result is not None, body)
+    return result, True
+
+
+def resolve_upc(upc):
+    """
+    Resolve a UPC without consulting the in-process cache.
+
+    Checks the upc_data catalog, then stored API responses, then the API.
+
+    Returns:
+        Tuple of (result or None, cacheable)
+    """
+    # First check our database
+    upc_data = UpcData.query.filter_by(upc=upc).first()
+    if upc_data:
+        upc_cache.count('db_hits')
+        return upc_data.to_dict(), True
+
+    # Reuse a stored API response while it is fresh
+    stored = UpcApiResponse.query.filter_by(upc=upc).first()
+    if stored and _stored_response_fresh(stored):
+        if not stored.found:
+            upc_cache.count('stored_negative_hits')
+            return None, True
+        try:
+            result = parse_upc_api_response(upc, json.loads(stored.body))
+            upc_cache.count('stored_hits')
+            return result, True
+        except (TypeError, ValueError):
+            logging.warning(f"Ignoring unreadable stored API response for {upc}")
+
+    # Try UPC Item DB API for unknown UPCs
+    status_code, body = fetch_upc_from_api(upc)
+    return resolve_api_response(upc, status_code, body)
+
+
+def _advisory_lock_key(upc):
+    """Map a UPC onto the signed 32-bit second key of a two-key advisory lock"""
+    key = zlib.crc32(upc.encode('utf-8'))
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+@contextmanager
+def upc_advisory_lock(upc):
+    """
+    Hold a Postgres advisory lock for a UPC while it is being resolved.
+
+    Uses its own pooled connection so the lock is independent of the request
+    transaction. Waits at most UPC_LOCK_TIMEOUT seconds, then proceeds
+    unlocked rather than failing the lookup. A no-op on other databases.
+    """
+    engine = db.engine
+    if not upc_cache.config['UPC_ADVISORY_LOCKS'] or engine.dialect.name != 'postgresql':
+        yield
+        return
+
+    params = {'namespace': UPC_ADVISORY_LOCK_NAMESPACE, 'key': _advisory_lock_key(upc)}
+    deadline = time.monotonic() + float(upc_cache.config['UPC_LOCK_TIMEOUT'])
+    delay = 0.02
+
+    with engine.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:namespace, :key)"), params).scalar()
+        if not locked:
+            upc_cache.count('lock_waits')
+        while not locked and time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            locked = conn.execute(text("SELECT pg_try_advisory_lock(:namespace, :key)"), params).scalar()
+
+        if not locked:
+            upc_cache.count('lock_timeouts')
+            logging.warning(f"Timed out waiting for UPC lookup lock on {upc}, resolving without it")
+
+        try:
+            yield
+        finally:
+            if locked:
+                conn.execute(text("SELECT pg_advisory_unlock(:namespace, :key)"), params)
+            conn.commit()
+
+
+def resolve_upc_coordinated(upc):
+    """
+    Resolve a UPC once across threads and workers.
+
+    Threads in this process share a single resolution; across workers the
+    advisory lock makes late arrivals find the catalog entry or stored API
+    response written by the first one instead of calling the API again.
+
+    Returns:
+        Tuple of (result or None, cacheable)
+    """
+    def resolve():
+        with upc_advisory_lock(upc):
+            return resolve_upc(upc)
+
+    (result, cacheable), shared = upc_flight.do(upc, resolve)
+    if shared:
+        upc_cache.count('coalesced')
+    return result, cacheable
+
+
+def remember_result(upc, result, cacheable, version):
+    """Put a resolved UPC into the positive or negative in-process cache"""
+    if not cacheable:
+        return
+    if result is None:
+        upc_cache.negative.set((version, upc), True)
+    else:
+        upc_cache.positive.set((version, upc), dict(result))
+
+
+def lookup_upc(upc):
+    """
+    Look up ammunition data for a UPC.
+
+    Returns:
+        A new dictionary with the UPC data (with 'source': 'api' when it came
+        from the external API), or None if the UPC is unknown
+    """
+    version = catalog_version()
+    hit, value = upc_cache.positive.get((version, upc))
+    if hit:
+        upc_cache.count('hits')
+        return dict(value)
+
+    hit, _ = upc_cache.negative.get((version, upc))
+    if hit:
+        upc_cache.count('negative_hits')
+        return None
+
+    upc_cache.count('misses')
+    result, cacheable = resolve_upc_coordinated(upc)
+    remember_result(upc, result, cacheable, version)
+    return dict(result) if result else None
+
+
+def _resolve_in_app_context(app, upc):
+    """Resolve a UPC from a pool thread, which needs its own app context and session"""
+    with app.app_context():
+        return resolve_upc_coordinated(upc)
+
+
+def lookup_upcs(upcs):
+    """
+    Look up ammunition data for many UPCs at once.
+
+    UPCs are answered from the in-process cache first. The rest are read from
+    the catalog and from stored API responses with one IN query each, and only
+    the UPCs still unknown after that are sent to the API, concurrently with
+    at most UPC_BATCH_WORKERS calls in flight.
+
+    Args:
+        upcs: Iterable of UPC strings (duplicates are looked up once)
+
+    Returns:
+        Dictionary mapping each UPC to a new dictionary with its data (with
+        'source': 'api' when it came from the external API), or None if unknown
+    """
+    results = {}
+    pending = []
+    version = catalog_version()
+    for upc in dict.fromkeys(upcs):
+        hit, value = upc_cache.positive.get((version, upc))
+        if hit:
+            upc_cache.count('hits')
+            results[upc] = dict(value)
+            continue
+
+        hit, _ = upc_cache.negative.get((version, upc))
+        if hit:
+            upc_cache.count('negative_hits')
+            results[upc] = None
+            continue
+
+        upc_cache.count('misses')
+        pending.append(upc)
+
+    if not pending:
+        return results
+
+    # One query for every UPC already in our catalog
+    for upc_data in UpcData.query.filter(UpcData.upc.in_(pending)).all():
+        upc_cache.count('db_hits')
+        result = upc_data.to_dict()
+        remember_result(upc_data.upc, result, True, version)
+        results[upc_data.upc] = dict(result)
+
+    # One query for fresh stored API responses
+    remaining = [upc for upc in pending if upc not in results]
+    if remaining:
+        for stored in UpcApiResponse.query.filter(UpcApiResponse.upc.in_(remaining)).all():
+            if not _stored_response_fresh(stored):
+                continue
+            if not stored.found:
+                upc_cache.count('stored_negative_hits')
+                remember_result(stored.upc, None, True, version)
+                results[stored.upc] = None
+                continue
+            try:
+                result = parse_upc_api_response(stored.upc, json.loads(stored.body))
+            except (TypeError, ValueError):
+                logging.warning(f"Ignoring unreadable stored API response for {stored.upc}")
+                continue
+            upc_cache.count('stored_hits')
+            remember_result(stored.upc, result, True, version)
+            results[stored.upc] = dict(result) if result else None
+
+    # Fetch whatever is left from the API with a bounded pool
+    remaining = [upc for upc in pending if upc not in results]
+    if remaining:
+        app = current_app._get_current_object()
+        workers = max(1, min(int(upc_cache.config['UPC_BATCH_WORKERS']), len(remaining)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resolved = executor.map(lambda upc: _resolve_in_app_context(app, upc), remaining)
+            for upc, (result, cacheable) in zip(remaining, resolved):
+                remember_result(upc, result, cacheable, version)
+                results[upc] = dict(result) if result else None
+
+    return results